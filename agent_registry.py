@@ -0,0 +1,68 @@
+from collections import deque
+
+
+class AgentRegistry(list):
+    """List of agents where killing one is O(1)
+
+    discard() only tombstones an agent by setting its is_dead flag, the agent
+    stays in the list so loops running over it never skip or repeat anyone.
+    compact() drops every tombstoned agent in a single pass, the simulators
+    call it once at the end of each tick."""
+
+    def __init__(self, agents=()):
+        super().__init__(agents)
+        self.tombstones = 0
+
+    def discard(self, agent):
+        """Tombstone an agent, returns False if it was already dead"""
+        if agent.is_dead:
+            return False
+        agent.is_dead = True
+        self.tombstones += 1
+        return True
+
+    def live_count(self):
+        """Number of agents that have not been tombstoned"""
+        return len(self) - self.tombstones
+
+    def compact(self):
+        """Remove the tombstoned agents, keeping the survivors in order.
+        Returns the agents that were removed"""
+        if not self.tombstones:
+            return []
+        survivors = []
+        removed = []
+        for agent in self:
+            (removed if agent.is_dead else survivors).append(agent)
+        self[:] = survivors
+        self.tombstones = 0
+        return removed
+
+
+class AgentPool(object):
+    """Free list of dead agents that acquire() brings back to life
+
+    Other agents may still point at one that just died, e.g. a human fleeing the
+    zombie it looked up a few ticks ago. Released agents therefore wait delay
+    ticks before they are handed out again, long enough for every such reference
+    to notice is_dead and be refreshed."""
+
+    def __init__(self, factory, delay: int = 1):
+        self.factory = factory
+        self.free = []
+        self.cooling = deque(maxlen=delay)
+
+    def acquire(self, *args):
+        """A recycled agent reinitialised with args, or a new one"""
+        try:
+            agent = self.free.pop()
+        except IndexError:
+            return self.factory(*args)
+        agent.__init__(*args)
+        return agent
+
+    def release(self, agents):
+        """Take the agents that died this tick, call once per tick"""
+        if len(self.cooling) == self.cooling.maxlen:
+            self.free.extend(self.cooling[0])
+        self.cooling.append(agents)
@@ -0,0 +1,301 @@
+# Scaling benchmark, runs the engines over a matrix of world sizes, populations and
+# thread counts and records ticks per second, peak memory and time spent in each
+# phase of a tick. Every run gets its own process so peak RSS belongs to that run
+#
+#   python3 benchmark.py --engines zombiesim optimized mt --populations 1000 10000 100000
+#
+# Results go to a JSON file, and a Markdown report compares the engines. With
+# several --pythons every run is repeated under each interpreter, which is how the
+# mt engine on a free-threaded build is compared against the GIL build
+#
+#   python3 benchmark.py --engines optimized mt --pythons python3.13 python3.13t
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import zombiesim_cli
+from instrumentation import Instrumentation
+from worker_pool import gil_enabled
+
+DEFAULT_ENGINES = ["zombiesim", "optimized", "mt"]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in megabytes"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(config):
+    """Run one configuration in this process and return its measurements"""
+    argv = ["--engine", config["engine"],
+            "--size", str(config["size"]), str(config["size"]),
+            "--humans", str(config["humans"]),
+            "--zombies", str(config["zombies"]),
+            "--seed", str(config["seed"])]
+    if config.get("threads"):
+        argv += ["--threads", str(config["threads"])]
+    args = zombiesim_cli.parse_args(argv)
+
+    start = time.perf_counter()
+    sim = zombiesim_cli.make_simulator(args)
+    setup = time.perf_counter() - start
+
+    # Engines that split their tick into phases are measured phase by phase
+    measured = []
+    if hasattr(sim, "instrumentation"):
+        sim.instrumentation = Instrumentation(callback=measured.append)
+
+    try:
+        for _ in range(config["warmup"]):
+            sim.update()
+        del measured[:]
+
+        ticks = 0
+        deadline = time.perf_counter() + config["budget"]
+        start = time.perf_counter()
+        while ticks < config["ticks"] and time.perf_counter() < deadline:
+            sim.update()
+            ticks += 1
+        elapsed = time.perf_counter() - start
+        humans, zombies = len(sim.humans), len(sim.zombies)
+    finally:
+        if hasattr(sim, "close"):
+            sim.close()
+
+    # Per tick averages of the instrumented runs
+    phase_seconds = {}
+    counters = {}
+    if measured:
+        for stats in measured:
+            for phase, seconds in stats.phase_seconds.items():
+                phase_seconds[phase] = phase_seconds.get(phase, 0) + seconds / len(measured)
+        for name in ("queries", "candidates", "eats", "deaths", "births", "conversions"):
+            counters[name] = sum(getattr(stats, name) for stats in measured) / len(measured)
+
+    return dict(config,
+                setup_seconds=setup,
+                measured_ticks=ticks,
+                run_seconds=elapsed,
+                ticks_per_second=ticks / elapsed if elapsed else 0.0,
+                phase_seconds=phase_seconds,
+                counters=counters,
+                peak_rss_mb=peak_rss_mb(),
+                final_humans=humans,
+                final_zombies=zombies,
+                python_version=platform.python_version(),
+                gil=gil_enabled(),
+                status="ok")
+
+
+def run_isolated(config, timeout: float):
+    """Measure a configuration in a fresh interpreter"""
+    command = [config["python"], os.path.abspath(__file__), "--child", json.dumps(config)]
+    try:
+        child = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return dict(config, status="timeout")
+    if child.returncode != 0:
+        return dict(config, status="error", error=child.stderr.strip().splitlines()[-1:])
+    return json.loads(child.stdout)
+
+
+def configurations(args):
+    """Every run in the matrix, smallest population first"""
+    for size in args.sizes:
+        for population in sorted(args.populations):
+            zombies = max(1, round(population * args.zombie_ratio))
+            for engine in args.engines:
+                for threads in (args.threads if engine == "mt" else [None]):
+                    for python in args.pythons:
+                        yield {
+                            "engine": engine,
+                            "threads": threads,
+                            "python": python,
+                            "size": size,
+                            "humans": population - zombies,
+                            "zombies": zombies,
+                            "population": population,
+                            "seed": args.seed,
+                            "warmup": args.warmup,
+                            "ticks": args.ticks,
+                            "budget": args.budget,
+                        }
+
+
+def engine_label(result):
+    if result["threads"]:
+        return f"{result['engine']} x{result['threads']}"
+    return result["engine"]
+
+
+def label(result):
+    """Engine and thread count, and the interpreter when it isn't the one running the sweep"""
+    if result["python"] == sys.executable:
+        return engine_label(result)
+    return f"{engine_label(result)} [{os.path.basename(result['python'])}]"
+
+
+def interpreter_label(python, results):
+    """Interpreter name with its version and whether it ran with the GIL"""
+    ran = next((r for r in results if r["python"] == python and r["status"] == "ok"), None)
+    if ran is None:
+        return os.path.basename(python)
+    build = "GIL" if ran["gil"] else "free-threaded"
+    return f"{os.path.basename(python)} ({ran['python_version']}, {build})"
+
+
+def report(results, args):
+    """Markdown comparison of the results"""
+    lines = ["# Zombiesim scaling benchmark", "",
+             f"{platform.platform()}, Python {platform.python_version()}, {os.cpu_count()} CPUs", ""]
+
+    cases = sorted({(r["size"], r["population"]) for r in results})
+    for size, population in cases:
+        rows = [r for r in results if r["size"] == size and r["population"] == population]
+        speeds = {label(r): r["ticks_per_second"] for r in rows if r["status"] == "ok"}
+
+        lines += [f"## {size}x{size} world, {population} agents", "",
+                  "| engine | ticks/s | vs optimized | peak RSS MB | slowest phase |",
+                  "|---|---:|---:|---:|---|"]
+        for r in rows:
+            if r["status"] != "ok":
+                lines.append(f"| {label(r)} | {r['status']} | | | |")
+                continue
+            # Compared with the optimized engine under the same interpreter
+            baseline = speeds.get(label(dict(r, engine="optimized", threads=None)))
+            relative = f"{r['ticks_per_second'] / baseline:.2f}x" if baseline else ""
+            slowest = ""
+            if r["phase_seconds"]:
+                phase, seconds = max(r["phase_seconds"].items(), key=lambda item: item[1])
+                share = seconds * r["ticks_per_second"]
+                slowest = f"{phase} ({share:.0%})"
+            lines.append(f"| {label(r)} | {r['ticks_per_second']:.2f} | {relative} | "
+                         f"{r['peak_rss_mb']:.0f} | {slowest} |")
+
+        threaded = {name: speed for name, speed in speeds.items() if name.startswith("mt ")}
+        baseline = speeds.get("optimized")
+        if threaded and baseline:
+            best = max(threaded, key=threaded.get)
+            verdict = "beats" if threaded[best] > baseline else "does not beat"
+            lines += ["", f"Best threaded run ({best}) {verdict} the optimized engine."]
+        lines.append("")
+
+    if len(args.pythons) > 1:
+        lines += builds_report(results, args)
+
+    # Largest population each engine still runs at the target rate
+    lines += [f"## Scaling limit (largest population at {args.target_tps:g} ticks/s or more)", "",
+              "| engine | " + " | ".join(f"{size}x{size}" for size in args.sizes) + " |",
+              "|---|" + "---:|" * len(args.sizes)]
+    for name in dict.fromkeys(label(r) for r in results):
+        cells = []
+        for size in args.sizes:
+            fast = [r["population"] for r in results
+                    if label(r) == name and r["size"] == size and r["status"] == "ok"
+                    and r["ticks_per_second"] >= args.target_tps]
+            cells.append(str(max(fast)) if fast else "-")
+        lines.append(f"| {name} | " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def builds_report(results, args):
+    """Every engine's speed under each interpreter, relative to the first one, which
+    shows what a free-threaded build gains over the GIL build"""
+    first = args.pythons[0]
+    names = [interpreter_label(python, results) for python in args.pythons]
+    lines = [f"## Interpreters (ticks/s, relative to {names[0]})", "",
+             "| engine | world | agents | " + " | ".join(names) + " |",
+             "|---|---:|---:|" + "---:|" * len(names)]
+    speeds = {(engine_label(r), r["size"], r["population"], r["python"]): r["ticks_per_second"]
+              for r in results if r["status"] == "ok"}
+    cases = dict.fromkeys((engine_label(r), r["size"], r["population"]) for r in results)
+    for name, size, population in cases:
+        reference = speeds.get((name, size, population, first))
+        cells = []
+        for python in args.pythons:
+            speed = speeds.get((name, size, population, python))
+            if speed is None:
+                cells.append("-")
+            elif python == first or not reference:
+                cells.append(f"{speed:.2f}")
+            else:
+                cells.append(f"{speed:.2f} ({speed / reference:.2f}x)")
+        lines.append(f"| {name} | {size}x{size} | {population} | " + " | ".join(cells) + " |")
+    return lines + [""]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the zombie simulator engines")
+    parser.add_argument("--engines", nargs="+", choices=zombiesim_cli.ENGINES, default=DEFAULT_ENGINES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 300, 1000],
+                        help="side of the square world")
+    parser.add_argument("--populations", nargs="+", type=int,
+                        default=[1000, 10000, 100000, 1000000], help="agents at the start of a run")
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 2, 4, 8],
+                        help="thread counts for the mt engine")
+    parser.add_argument("--pythons", nargs="+", default=[sys.executable],
+                        help="interpreters to run every configuration under, e.g. python3.13 python3.13t "
+                             "to compare the GIL and free-threaded builds (default: this one)")
+    parser.add_argument("--zombie-ratio", type=float, default=0.01,
+                        help="share of the population that starts as zombies")
+    parser.add_argument("--ticks", type=int, default=50, help="ticks measured per run")
+    parser.add_argument("--warmup", type=int, default=5, help="ticks run before measuring")
+    parser.add_argument("--budget", type=float, default=30,
+                        help="seconds of measured ticks per run, slower runs measure fewer ticks")
+    parser.add_argument("--target-tps", type=float, default=10,
+                        help="ticks per second an engine must reach to count as keeping up")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--report", default="benchmark_report.md")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        json.dump(measure(json.loads(args.child)), sys.stdout)
+        return 0
+
+    results = []
+    # Once an engine falls behind at some population the larger ones are skipped
+    gave_up = set()
+    for config in configurations(args):
+        key = (config["engine"], config["threads"], config["python"], config["size"])
+        if key in gave_up:
+            results.append(dict(config, status="skipped"))
+            continue
+        timeout = config["budget"] * 4 + 300
+        result = run_isolated(config, timeout)
+        results.append(result)
+
+        if result["status"] != "ok" or result["measured_ticks"] < config["ticks"]:
+            gave_up.add(key)
+        if result["status"] == "ok":
+            print(f"{label(result):>14} {config['size']:>5} {config['population']:>8}: "
+                  f"{result['ticks_per_second']:8.2f} ticks/s {result['peak_rss_mb']:7.0f} MB",
+                  file=sys.stderr)
+        else:
+            print(f"{label(result):>14} {config['size']:>5} {config['population']:>8}: {result['status']}",
+                  file=sys.stderr)
+
+        # Written after every run so an interrupted sweep keeps what it measured
+        with open(args.output, "w") as f:
+            json.dump({"platform": platform.platform(), "python": platform.python_version(),
+                       "cpus": os.cpu_count(), "results": results}, f, indent=2)
+
+    with open(args.report, "w") as f:
+        f.write(report(results, args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
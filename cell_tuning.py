@@ -0,0 +1,111 @@
+# Automatic cell sizes for the grid based spatial indexes. Small cells make every
+# query look into many cells, large ones make it compare distances against many
+# agents, and which costs more depends on how crowded the world is. A CellTuner
+# measures the cost of the queries run at the current size and tries the
+# neighbouring sizes from time to time, keeping whichever turned out cheaper
+#
+# Cost is counted, not timed: cells looked into and candidates compared, so a
+# seeded run makes the same choices every time
+
+# Relative cost of looking into one cell, compared to one candidate distance
+# check. Measured for the object grid (dict lookups in Python) and for the
+# vectorized CellIndex (a few array elements per cell of every query's block)
+GRID_CELL_COST = 3.5
+ARRAY_CELL_COST = 1.1
+
+
+def geometric_sizes(start: float, smallest: float, largest: float, step: float = 2 ** 0.5):
+    """Cell sizes start * step**k that lie between smallest and largest"""
+    sizes = [start]
+    while sizes[0] / step >= smallest:
+        sizes.insert(0, sizes[0] / step)
+    while sizes[-1] * step <= largest:
+        sizes.append(sizes[-1] * step)
+    return sizes
+
+
+class CellTuner(object):
+    """Walks a ladder of cell sizes towards the one with the lowest cost per query.
+
+    tick() is called once per simulation tick with the index's running totals.
+    Every `every` ticks it works out the cost per query of the period that just
+    ended. After `probe_every` periods at one size it probes a neighbouring size
+    for a single period and keeps it if it was at least `margin` cheaper. Probes
+    head towards smaller cells when the population has grown since the size was
+    chosen and towards larger ones when it has shrunk, so the tuner follows
+    booms and collapses"""
+
+    def __init__(self, sizes, start: float, cell_cost: float, every: int = 20,
+                 probe_every: int = 4, margin: float = 0.05):
+        if start not in sizes:
+            raise ValueError(f"Starting cell size {start} is not one of {sizes}")
+        self.sizes = sorted(sizes)
+        self.cell_cost = cell_cost
+        self.every = every
+        self.probe_every = probe_every
+        self.margin = margin
+
+        self.rung = self.sizes.index(start)
+        self.settled = self.rung  # Where a failed probe returns to
+        self.settled_cost = None
+        self.settled_agents = None
+        self.direction = -1
+        self.periods = 0
+
+        self.ticks = 0
+        self.totals = (0, 0, 0)  # Queries, cells and candidates when the period began
+        self.history = []  # (tick, cell size, cost per query) of every period
+
+    @property
+    def cell_size(self):
+        return self.sizes[self.rung]
+
+    def tick(self, queries: int, cells: int, scanned: int, agents: int):
+        """Account for one tick given the running totals of the index (or indexes)
+        being tuned and the number of agents in them. Returns the cell size to
+        switch to, or None to keep the current one"""
+        self.ticks += 1
+        if self.ticks % self.every:
+            return None
+
+        done = queries - self.totals[0]
+        cost = (self.cell_cost * (cells - self.totals[1]) + scanned - self.totals[2]) / done if done else None
+        self.totals = (queries, cells, scanned)
+        if cost is None:
+            # Nothing was looked up, no way to tell one size from another
+            return None
+        self.history.append((self.ticks, self.cell_size, cost))
+
+        if self.rung != self.settled:
+            if cost < self.settled_cost * (1 - self.margin):
+                # The probe won, carry on in the same direction soon
+                self.settled = self.rung
+                self.settled_cost = cost
+                self.settled_agents = agents
+                self.periods = self.probe_every - 1
+                return None
+            # Back to the settled size, which has now proven itself at this population
+            self.rung = self.settled
+            self.settled_agents = agents
+            self.direction = -self.direction
+            return self.cell_size
+
+        self.settled_cost = cost
+        if self.settled_agents is None:
+            self.settled_agents = agents
+        self.periods += 1
+        if self.periods % self.probe_every:
+            return None
+
+        if agents > self.settled_agents * 1.25:
+            self.direction = -1
+        elif agents < self.settled_agents / 1.25:
+            self.direction = 1
+        probe = self.rung + self.direction
+        if not 0 <= probe < len(self.sizes):
+            self.direction = -self.direction
+            probe = self.rung + self.direction
+            if not 0 <= probe < len(self.sizes):
+                return None
+        self.rung = probe
+        return self.cell_size
@@ -0,0 +1,311 @@
+# Binary checkpoints of a whole simulation, so many what-if runs can be forked
+# from one late tick instead of being simulated again from tick 0
+#
+# A checkpoint is a single file: a fixed preamble, a JSON header describing the
+# simulator and its columns, then the columns themselves as raw little endian
+# arrays aligned to 64 bytes. The columns can be memory mapped as they are, so
+# the vectorized engines restore any population in milliseconds. The object
+# engines still need one Python object per agent, but restoring them only fills
+# the agents' slots from the columns, without running __init__.
+#
+#   save_checkpoint(sim, "outbreak.ckpt")
+#   fork = load_checkpoint("outbreak.ckpt", seed=1)
+
+import importlib
+import inspect
+import json
+import struct
+from itertools import repeat
+
+import numpy as np
+
+MAGIC = b"ZOMBCKPT"
+VERSION = 1
+PREAMBLE = struct.Struct("<8sIQ")  # Magic, version, header length
+ALIGNMENT = 64
+
+# Agent lists of the object engines, agents waiting to join are saved as well
+OBJECT_GROUPS = ("humans", "zombies", "new_humans", "new_zombies")
+
+# Agent attributes that are rebuilt on restore instead of saved
+SKIPPED_ATTRIBUTES = {"cell", "sim"}
+
+
+def _aligned(offset: int):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _constructor_options(sim):
+    """Constructor arguments the simulator keeps as attributes of the same name"""
+    parameters = inspect.signature(type(sim).__init__).parameters
+    skip = {"self", "xbound", "ybound", "num_humans", "num_zombies", "seed"}
+    return {name: getattr(sim, name) for name in parameters
+            if name not in skip and hasattr(sim, name)}
+
+
+def _scalars(sim):
+    """Plain settings held by the simulator, e.g. cell_size or zombie_sight"""
+    return {name: value for name, value in vars(sim).items()
+            if value is None or isinstance(value, (bool, int, float, str))}
+
+
+def _rng_state(rng):
+    if isinstance(rng, np.random.Generator):
+        return {"kind": "numpy", "state": rng.bit_generator.state}
+    version, internal, gauss = rng.getstate()
+    return {"kind": "random", "state": [version, list(internal), gauss]}
+
+
+def _set_rng_state(rng, saved):
+    if saved["kind"] == "numpy":
+        rng.bit_generator.state = saved["state"]
+    else:
+        version, internal, gauss = saved["state"]
+        rng.setstate((version, tuple(internal), gauss))
+
+
+def _agent_attributes(agent):
+    """Names of an agent's own attributes, from its slots or its __dict__"""
+    if hasattr(agent, "__dict__"):
+        names = list(vars(agent))
+    else:
+        names = [name for cls in reversed(type(agent).__mro__)
+                 for name in getattr(cls, "__slots__", ())]
+    return [name for name in names if name not in SKIPPED_ATTRIBUTES]
+
+
+class _ObjectColumns(object):
+    """Turns the agent lists of an object engine into columns.
+
+    A reference to another agent is stored as its position among all saved
+    agents of its species, taken in group order. Dead agents that are still
+    referenced, e.g. the zombie a human last fled from, are saved in a dead
+    group of their own so the reference survives"""
+
+    def __init__(self, module, sim):
+        self.classes = {"human": module.Human, "zombie": module.Zombie}
+        self.groups = {}
+        self.agents = {"human": [], "zombie": []}
+        self.position = {}
+        for name in OBJECT_GROUPS:
+            self.add_group(name, "zombie" if "zombie" in name else "human", getattr(sim, name))
+
+    def add_group(self, name, species, agents):
+        self.groups[name] = (species, list(agents))
+        known = self.agents[species]
+        self.position.update((id(agent), len(known) + i) for i, agent in enumerate(agents))
+        known.extend(agents)
+
+    def species_of(self, agent):
+        for species, cls in self.classes.items():
+            if isinstance(agent, cls):
+                return species
+        return None
+
+    def locate(self, agent):
+        """Position of a referenced agent, saving it in a dead group if needed"""
+        if id(agent) not in self.position:
+            species = self.species_of(agent)
+            name = "dead_" + species + "s"
+            members = self.groups.get(name, (species, []))[1]
+            self.groups[name] = (species, members)
+            self.position[id(agent)] = len(self.agents[species])
+            self.agents[species].append(agent)
+            members.append(agent)
+        return self.position[id(agent)]
+
+    def column(self, agents, name):
+        """(kind, array, referenced species) for one attribute of a list of agents"""
+        values = [getattr(agent, name) for agent in agents]
+        if all(isinstance(value, bool) for value in values):
+            return "value", np.array(values, dtype=np.bool_), None
+        if all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+            return "value", np.array(values, dtype=np.int64), None
+        if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            return "value", np.array(values, dtype=np.float64), None
+
+        species = {self.species_of(value) for value in values if value is not None}
+        if None not in species and len(species) <= 1:
+            positions = [-1 if value is None else self.locate(value) for value in values]
+            return "ref", np.array(positions, dtype=np.int64), species.pop() if species else None
+        raise TypeError(f"Can't checkpoint agent attribute {name!r}")
+
+    def group_columns(self, name):
+        species, agents = self.groups[name]
+        columns = {}
+        if agents:
+            for attribute in _agent_attributes(agents[0]):
+                columns[attribute] = self.column(agents, attribute)
+        return name, species, len(agents), columns
+
+    def __iter__(self):
+        """(group, species, count, {attribute: column}) per group"""
+        for name in OBJECT_GROUPS:
+            yield self.group_columns(name)
+
+        # The live groups have found the dead agents they refer to. Those can
+        # refer to further dead agents, so follow them before saving any
+        dead = [agent for name, (_, agents) in self.groups.items()
+                if name not in OBJECT_GROUPS for agent in agents]
+        while dead:
+            agent = dead.pop()
+            for attribute in _agent_attributes(agent):
+                value = getattr(agent, attribute)
+                if self.species_of(value) and id(value) not in self.position:
+                    self.locate(value)
+                    dead.append(value)
+        for name in list(self.groups):
+            if name not in OBJECT_GROUPS:
+                yield self.group_columns(name)
+
+
+def save_checkpoint(sim, path):
+    """Write the full state of a simulator, between two ticks, to path"""
+    module = importlib.import_module(type(sim).__module__)
+    header = {
+        "engine": type(sim).__module__,
+        "xbound": sim.xbound,
+        "ybound": sim.ybound,
+        "options": _constructor_options(sim),
+        "scalars": _scalars(sim),
+        "rng": _rng_state(sim.rng),
+        "groups": {},
+    }
+
+    if hasattr(sim.humans, "fields"):
+        # Columnar engines, every population field is a column
+        groups = []
+        for name in ("humans", "zombies"):
+            population = getattr(sim, name)
+            columns = {field: ("value", getattr(population, field), None) for field in population.fields}
+            groups.append((name, name[:-1], len(population), columns))
+    else:
+        groups = list(_ObjectColumns(module, sim))
+
+    # Column offsets count from the start of the data, after the header
+    arrays = []
+    offset = 0
+    for name, species, count, columns in groups:
+        group = header["groups"][name] = {"species": species, "count": count, "columns": {}}
+        for attribute, (kind, array, target) in columns.items():
+            array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+            group["columns"][attribute] = {"kind": kind, "dtype": array.dtype.str,
+                                           "ref": target, "offset": offset}
+            arrays.append((offset, array))
+            offset = _aligned(offset + array.nbytes)
+
+    encoded = json.dumps(header).encode()
+    data_start = _aligned(PREAMBLE.size + len(encoded))
+    with open(path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        for offset, array in arrays:
+            f.seek(data_start + offset)
+            f.write(array.tobytes())
+
+
+def read_header(path):
+    """Header of a checkpoint file, with data_start set to where its columns begin"""
+    with open(path, "rb") as f:
+        magic, version, length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a zombiesim checkpoint")
+        if version != VERSION:
+            raise ValueError(f"{path} is a version {version} checkpoint, expected {VERSION}")
+        header = json.loads(f.read(length))
+    header["data_start"] = _aligned(PREAMBLE.size + length)
+    return header
+
+
+def _read_column(path, header, entry, count, mmap):
+    dtype = np.dtype(entry["dtype"])
+    offset = header["data_start"] + entry["offset"]
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    if mmap:
+        # Copy on write, the simulation updates columns in place without
+        # touching the file, so any number of forks can share it
+        return np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=(count,))
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return np.fromfile(f, dtype=dtype, count=count)
+
+
+def _restore_objects(module, sim, header, path):
+    """Rebuild the agents of an object engine from their columns"""
+    classes = {"human": getattr(sim, "Human", module.Human),
+               "zombie": getattr(sim, "Zombie", module.Zombie)}
+    groups = {}
+    agents = {"human": [], "zombie": []}
+    for name, group in header["groups"].items():
+        cls = classes[group["species"]]
+        groups[name] = [cls.__new__(cls) for _ in range(group["count"])]
+        agents[group["species"]].extend(groups[name])
+
+    for name, group in header["groups"].items():
+        members = groups[name]
+        if not members:
+            continue
+        cls = type(members[0])
+        for attribute, entry in group["columns"].items():
+            values = _read_column(path, header, entry, group["count"], mmap=False).tolist()
+            if entry["kind"] == "ref":
+                targets = agents.get(entry["ref"], [])
+                values = [None if i < 0 else targets[i] for i in values]
+            # Slots are filled through their descriptors, skipping setattr
+            descriptor = getattr(cls, attribute, None)
+            if hasattr(descriptor, "__set__"):
+                list(map(descriptor.__set__, members, values))
+            else:
+                list(map(setattr, members, repeat(attribute), values))
+
+        if hasattr(members[0], "__dict__"):
+            list(map(setattr, members, repeat("sim"), repeat(sim)))
+        elif hasattr(cls, "cell"):
+            # Filled in again when the indexes are rebuilt
+            list(map(cls.cell.__set__, members, repeat(None)))
+
+    for name in OBJECT_GROUPS:
+        getattr(sim, name).extend(groups.get(name, ()))
+    if hasattr(sim, "update_spatial_grid"):
+        sim.update_spatial_grid()
+
+
+def load_checkpoint(path, seed=None, mmap=True):
+    """Simulator saved in path. Passing a seed reseeds its generator, so forks of
+    one checkpoint play out differently. With mmap the columnar engines map
+    their columns straight from the file instead of reading them"""
+    header = read_header(path)
+    module = importlib.import_module(header["engine"])
+    sim = module.Simulator(header["xbound"], header["ybound"], 0, 0, **header["options"])
+    for name, value in header["scalars"].items():
+        setattr(sim, name, value)
+
+    if hasattr(sim.humans, "fields"):
+        for name in ("humans", "zombies"):
+            group = header["groups"][name]
+            population = getattr(sim, name)
+            columns = {field: _read_column(path, header, entry, group["count"], mmap)
+                       for field, entry in group["columns"].items()}
+            # Columns added since the file was written start at -1
+            for field, dtype in population.fields.items():
+                columns.setdefault(field, np.full(group["count"], -1, dtype=dtype))
+            if hasattr(population, "buffers"):
+                # Shared memory populations copy the columns into their blocks
+                population.append(**columns)
+            else:
+                for field, column in columns.items():
+                    setattr(population, field, column)
+    else:
+        _restore_objects(module, sim, header, path)
+
+    _set_rng_state(sim.rng, header["rng"])
+    if seed is not None:
+        if isinstance(sim.rng, np.random.Generator):
+            sim.rng = np.random.default_rng(seed)
+        else:
+            sim.rng.seed(seed)
+        if hasattr(sim, "spawn_seed"):
+            # The mt engine's spawns draw from a chain of their own, fork it too
+            sim.spawn_seed = sim.rng.getrandbits(64)
+    return sim
@@ -0,0 +1,132 @@
+# Batched eating for the object based engines. Once every zombie has moved, the
+# zombies eat in the simulator's shuffled order, the same random priority the
+# vectorized engine uses: each one takes the closest human within reach that no
+# zombie ahead of it has taken
+#
+# While there are few zombies, or few humans around each of them, every zombie
+# asks the human index the simulator already keeps in Python. Once those lookups
+# would cost more, every pair within reach is found in one pass over coordinate
+# arrays with NumPy instead, which gives the same meals
+
+import math
+from operator import attrgetter
+
+# How close a zombie has to be to a human to eat it
+REACH = 1
+
+# Measured cost in microseconds of one index query and of each human it
+# compares, and of the NumPy pass plus its cost per agent
+QUERY_COST = 5
+CANDIDATE_COST = 2
+NUMPY_COST = 1500
+NUMPY_AGENT_COST = 0.45
+
+get_x = attrgetter("xcord")
+get_y = attrgetter("ycord")
+
+
+def positions(agents):
+    """x and y coordinates of a list of agents, as two arrays"""
+    import numpy as np
+    count = len(agents)
+    return (np.fromiter(map(get_x, agents), dtype=np.float64, count=count),
+            np.fromiter(map(get_y, agents), dtype=np.float64, count=count))
+
+
+def _closest_untaken(index, x: float, y: float, reach: float, taken):
+    """Closest point of a CellIndex within reach of (x, y) that isn't in taken, -1
+    if there is none. Cells are never smaller than the reach, so the block of
+    cells around the point holds every candidate"""
+    cell_x = min(max(int(x // index.cell_size), 0), index.cols - 1)
+    cell_y = min(max(int(y // index.cell_size), 0), index.rows - 1)
+    best, best_dist2 = -1, reach * reach
+    for other_y in range(max(cell_y - 1, 0), min(cell_y + 1, index.rows - 1) + 1):
+        for other_x in range(max(cell_x - 1, 0), min(cell_x + 1, index.cols - 1) + 1):
+            cell = other_y * index.cols + other_x
+            start = int(index.starts[cell])
+            for j in index.order[start:start + int(index.counts[cell])].tolist():
+                dist2 = (index.x[j].item() - x) ** 2 + (index.y[j].item() - y) ** 2
+                if dist2 <= best_dist2 and j not in taken and (best < 0 or dist2 < best_dist2):
+                    best, best_dist2 = j, dist2
+    return best
+
+
+def find_meals(zombies, humans, xbound: float, ybound: float, reach: float = REACH):
+    """(zombie, human) pairs where the zombie eats the human this tick, in the
+    zombies' order. zombies is in priority order and, like humans, holds only
+    live agents. Each zombie eats the closest human within reach that the ones
+    before it left, and each human is eaten once"""
+    if not zombies or not humans:
+        return []
+    import numpy as np
+    from vectorized_zombiesim import CellIndex
+
+    # Cells hold about one human each, but are never smaller than the reach so
+    # the block of cells around a zombie always covers it
+    cell_size = max(reach, math.sqrt(xbound * ybound / len(humans)))
+    cols = int(xbound // cell_size) + 1
+    rows = int(ybound // cell_size) + 1
+    index = CellIndex(*positions(humans), cell_size, cols, rows)
+
+    # Strictly closer than just past the reach, i.e. within it
+    zx, zy = positions(zombies)
+    closest, _ = index.nearest(zx, zy, 1, np.nextafter(reach * reach, math.inf))
+
+    # Only zombies with a human in reach can eat. Going through them in priority
+    # order, the few whose closest human was taken fall back to the next one
+    meals = []
+    taken = set()
+    for i, j in zip(np.flatnonzero(closest >= 0).tolist(), closest[closest >= 0].tolist()):
+        if j in taken:
+            zombie = zombies[i]
+            j = _closest_untaken(index, zombie.xcord, zombie.ycord, reach, taken)
+            if j < 0:
+                continue
+        taken.add(j)
+        meals.append((zombies[i], humans[j]))
+    return meals
+
+
+def use_numpy(sim, index, zombies: int, humans: int):
+    """Whether one NumPy pass is expected to be cheaper than an index query per
+    zombie. Each query compares about the humans of one cell"""
+    cell_size = getattr(index, "cell_size", sim.cell_size)
+    per_cell = humans * cell_size * cell_size / (sim.xbound * sim.ybound)
+    return (zombies * (QUERY_COST + CANDIDATE_COST * per_cell) >
+            NUMPY_COST + NUMPY_AGENT_COST * (zombies + humans))
+
+
+def _eat(zombie, human):
+    zombie.hunger = max(zombie.hunger - 40, 0)
+    # Find a new target next tick
+    zombie.closest_human = None
+    human.get_eaten()
+
+
+def resolve_contacts(sim, reach: float = REACH):
+    """Let every zombie of sim eat the human it wins this tick. Hunger resets,
+    deaths and conversions are applied meal by meal in priority order, so a
+    seed reproduces the same conversions. Returns the number of meals"""
+    zombies = [zombie for zombie in sim.zombies if not zombie.is_dead]
+    index = sim.get_index("human")
+    meals = 0
+
+    # The index only knows where humans are if it follows them as they move
+    if not index.incremental or use_numpy(sim, index, len(zombies), len(sim.humans)):
+        humans = [human for human in sim.humans if not human.is_dead]
+        for zombie, human in find_meals(zombies, humans, sim.xbound, sim.ybound, reach):
+            _eat(zombie, human)
+            meals += 1
+    else:
+        # Strictly closer than just past the reach, i.e. within it
+        limit = math.nextafter(reach, math.inf)
+        for zombie in zombies:
+            # An eaten human leaves the index, so the ones taken are skipped
+            human, _ = index.nearest(zombie.xcord, zombie.ycord, limit)
+            if human is not None:
+                _eat(zombie, human)
+                meals += 1
+
+    if sim.debug and meals:
+        print(f"Zombies have eaten {meals} Humans")
+    return meals
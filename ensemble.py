@@ -0,0 +1,287 @@
+# Monte Carlo ensembles and parameter sweeps. Every combination of the swept
+# parameters is run with many seeds, each run in a worker process of its own,
+# and the aggregated population curves are rewritten as runs finish
+#
+#   python3 ensemble.py --sweep immunity=0.1,0.3,0.5 --sweep zombie_speed=0.8,1.2 --seeds 32
+#
+# Finished runs are appended to the output file one JSON line at a time, so an
+# interrupted sweep picks up where it stopped when started again with the same
+# output file
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+import zombiesim_cli
+from fast_forward import outcome, survivor
+
+# Parameters that can be swept -> type of their values. The model parameters go
+# to the simulator, humans and zombies are the starting populations
+PARAMETERS = {
+    "immunity": float,
+    "human_speed": float,
+    "zombie_speed": float,
+    "birth_odds": int,
+    "humans": int,
+    "zombies": int,
+}
+
+# The mp engine needs a process pool of its own, which pool workers can't start
+ENGINES = [engine for engine in zombiesim_cli.ENGINES if engine != "mp"]
+
+# Settings that have to match for a sweep to be resumed from an output file
+SETTINGS = ("engine", "size", "ticks", "every", "threads", "spatial_index", "sweep", "fast_forward")
+
+
+def parse_sweep(specs):
+    """{parameter: [values]} from name=value,value,... arguments"""
+    sweep = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        name = name.strip().replace("-", "_")
+        if name not in PARAMETERS:
+            raise ValueError(f"Can't sweep {name!r}, expected one of {', '.join(PARAMETERS)}")
+        if not values:
+            raise ValueError(f"No values given for {name!r}")
+        sweep[name] = [PARAMETERS[name](value) for value in values.split(",")]
+    return sweep
+
+
+def combinations(sweep):
+    """Every combination of the swept values, as parameter dicts"""
+    names = sorted(sweep)
+    for values in itertools.product(*(sweep[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def key(params):
+    """Canonical form of a parameter combination, usable as a dict key"""
+    return json.dumps(params, sort_keys=True)
+
+
+def sample_ticks(ticks: int, every: int):
+    """Ticks at which a run records its populations, always including the last"""
+    samples = list(range(0, ticks, every))
+    return samples + [ticks]
+
+
+def simulate(run):
+    """Worker process, runs one simulation and returns its population curves"""
+    argv = ["--engine", run["engine"],
+            "--size", *map(str, run["size"]),
+            "--seed", str(run["seed"]),
+            "--threads", str(run["threads"]),
+            "--spatial-index", run["spatial_index"]]
+    for name, value in run["params"].items():
+        argv += ["--" + name.replace("_", "-"), str(value)]
+    sim = zombiesim_cli.make_simulator(zombiesim_cli.parse_args(argv))
+
+    samples = set(sample_ticks(run["ticks"], run["every"]))
+    humans, zombies = [], []
+    extinction = {"humans": None, "zombies": None}
+
+    def record(tick, counts):
+        for species, count in counts.items():
+            if count == 0 and extinction[species] is None:
+                extinction[species] = tick
+        if tick in samples:
+            humans.append(counts["humans"])
+            zombies.append(counts["zombies"])
+
+    start = time.perf_counter()
+    try:
+        for tick in range(run["ticks"] + 1):
+            counts = {"humans": len(sim.humans), "zombies": len(sim.zombies)}
+            record(tick, counts)
+            if tick == run["ticks"] or not (counts["humans"] or counts["zombies"]):
+                break
+            if run.get("fast_forward") and survivor(sim) is not None:
+                # Only the curves are kept, the rest of the run can be projected
+                projected = outcome(sim, run["ticks"] - tick).history
+                for later, (h, z) in enumerate(projected, tick + 1):
+                    record(later, {"humans": h, "zombies": z})
+                break
+            sim.update()
+    finally:
+        if hasattr(sim, "close"):
+            sim.close()
+
+    # Nothing changes once both species are gone
+    missing = len(samples) - len(humans)
+    return {
+        "params": run["params"],
+        "seed": run["seed"],
+        "humans": humans + [0] * missing,
+        "zombies": zombies + [0] * missing,
+        "human_extinction": extinction["humans"],
+        "zombie_extinction": extinction["zombies"],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def extinction_summary(times, quantiles):
+    """How often and when a species died out, times are None for runs it survived"""
+    died = np.array([t for t in times if t is not None], dtype=np.float64)
+    summary = {"fraction": len(died) / len(times)}
+    if len(died):
+        summary["mean"] = float(died.mean())
+        summary.update((f"q{q:g}", float(value)) for q, value in zip(quantiles, np.quantile(died, quantiles)))
+    return summary
+
+
+def aggregate(runs, quantiles):
+    """Mean and quantile population curves and extinction times over the runs
+    of one parameter combination"""
+    result = {"params": runs[0]["params"], "runs": len(runs)}
+    for species in ("humans", "zombies"):
+        curves = np.array([run[species] for run in runs], dtype=np.float64)
+        curve = {"mean": curves.mean(axis=0).tolist()}
+        for q, values in zip(quantiles, np.quantile(curves, quantiles, axis=0)):
+            curve[f"q{q:g}"] = values.tolist()
+        result[species] = curve
+        result[species[:-1] + "_extinction"] = extinction_summary(
+            [run[species[:-1] + "_extinction"] for run in runs], quantiles)
+    return result
+
+
+def read_output(path, settings):
+    """Runs already in an output file, after checking it belongs to this sweep.
+    A line cut short by an interrupted write is dropped from the file"""
+    runs = []
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return runs
+    with open(path, "rb+") as f:
+        header = json.loads(f.readline())
+        for name in SETTINGS:
+            if header.get(name) != settings.get(name):
+                raise ValueError(f"{path} holds a sweep with a different {name} "
+                                 f"({header.get(name)!r}, not {settings.get(name)!r})")
+        good = f.tell()
+        for line in f:
+            try:
+                runs.append(json.loads(line))
+            except ValueError:
+                break
+            good = f.tell()
+        f.truncate(good)
+    return runs
+
+
+def write_summary(path, settings, summaries, total):
+    """Replace the summary file, never leaving a half written one behind"""
+    done = sum(summary["runs"] for summary in summaries.values())
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(dict(settings, ticks_sampled=sample_ticks(settings["ticks"], settings["every"]),
+                       completed=done, total=total, results=list(summaries.values())), f)
+    os.replace(temporary, path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run many seeds of the zombie simulator over a parameter sweep")
+    parser.add_argument("--sweep", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="values of one parameter, repeat for more parameters. "
+                             f"One of {', '.join(PARAMETERS)}")
+    parser.add_argument("--seeds", type=int, default=32, help="runs per combination (default: %(default)s)")
+    parser.add_argument("--first-seed", type=int, default=0, help="seed of the first run of every combination")
+    parser.add_argument("--engine", choices=ENGINES, default="optimized",
+                        help="simulator implementation (default: %(default)s)")
+    parser.add_argument("--size", type=int, nargs=2, default=(100, 100), metavar=("X", "Y"),
+                        help="world size (default: 100 100)")
+    parser.add_argument("--ticks", type=int, default=1000, help="ticks per run (default: %(default)s)")
+    parser.add_argument("--every", type=int, default=10, metavar="N",
+                        help="record the populations every N ticks (default: %(default)s)")
+    parser.add_argument("--threads", type=int, default=1, help="threads per run for the mt engine")
+    parser.add_argument("--spatial-index", default="grid",
+                        help="spatial index of the optimized and mt engines: grid, csr, quadtree or kdtree "
+                             "(default: %(default)s)")
+    parser.add_argument("--fast-forward", action="store_true",
+                        help="project the rest of a run once a species has died out instead of "
+                             "playing it, see fast_forward.py")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="runs in parallel (default: one per CPU)")
+    parser.add_argument("--quantiles", type=float, nargs="+", default=[0.1, 0.5, 0.9],
+                        help="quantiles of the aggregated curves (default: 0.1 0.5 0.9)")
+    parser.add_argument("--output", default="ensemble_runs.jsonl",
+                        help="every finished run, one JSON line each (default: %(default)s)")
+    parser.add_argument("--summary", help="aggregated results, rewritten as runs finish "
+                                          "(default: the output file with a _summary.json suffix)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        sweep = parse_sweep(args.sweep)
+    except ValueError as e:
+        raise SystemExit(e)
+    summary_path = args.summary or os.path.splitext(args.output)[0] + "_summary.json"
+    settings = {
+        "engine": args.engine,
+        "size": list(args.size),
+        "ticks": args.ticks,
+        "every": args.every,
+        "threads": args.threads,
+        "spatial_index": args.spatial_index,
+        "sweep": sweep,
+    }
+    if args.fast_forward:
+        # Left out when off, so sweeps started before the option still resume
+        settings["fast_forward"] = True
+
+    try:
+        finished = read_output(args.output, settings)
+    except ValueError as e:
+        raise SystemExit(e)
+    if not os.path.exists(args.output) or os.path.getsize(args.output) == 0:
+        with open(args.output, "w") as f:
+            f.write(json.dumps(settings) + "\n")
+
+    combos = list(combinations(sweep))
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    runs = {key(params): [] for params in combos}
+    done = set()
+    for run in finished:
+        if key(run["params"]) in runs:
+            runs[key(run["params"])].append(run)
+            done.add((key(run["params"]), run["seed"]))
+
+    # Seed by seed, so early results already cover every combination
+    common = {name: value for name, value in settings.items() if name != "sweep"}
+    pending = [dict(common, params=params, seed=seed) for seed in seeds for params in combos
+               if (key(params), seed) not in done]
+    total = len(combos) * len(seeds)
+    summaries = {name: aggregate(group, args.quantiles) for name, group in runs.items() if group}
+    write_summary(summary_path, settings, summaries, total)
+    if done:
+        print(f"Resuming, {len(done)} of {total} runs already done", file=sys.stderr)
+
+    completed = len(done)
+    with multiprocessing.Pool(args.workers) as pool, open(args.output, "a") as output:
+        for run in pool.imap_unordered(simulate, pending):
+            output.write(json.dumps(run) + "\n")
+            output.flush()
+
+            group = runs[key(run["params"])]
+            group.append(run)
+            summaries[key(run["params"])] = aggregate(group, args.quantiles)
+            write_summary(summary_path, settings, summaries, total)
+
+            completed += 1
+            params = " ".join(f"{name}={value}" for name, value in run["params"].items())
+            fates = ", ".join(f"{species} extinct at {run[species[:-1] + '_extinction']}"
+                              for species in ("humans", "zombies")
+                              if run[species[:-1] + "_extinction"] is not None) or "both survived"
+            print(f"[{completed}/{total}] {params} seed {run['seed']}: {fates} ({run['seconds']:.1f}s)",
+                  file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+# Fast-forward for the tail of a run. Once one species has died out nothing is
+# left to interact: humans only wander, age and reproduce, zombies only wander
+# until they starve, and neither can bring the other species back. These
+# absorbing states don't need the full per agent tick
+#
+# advance() keeps playing the survivors with a reduced model, the vectorized
+# engine's rules for a lone species run on columns, and writes them back so the
+# simulator can still be drawn, checkpointed or updated as usual. outcome()
+# leaves the simulator alone and only follows head counts, humans grouped by the
+# ticks they have left to live and zombies by the ticks until they starve, for
+# callers that only want the end state
+#
+#   played = sim.fast_forward(1000)
+#   result = outcome(sim, 1000)
+
+import math
+from operator import attrgetter
+
+import numpy as np
+
+from spawning import MAX_AGES
+from vectorized_zombiesim import HUMAN_FIELDS, ZOMBIE_FIELDS, Population, bounce
+
+# Agent attribute of the object engines behind each column of the reduced model
+HUMAN_ATTRIBUTES = {"x": "xcord", "y": "ycord", "vx": "xvel", "vy": "yvel",
+                    "age": "age", "max_age": "max_age", "counter": "update_counter"}
+ZOMBIE_ATTRIBUTES = {"x": "xcord", "y": "ycord", "vx": "xvel", "vy": "yvel",
+                     "hunger": "hunger", "max_hunger": "max_hunger", "incr": "incr",
+                     "counter": "update_counter"}
+
+
+def _members(sim, species):
+    """Live agents of one species of an object engine, including the ones waiting to join"""
+    agents = list(getattr(sim, species + "s")) + list(getattr(sim, "new_" + species + "s", ()))
+    return [agent for agent in agents if not agent.is_dead]
+
+
+def survivor(sim):
+    """"human" or "zombie" once the other species has died out, None while both
+    are alive or after both have died"""
+    if hasattr(sim.humans, "fields"):
+        humans, zombies = len(sim.humans), len(sim.zombies)
+    else:
+        humans, zombies = len(_members(sim, "human")), len(_members(sim, "zombie"))
+    if humans and not zombies:
+        return "human"
+    if zombies and not humans:
+        return "zombie"
+    return None
+
+
+def _generator(sim):
+    """NumPy generator for the reduced model. The vectorized engines lend their
+    own, the object engines seed one from theirs so seeded runs still repeat"""
+    if isinstance(sim.rng, np.random.Generator):
+        return sim.rng
+    return np.random.default_rng(sim.rng.getrandbits(64))
+
+
+def add_humans(humans: Population, x, y, rng, speed: float):
+    """Newborn humans at the given coordinates. Columns the reduced model doesn't
+    know about, like advance()'s source column, are filled with -1"""
+    count = len(x)
+    direction = rng.random(count) * 2 * math.pi
+    columns = dict(x=x, y=y,
+                   vx=np.cos(direction) * speed,
+                   vy=np.sin(direction) * speed,
+                   age=np.zeros(count),
+                   max_age=rng.integers(*MAX_AGES, count, endpoint=True),
+                   counter=np.zeros(count),
+                   alive=np.ones(count))
+    for name in humans.fields:
+        columns.setdefault(name, np.full(count, -1))
+    humans.append(**columns)
+
+
+def step_humans(humans: Population, rng, speed: float, birth_odds: int, xbound: float, ybound: float):
+    """One tick of humans with no zombie left: age, reproduce and random walk"""
+    # Check for death by old age
+    humans.alive &= humans.age < humans.max_age
+    humans.compact()
+    humans.age += 1
+
+    # Newborns appear where the parent stood before moving
+    born = np.flatnonzero(rng.integers(0, birth_odds, len(humans)) == 0)
+    newborns = (humans.x[born], humans.y[born])
+
+    # Nothing to flee from, every turn is a random one
+    humans.counter += 1
+    turning = np.flatnonzero(humans.counter >= 3)
+    direction = rng.random(len(turning)) * 2 * math.pi
+    humans.vx[turning] = -np.cos(direction) * speed
+    humans.vy[turning] = np.sin(direction) * speed
+    humans.counter[turning] = 0
+
+    bounce(humans.x, humans.vx, xbound)
+    bounce(humans.y, humans.vy, ybound)
+    humans.x += humans.vx
+    humans.y += humans.vy
+
+    add_humans(humans, *newborns, rng, speed)
+
+
+def step_zombies(zombies: Population, rng, speed: float, xbound: float, ybound: float):
+    """One tick of zombies with no human left: wander and starve"""
+    # Nobody to chase, every zombie picks a new direction every tick
+    direction = rng.random(len(zombies)) * 2 * math.pi
+    zombies.vx[:] = np.cos(direction) * speed
+    zombies.vy[:] = np.sin(direction) * speed
+
+    zombies.hunger += 1
+    zombies.alive &= zombies.hunger < zombies.max_hunger
+    zombies.compact()
+
+    bounce(zombies.x, zombies.vx, xbound)
+    bounce(zombies.y, zombies.vy, ybound)
+    zombies.x += zombies.vx
+    zombies.y += zombies.vy
+
+    zombies.incr += 1
+    zombies.incr[zombies.incr > 6] = 0
+
+    # With no target every zombie searches again each tick and restarts its count
+    zombies.counter[:] = 0
+    zombies.target[:] = -1
+
+
+def _gather(sim, species):
+    """The live agents of one species of an object engine and a Population
+    holding their columns. The source column is each row's position in the list,
+    columns the object engines keep as references, like targets, are -1"""
+    agents = _members(sim, species)
+    attributes = HUMAN_ATTRIBUTES if species == "human" else ZOMBIE_ATTRIBUTES
+    fields = dict(HUMAN_FIELDS if species == "human" else ZOMBIE_FIELDS, source=np.int64)
+    count = len(agents)
+    columns = {field: np.fromiter(map(attrgetter(attribute), agents), dtype=fields[field], count=count)
+               for field, attribute in attributes.items()}
+    columns.update(alive=np.ones(count), source=np.arange(count))
+    for name in fields:
+        columns.setdefault(name, np.full(count, -1))
+    population = Population(fields)
+    population.append(**columns)
+    return agents, population
+
+
+def _scatter(sim, species, agents, population):
+    """Put the reduced model's rows back into agent objects. Survivors keep their
+    object, newborns come from the simulator's pool and the dead go back to it"""
+    attributes = HUMAN_ATTRIBUTES if species == "human" else ZOMBIE_ATTRIBUTES
+    pool = getattr(sim, species + "_pool")
+    xs = population.x.tolist()
+    ys = population.y.tolist()
+
+    members = []
+    for row, source in enumerate(population.source.tolist()):
+        members.append(agents[source] if source >= 0 else pool.acquire(xs[row], ys[row]))
+    for field, attribute in attributes.items():
+        list(map(setattr, members, [attribute] * len(members), getattr(population, field).tolist()))
+
+    # The other species is gone, nobody is being chased or fled from
+    target = "closest_zombie" if species == "human" else "closest_human"
+    for agent in members:
+        setattr(agent, target, None)
+
+    kept = set(map(id, members))
+    dead = [agent for agent in agents if id(agent) not in kept]
+    for agent in dead:
+        agent.is_dead = True
+    pool.release(dead)
+
+    registry = getattr(sim, species + "s")
+    registry[:] = members
+    registry.tombstones = 0
+    setattr(sim, "new_" + species + "s", [])
+    sim.update_spatial_grid()
+
+
+def advance(sim, ticks: int, callback=None):
+    """Play up to ticks ticks of a simulator whose humans or zombies have all died,
+    with the reduced model. Returns the number of ticks played: fewer than asked
+    once the last survivor dies, 0 while both species are alive. callback, if
+    given, gets the populations (humans, zombies) after every tick"""
+    species = survivor(sim)
+    if species is None or ticks <= 0:
+        return 0
+
+    rng = _generator(sim)
+    columnar = hasattr(sim.humans, "fields")
+    if columnar:
+        agents, population = None, getattr(sim, species + "s")
+    else:
+        agents, population = _gather(sim, species)
+
+    played = 0
+    while played < ticks and len(population):
+        if species == "human":
+            step_humans(population, rng, sim.human_speed, sim.birth_odds, sim.xbound, sim.ybound)
+        else:
+            step_zombies(population, rng, sim.zombie_speed, sim.xbound, sim.ybound)
+        played += 1
+        if callback is not None:
+            callback(*((len(population), 0) if species == "human" else (0, len(population))))
+
+    if not columnar:
+        _scatter(sim, species, agents, population)
+    return played
+
+
+class Outcome(object):
+    """How a run whose humans or zombies have died out ends. history holds the
+    populations (humans, zombies) after each tick played, which stops at the tick
+    limit or when the last survivor dies"""
+
+    def __init__(self, history):
+        self.history = history
+
+    @property
+    def ticks(self):
+        return len(self.history)
+
+    @property
+    def humans(self):
+        return self.history[-1][0] if self.history else 0
+
+    @property
+    def zombies(self):
+        return self.history[-1][1] if self.history else 0
+
+    @property
+    def extinct_at(self):
+        """Ticks until both species had died out, None if some survived the limit"""
+        return self.ticks if not (self.humans or self.zombies) else None
+
+
+def _column(sim, species, name):
+    """One integer field of every live agent of a species, whatever the engine"""
+    if hasattr(sim.humans, "fields"):
+        return np.asarray(getattr(getattr(sim, species + "s"), name), dtype=np.int64)
+    agents = _members(sim, species)
+    return np.fromiter(map(attrgetter(name), agents), dtype=np.int64, count=len(agents))
+
+
+def outcome(sim, ticks: int, seed=None):
+    """Outcome of the next ticks ticks of a simulator whose humans or zombies have
+    all died, without touching it. Zombies starve on a fixed schedule, so their
+    counts are exact. Humans are followed as counts per remaining lifetime, which
+    costs the same per tick whatever their number and gives the same distribution
+    of outcomes as playing them out. seed defaults to a draw from the simulator's rng"""
+    species = survivor(sim)
+    if species is None:
+        raise ValueError("fast-forward needs a simulator where exactly one species is left")
+
+    if species == "zombie":
+        # A zombie with hunger h starves on tick max_hunger - h, counting from 1
+        starving = _column(sim, "zombie", "max_hunger") - _column(sim, "zombie", "hunger")
+        alive = len(starving) - np.cumsum(np.bincount(starving))
+        played = min(ticks, len(alive) - 1)
+        return Outcome([(0, int(count)) for count in alive[1:played + 1]])
+
+    if seed is None:
+        seed = _generator(sim).integers(2 ** 63)
+    rng = np.random.default_rng(seed)
+    birth_chance = 1 / sim.birth_odds
+    lifetimes = MAX_AGES[1] - MAX_AGES[0] + 1
+
+    # remaining[r] humans have r more birthdays before they die of old age
+    remaining = np.bincount(np.maximum(_column(sim, "human", "max_age") - _column(sim, "human", "age"), 0),
+                            minlength=MAX_AGES[1] + 1)
+    history = []
+    while len(history) < ticks and remaining.any():
+        # Those out of birthdays die, everyone else ages and may reproduce
+        remaining[:-1] = remaining[1:]
+        remaining[-1] = 0
+        births = rng.binomial(int(remaining.sum()), birth_chance)
+        remaining[MAX_AGES[0]:MAX_AGES[1] + 1] += rng.multinomial(births, np.full(lifetimes, 1 / lifetimes))
+        history.append((int(remaining.sum()), 0))
+    return Outcome(history)
@@ -0,0 +1,122 @@
+# Optional per-tick measurements for the object based simulators. A simulator
+# without an Instrumentation attached runs its phases straight through, so
+# measuring costs nothing until it is switched on
+#
+#   sim.instrumentation = Instrumentation(callback=print)
+
+import time
+
+
+def cell_sizes(sim):
+    """Species -> grid cell size of any engine, leaving out indexes without cells.
+    The vectorized engines share one size between both species"""
+    if hasattr(sim, "indexes"):
+        return {species: index.cell_size for species, index in sim.indexes.items()
+                if hasattr(index, "cell_size")}
+    if hasattr(sim, "search_radius"):
+        return {"human": sim.cell_size, "zombie": sim.cell_size}
+    return {}
+
+
+class TickStats(object):
+    """What happened during one tick"""
+
+    def __init__(self, tick: int):
+        self.tick = tick
+        self.phase_seconds = {}  # Phase method name -> seconds spent in it
+
+        # Spatial index work, zero for simulators without an index
+        self.queries = 0  # nearest() and query_radius() calls
+        self.candidates = 0  # Agents those calls compared distances against
+        self.cell_sizes = {}  # Species -> cell size of its grid, which auto_cell_size may change
+
+        # Thread use of the mt engine, empty for the others
+        self.threads = {}  # Species -> threads its decide phase ran on
+        self.thread_cutoffs = {}  # Species -> fewest agents for which auto_threads expects threads to pay off
+
+        self.eats = 0  # Humans eaten by zombies
+        self.human_deaths = 0  # Including the eaten ones
+        self.zombie_deaths = 0
+        self.births = 0
+        self.conversions = 0  # Eaten humans that turned
+
+        # Populations at the end of the tick
+        self.humans = 0
+        self.zombies = 0
+        self.dormant = 0  # Humans that slept through the tick under level of detail
+
+    @property
+    def seconds(self):
+        return sum(self.phase_seconds.values())
+
+    @property
+    def deaths(self):
+        return self.human_deaths + self.zombie_deaths
+
+    def as_dict(self):
+        return dict(vars(self), seconds=self.seconds, deaths=self.deaths)
+
+    def __repr__(self):
+        phases = ", ".join(f"{phase} {seconds * 1000:.2f}ms" for phase, seconds in self.phase_seconds.items())
+        return (f"TickStats(tick {self.tick}: {phases}; {self.queries} queries, "
+                f"{self.candidates} candidates, {self.eats} eats, {self.deaths} deaths)")
+
+
+class Instrumentation(object):
+    """Steps a simulator through its phases with a timer around each one and
+    collects a TickStats per tick. The latest one is kept in `last` and, if a
+    callback was given, handed to it once the tick is over.
+
+    Counters come from the simulator's own bookkeeping: its agent registries'
+    tombstones, the new agent lists and the spatial indexes' running totals.
+    The mt engine's decide batches tally their own queries, which its commit
+    phase adds to those totals, so its counts are exact whatever the threads"""
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.ticks = 0
+        self.last = None
+
+    def index_totals(self, sim):
+        """Queries and candidates so far over all of the simulator's indexes"""
+        indexes = getattr(sim, "indexes", {}).values()
+        return sum(index.queries for index in indexes), sum(index.scanned for index in indexes)
+
+    def run_tick(self, sim):
+        """Run one tick of sim, measuring it"""
+        stats = TickStats(self.ticks)
+        queries, scanned = self.index_totals(sim)
+        clock = time.perf_counter
+
+        for phase in sim.phases:
+            if phase == "update_zombies":
+                eaten_before = sim.humans.tombstones
+            elif phase == "merge_new_agents":
+                # Deaths and new agents are only visible until they are merged
+                stats.eats = sim.humans.tombstones - eaten_before
+                stats.human_deaths = sim.humans.tombstones
+                stats.zombie_deaths = sim.zombies.tombstones
+                # Agents spawned by hand wait in the same lists, but aren't births
+                # or conversions
+                stats.births = len(sim.new_humans) - sim.spawned_humans
+                stats.conversions = sim.conversions
+
+            start = clock()
+            getattr(sim, phase)()
+            stats.phase_seconds[phase] = clock() - start
+
+        queries_after, scanned_after = self.index_totals(sim)
+        stats.queries = queries_after - queries
+        stats.candidates = scanned_after - scanned
+        stats.cell_sizes = cell_sizes(sim)
+        stats.threads = dict(getattr(sim, "threads_used", {}))
+        stats.thread_cutoffs = {species: tuner.cutoff for species, tuner in getattr(sim, "thread_tuners", {}).items()}
+        stats.humans = len(sim.humans)
+        stats.zombies = len(sim.zombies)
+        stats.dormant = getattr(sim, "dormant_humans", 0)
+
+        self.ticks += 1
+        self.last = stats
+        if self.callback is not None:
+            self.callback(stats)
+        return stats
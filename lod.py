@@ -0,0 +1,131 @@
+# Level of detail for the humans of the object engines. In a large world most
+# humans are nowhere near a zombie, yet each of them still runs its own update()
+# and looks for the closest zombie every 3 ticks, scanning all the way out to the
+# flee range. With level of detail on, every RECHECK ticks one batched pass over
+# all humans puts those with no zombie within the safety radius to sleep. Sleepers
+# skip update() altogether: a single NumPy step per tick ages them, lets them
+# reproduce and walks them at random, which is all an awake human does with no
+# zombie in range. The next pass wakes the ones the outbreak has come close to
+#
+# The safety radius is the farthest a human reacts to a zombie from, plus how far
+# a sleeper and the zombie front can close in on each other before the next pass,
+# so nothing a sleeper skips could have mattered. Sleepers stay in the human
+# index, filed where the last pass saw them, which is just as far out of every
+# zombie's sight. Which humans sleep is kept in their dormant slot, so
+# checkpoints carry it along
+
+from operator import attrgetter
+import math
+
+import numpy as np
+
+from contacts import REACH, positions
+from vectorized_zombiesim import CellIndex, bounce
+
+# Ticks between two passes
+RECHECK = 10
+
+
+def safety_radius(sim):
+    """Distance from every zombie beyond which a human can sleep until the next pass"""
+    reacts = max(sim.xbound / 4, sim.zombie_sight, REACH)
+    # Every tick the sleeper walks a step, its index entry falls a step further
+    # behind, and the front moves a zombie's step plus the reach of a conversion
+    return reacts + RECHECK * (2 * sim.human_speed + sim.zombie_speed + REACH)
+
+
+def classify(sim):
+    """Put the humans with no zombie within the safety radius to sleep and wake
+    the rest, zombies waiting to join included"""
+    humans = [human for human in sim.humans if not human.is_dead]
+    zombies = [zombie for zombie in list(sim.zombies) + list(sim.new_zombies) if not zombie.is_dead]
+    if not humans:
+        return
+    if zombies:
+        radius = safety_radius(sim)
+        cols = int(sim.xbound // radius) + 1
+        rows = int(sim.ybound // radius) + 1
+        threats = CellIndex(*positions(zombies), radius, cols, rows)
+        closest, _ = threats.nearest(*positions(humans), 1, radius * radius)
+        asleep = (closest < 0).tolist()
+    else:
+        asleep = [True] * len(humans)
+
+    index = sim.get_index("human")
+    for human, sleeping in zip(humans, asleep):
+        if human.dormant:
+            # Asleep or just woken, either way its index entry is out of date
+            index.update(human)
+        if sleeping:
+            human.closest_zombie = None
+        human.dormant = sleeping
+
+
+def _column(agents, name, dtype):
+    return np.fromiter(map(attrgetter(name), agents), dtype=dtype, count=len(agents))
+
+
+def _store(agents, name, values):
+    list(map(setattr, agents, [name] * len(agents), values.tolist()))
+
+
+def step(sim, sleepers):
+    """One tick of every sleeping human: age, reproduce and random walk"""
+    if not sleepers:
+        return
+    rng = np.random.default_rng(sim.rng.getrandbits(64))
+
+    # Check for death by old age
+    old = _column(sleepers, "age", np.int64) >= _column(sleepers, "max_age", np.int64)
+    for i in np.flatnonzero(old).tolist():
+        sleepers[i].die()
+    sleepers = [human for human, dead in zip(sleepers, old.tolist()) if not dead]
+    count = len(sleepers)
+
+    x = _column(sleepers, "xcord", np.float64)
+    y = _column(sleepers, "ycord", np.float64)
+    vx = _column(sleepers, "xvel", np.float64)
+    vy = _column(sleepers, "yvel", np.float64)
+    counter = _column(sleepers, "update_counter", np.int64) + 1
+
+    # Children are born where the parent stood, far from any zombie as well
+    for i in np.flatnonzero(rng.integers(0, sim.birth_odds, count) == 0).tolist():
+        child = sim.human_pool.acquire(x[i].item(), y[i].item())
+        child.dormant = True
+        sim.new_humans.append(child)
+
+    # Nothing to flee from, every turn is a random one
+    turning = np.flatnonzero(counter >= 3)
+    direction = rng.random(len(turning)) * 2 * math.pi
+    vx[turning] = -np.cos(direction) * sim.human_speed
+    vy[turning] = np.sin(direction) * sim.human_speed
+    counter[turning] = 0
+
+    bounce(x, vx, sim.xbound)
+    bounce(y, vy, sim.ybound)
+    x += vx
+    y += vy
+
+    _store(sleepers, "age", _column(sleepers, "age", np.int64) + 1)
+    _store(sleepers, "update_counter", counter)
+    _store(sleepers, "xvel", vx)
+    _store(sleepers, "yvel", vy)
+    _store(sleepers, "xcord", x)
+    _store(sleepers, "ycord", y)
+
+
+def update(sim):
+    """The level of detail part of a tick: a pass if one is due, then one step for
+    the sleepers. Returns the awake humans, which still need their own update"""
+    if sim.lod_countdown <= 0:
+        classify(sim)
+        sim.lod_countdown = RECHECK
+    sim.lod_countdown -= 1
+
+    awake = []
+    sleepers = []
+    for human in sim.humans:
+        (sleepers if human.dormant else awake).append(human)
+    step(sim, sleepers)
+    sim.dormant_humans = len(sleepers)
+    return awake
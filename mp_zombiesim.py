@@ -0,0 +1,298 @@
+# Process pool version of vectorized_zombiesim.py. mt_zombiesim is held back by the
+# GIL, so this engine keeps agent columns in shared memory and hands the
+# nearest-neighbour searches for each vertical strip of the world to its own process.
+# The parent sorts the queries and the targets by cell column once per search, so
+# each worker only reads its own strip's queries and the targets within reach of
+# them, a halo of search_radius cells either side
+#
+# Only those searches are split up. Aging, movement, eating, births and compaction
+# still run in the parent process on the whole population, so they set a floor no
+# number of workers gets below. With 300k agents the searches take about nine
+# tenths of a tick, which caps the speedup near 10x however many cores there are
+
+import math
+import multiprocessing
+import weakref
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+from vectorized_zombiesim import CellIndex, Population, Simulator as VectorizedSimulator
+
+# Below this many queries the round trip to the workers costs more than it saves
+MIN_PARALLEL_QUERIES = 2048
+
+
+def _destroy(shm):
+    """Remove a shared block, whether close() got to it or the garbage collector did"""
+    shm.unlink()
+    try:
+        shm.close()
+    except BufferError:
+        # Views of it are still around, the mapping goes when they do
+        pass
+
+
+class SharedArray(object):
+    """A growable NumPy array stored in a multiprocessing.shared_memory block.
+    The block is removed by close(), or failing that once the array is garbage
+    collected or the interpreter exits"""
+
+    def __init__(self, dtype, capacity: int):
+        self.dtype = np.dtype(dtype)
+        self.capacity = 0
+        self.shm = None
+        self.array = None
+        self.finalizer = None
+        self.reserve(capacity)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def reserve(self, capacity: int):
+        """Make room for at least capacity items, keeping the current contents"""
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2, 1)
+        shm = shared_memory.SharedMemory(create=True, size=capacity * self.dtype.itemsize)
+        array = np.ndarray(capacity, dtype=self.dtype, buffer=shm.buf)
+        if self.array is not None:
+            array[:self.capacity] = self.array
+            self.close()
+        self.shm = shm
+        self.array = array
+        self.capacity = capacity
+        self.finalizer = weakref.finalize(self, _destroy, shm)
+
+    def close(self):
+        """Release and destroy the shared block"""
+        if self.shm is not None:
+            self.array = None
+            self.finalizer()
+            self.shm = None
+
+
+class SharedPopulation(Population):
+    """Population whose columns are views into shared memory blocks"""
+
+    def __init__(self, fields: dict, capacity: int = 1024):
+        self.fields = fields
+        self.count = 0
+        self.buffers = {name: SharedArray(dtype, capacity) for name, dtype in fields.items()}
+        self._view()
+
+    def _view(self):
+        for name, buffer in self.buffers.items():
+            setattr(self, name, buffer.array[:self.count])
+
+    def append(self, **columns):
+        """Add new agents, every column must be given"""
+        added = len(columns["x"])
+        end = self.count + added
+        for name, buffer in self.buffers.items():
+            buffer.reserve(end)
+            buffer.array[self.count:end] = columns[name]
+        self.count = end
+        self._view()
+
+    def compact(self):
+        """Drop every agent whose alive flag has been cleared"""
+        keep = self.alive
+        if keep.all():
+            return
+        survivors = int(keep.sum())
+        for name, buffer in self.buffers.items():
+            buffer.array[:survivors] = getattr(self, name)[keep]
+        self.count = survivors
+        self._view()
+
+    def describe(self):
+        """Block name and length of the position columns, for the workers"""
+        return {name: self.buffers[name].name for name in ("x", "y")}, self.count
+
+    def close(self):
+        for buffer in self.buffers.values():
+            buffer.close()
+
+
+# Shared blocks a worker process has attached to, by name
+_attached = {}
+
+
+def _attach(name: str, dtype, count: int):
+    """View count items of a shared block created by the parent process"""
+    if name not in _attached:
+        # Pool workers share the parent's resource tracker, so the block stays
+        # registered once and is unregistered when the parent unlinks it
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(count, dtype=dtype, buffer=_attached[name].buf)
+
+
+def _release(live_names):
+    """Detach from blocks the parent has since replaced"""
+    for name in list(_attached):
+        if name not in live_names:
+            _attached.pop(name).close()
+
+
+def _nearest_strip(task):
+    """Worker entry point, nearest target for the queries of one strip. The parent
+    sorted the queries and the target order by cell column, so the strip's queries
+    and the targets they can reach are the given ranges of them. Results are written
+    straight into the shared output, the return value is the number of candidates
+    compared"""
+    geometry = task["geometry"]
+    cell_size, cols, rows, search_radius = geometry
+    names = task["names"]
+    _release(task["live"])
+
+    first, last = task["queries"]
+    if first == last:
+        return 0
+    num_queries = task["num_queries"]
+    qx = _attach(names["qx"], np.float64, num_queries)[first:last]
+    qy = _attach(names["qy"], np.float64, num_queries)[first:last]
+    out_index = _attach(names["index"], np.intp, num_queries)
+    out_dist2 = _attach(names["dist2"], np.float64, num_queries)
+
+    # Targets in the strip plus a halo of search_radius cells either side
+    num_targets = task["num_targets"]
+    target_first, target_last = task["targets"]
+    reachable = _attach(names["order"], np.intp, num_targets)[target_first:target_last]
+    tx = _attach(names["tx"], np.float64, num_targets)[reachable]
+    ty = _attach(names["ty"], np.float64, num_targets)[reachable]
+    index = CellIndex(tx, ty, cell_size, cols, rows)
+    found, dist2 = index.nearest(qx, qy, search_radius, task["max_dist2"])
+
+    hit = found >= 0
+    found[hit] = reachable[found[hit]]
+    out_index[first:last] = found
+    out_dist2[first:last] = dist2
+    return index.scanned
+
+
+class Simulator(VectorizedSimulator):
+    """Vectorized simulator that shards neighbour searches over worker processes,
+    the rest of the tick runs in this process. Model parameters such as immunity
+    are passed on to the vectorized simulator"""
+
+    population_class = SharedPopulation
+
+    def __init__(self, xbound: int, ybound: int, num_humans: int, num_zombies: int, debug: bool,
+                 num_workers: int = 4, seed: int = None, **parameters):
+        self.num_workers = num_workers
+
+        # Query coordinates, sorted by cell column, the targets in the same order
+        # and the results exchanged with the workers
+        self.query_x = SharedArray(np.float64, 1024)
+        self.query_y = SharedArray(np.float64, 1024)
+        self.target_order = SharedArray(np.intp, 1024)
+        self.result_index = SharedArray(np.intp, 1024)
+        self.result_dist2 = SharedArray(np.float64, 1024)
+
+        super().__init__(xbound, ybound, num_humans, num_zombies, debug, seed, **parameters)
+
+        # Last, so there is no pool left running if the setup above fails. The
+        # tracker is started before the workers so they share it, a tracker of
+        # their own would try to clean up the parent's blocks when they exit
+        resource_tracker.ensure_running()
+        self.pool = multiprocessing.Pool(num_workers)
+
+    def shared_names(self):
+        """Names of every shared block currently in use"""
+        buffers = self.exchange_buffers()
+        buffers += list(self.humans.buffers.values()) + list(self.zombies.buffers.values())
+        return {buffer.name for buffer in buffers}
+
+    def exchange_buffers(self):
+        """Shared blocks the queries and their results go through"""
+        return [self.query_x, self.query_y, self.target_order, self.result_index, self.result_dist2]
+
+    def column_of(self, x):
+        """Cell column of every x coordinate, clamped to the grid"""
+        return np.clip((x // self.cell_size).astype(np.intp), 0, self.cols - 1)
+
+    def strips(self, query_cols):
+        """Split the cell columns into one strip per worker holding about the same
+        number of queries"""
+        cumulative = np.cumsum(np.bincount(query_cols, minlength=self.cols))
+        quotas = np.arange(1, self.num_workers) * (cumulative[-1] / self.num_workers)
+        bounds = np.searchsorted(cumulative, quotas, side="right")
+        edges = [0] + sorted(set(int(b) for b in bounds) - {0, self.cols}) + [self.cols]
+        return list(zip(edges[:-1], edges[1:]))
+
+    def closest(self, qx, qy, targets: Population, max_dist2: float = math.inf):
+        """Closest agent of targets to every query point, as (index, squared distance)"""
+        num_queries = len(qx)
+        if num_queries < MIN_PARALLEL_QUERIES or len(targets) == 0:
+            return super().closest(qx, qy, targets, max_dist2)
+        if self.auto_cell_size:
+            max_dist2 = min(max_dist2, self.sight ** 2)
+
+        num_targets = len(targets)
+        for buffer in (self.query_x, self.query_y, self.result_index, self.result_dist2):
+            buffer.reserve(num_queries)
+        self.target_order.reserve(num_targets)
+
+        # Sort the queries and the targets by cell column once, so the queries of
+        # a strip and the targets they can reach are two contiguous ranges. The
+        # sort is stable, so candidates are compared in the same order as in the
+        # vectorized engine and ties go the same way
+        query_cols = self.column_of(qx)
+        query_order = np.argsort(query_cols, kind="stable")
+        query_cols = query_cols[query_order]
+        self.query_x.array[:num_queries] = qx[query_order]
+        self.query_y.array[:num_queries] = qy[query_order]
+        target_cols = self.column_of(targets.x)
+        target_order = np.argsort(target_cols, kind="stable")
+        target_cols = target_cols[target_order]
+        self.target_order.array[:num_targets] = target_order
+
+        target_names, _ = targets.describe()
+        names = {
+            "qx": self.query_x.name,
+            "qy": self.query_y.name,
+            "order": self.target_order.name,
+            "index": self.result_index.name,
+            "dist2": self.result_dist2.name,
+            "tx": target_names["x"],
+            "ty": target_names["y"],
+        }
+        geometry = (self.cell_size, self.cols, self.rows, self.search_radius)
+        live = self.shared_names()
+        tasks = []
+        for first_col, last_col in self.strips(query_cols):
+            halo = (first_col - self.search_radius, last_col + self.search_radius)
+            tasks.append({
+                "names": names,
+                "geometry": geometry,
+                "queries": tuple(int(i) for i in np.searchsorted(query_cols, (first_col, last_col))),
+                "targets": tuple(int(i) for i in np.searchsorted(target_cols, halo)),
+                "num_queries": num_queries,
+                "num_targets": num_targets,
+                "max_dist2": max_dist2,
+                "live": live,
+            })
+        self.count_queries(num_queries, sum(self.pool.map(_nearest_strip, tasks)))
+
+        # Back from column order to the order of the queries
+        index = np.empty(num_queries, dtype=np.intp)
+        dist2 = np.empty(num_queries)
+        index[query_order] = self.result_index.array[:num_queries]
+        dist2[query_order] = self.result_dist2.array[:num_queries]
+        return index, dist2
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        self.pool.close()
+        self.pool.join()
+        for buffer in self.exchange_buffers():
+            buffer.close()
+        self.humans.close()
+        self.zombies.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
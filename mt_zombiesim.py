@@ -1,8 +1,50 @@
 # created from optimized_zombiesim.py by chatting more with Claude
+#
+# Each tick runs in two phases per species. In the decide phase every agent reads
+# a frozen snapshot of the other species and writes only to its own fields, so
+# batches of agents run on the thread pool without any locking. The commit phase
+# then applies everything that touches shared state (spatial index moves, births
+# and deaths) from a single thread. Eats and conversions come after the zombies'
+# commit, resolved for every zombie at once (see contacts.py).
+#
+# Randomness follows the same split. The decide phase cuts the agents into batches
+# of BATCH_SIZE, each drawing from its own stream seeded from the simulator's rng
+# before the batches start, and the commit phase draws from the simulator's rng
+# itself. A given seed therefore reproduces a run exactly, whatever the thread
+# count and however the threads get scheduled, which lets the worker pool change
+# size mid run (see worker_pool.py).
+#
+# On a free-threaded build (3.13t and later, with the GIL off) the batches really
+# run side by side, so who may touch what is spelled out:
+#   * read by every thread during a decide phase, written by none: the spatial
+#     indexes, the agents of the species that isn't deciding, the model parameters.
+#     The "csr" grid sorts itself on its first query after changes, under its own
+#     lock, and nothing changes it while a decide phase runs
+#   * owned by one batch: the slots of its own agents, its random stream, the
+#     dying/moved/acting lists it returns and its tally of index queries, kept in
+#     self.batch (thread local) and added to the index totals at commit
+#   * touched only by the simulation thread, between phases: the registries, the
+#     agent pools, index writes, self.rng, the thread and cell tuners
+#   * guarded by self.lock, as the GUI thread adds to them: new_humans,
+#     new_zombies, the spawn tallies, lod_countdown and spawn_seed, which seeds
+#     the random stream of the next spawn so spawns never draw from self.rng
+# The human and zombie decide phases themselves stay one after the other, each
+# reads the other species frozen. With free_threading on, which is the default
+# when the GIL is off, the work that is split by species (building and tuning
+# each species' index) also runs on two threads at once, each owning one index.
 import random, math
 import threading
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+import time
+
+import contacts
+import spawning
+from agent_registry import AgentPool, AgentRegistry
+from cell_tuning import GRID_CELL_COST, CellTuner, geometric_sizes
+from spatial_index import make_spatial_index
+from worker_pool import ThreadTuner, WorkerPool, gil_enabled, worker_counts
+
+# Agents per batch of the decide phase
+BATCH_SIZE = 1024
 
 def get_velocity(speed: float, direction: float):
     """Takes a speed and direction and returns change in x and y coords"""
@@ -21,165 +63,391 @@ def distance_squared(x1, y1, x2, y2):
 class Simulator(object):
     """The master object that holds all the game state"""
 
-    def __init__(self, xbound: int, ybound: int, num_humans: int, num_zombies: int, debug: bool, num_threads: int = 4):
+    def __init__(self, xbound: int, ybound: int, num_humans: int, num_zombies: int, debug: bool, num_threads: int = 4,
+                 spatial_index: str = "grid", seed: int = None, immunity: float = 0.3,
+                 human_speed: float = 1, zombie_speed: float = 0.8, birth_odds: int = 500,
+                 auto_cell_size: bool = False, level_of_detail: bool = False, auto_threads: bool = False,
+                 free_threading: bool = None):
         self.xbound = xbound
         self.ybound = ybound
         
-        self.humans = []
-        self.zombies = []
+        # Every random draw of the simulation comes from here, directly or through
+        # the per batch streams it seeds
+        self.rng = random.Random(seed)
+        
+        # Dead agents are tombstoned during the tick and compacted at its end
+        self.humans = AgentRegistry()
+        self.zombies = AgentRegistry()
         self.new_humans = []
         self.new_zombies = []
         
+        # Tallies of the current tick, until its new agents are merged
+        self.conversions = 0  # Eaten humans that turned
+        self.spawned_humans = 0  # Humans in new_humans that spawn_humans() added
+        
         self.debug = debug
         self.num_threads = num_threads
         
-        # Thread safety
-        self.lock = threading.RLock()  # Reentrant lock for nested acquire/release
+        # Optional per tick measurements, see instrumentation.py
+        self.instrumentation = None
         
-        # Thread pool for parallel processing
-        self.executor = ThreadPoolExecutor(max_workers=num_threads)
-        
-        # Spatial partitioning - divide the space into cells
-        self.cell_size = 10  # Size of each cell in the grid
-        self.grid = defaultdict(list)  # Will hold agents by grid cell
-        
-        for _ in range(0, num_humans):
-            self.humans.append(Human(random.randint(0, xbound), random.randint(0, ybound), 
-                                    xbound, ybound, 0.3, self))
-
-        for _ in range(0, num_zombies):
-            self.zombies.append(Zombie(random.randint(0, xbound), random.randint(0, ybound), 
-                                      xbound, ybound, self))
+        # Only guards what the GUI can change while a tick is running, see the
+        # top of the file. Everything else is covered by the two phase tick
+        self.lock = threading.RLock()
         
-        # Add all entities to the spatial grid
+        # Thread pool for the decide phase, it follows num_threads between ticks.
+        # With auto_threads each species' decide phase runs on as many of those
+        # threads as has proven fastest for its population, serially if none
+        # (see worker_pool.py)
+        self.pool = WorkerPool(num_threads)
+        self.auto_threads = auto_threads
+        self.thread_tuners = {}
+        self.threads_used = {}  # Species -> threads its last decide phase ran on
+        
+        # What the decide batch running on each thread owns, see the top of the file
+        self.batch = threading.local()
+        
+        # Per species work runs on two threads at once, only worth it without the GIL
+        self.free_threading = not gil_enabled() if free_threading is None else free_threading
+        
+        # Spatial partitioning, one index per species (see spatial_index.py)
+        self.spatial_index = spatial_index  # "grid", "csr", "quadtree" or "kdtree"
+        self.cell_size = 10  # Size of each cell when using the grid
+        self.zombie_sight = 20  # How far away a zombie notices humans
+        self.indexes = {}
+        
+        # With auto_cell_size each species' grid gets a tuner that moves it to the
+        # cell size with the cheapest queries (see cell_tuning.py)
+        self.auto_cell_size = auto_cell_size
+        self.cell_tuners = {}
+        if auto_cell_size:
+            if spatial_index not in ("grid", "csr"):
+                raise ValueError(f"auto_cell_size needs a grid spatial index, not {spatial_index!r}")
+            sizes = geometric_sizes(self.cell_size, 1, max(xbound, ybound))
+            self.cell_tuners = {species: CellTuner(sizes, self.cell_size, GRID_CELL_COST)
+                                for species in ("human", "zombie")}
+        
+        # With level_of_detail humans far from every zombie sleep through a cheap
+        # batched update instead of their own (see lod.py)
+        self.level_of_detail = level_of_detail
+        self.lod_countdown = 0  # Ticks until the next pass sorts sleepers from the rest
+        self.dormant_humans = 0  # Asleep during the last tick
+        
+        # Model parameters
+        self.immunity = immunity  # Chance an eaten human dies instead of turning
+        self.human_speed = human_speed
+        self.zombie_speed = zombie_speed
+        self.birth_odds = birth_odds  # Each human has a 1 in birth_odds chance to reproduce per tick
+        
+        # Agent classes bound to this simulator, every agent reads the bounds, the
+        # model parameters and the simulator from its class instead of keeping its own copy
+        shared = {"__slots__": (), "sim": self, "xbound": xbound, "ybound": ybound}
+        self.Human = type("Human", (Human,), dict(shared, immunity=immunity, speed=human_speed,
+                                                  birth_odds=birth_odds))
+        self.Zombie = type("Zombie", (Zombie,), dict(shared, speed=zombie_speed))
+        
+        # Dead agents are recycled for births and conversions. Humans only look
+        # for a new closest zombie every 3 ticks, so dead zombies wait that long
+        self.human_pool = AgentPool(self.Human)
+        self.zombie_pool = AgentPool(self.Zombie, delay=3)
+        
+        # The starting populations are built in bulk and join straight away
+        self.humans.extend(spawning.make_humans(self, num_humans))
+        self.zombies.extend(spawning.make_zombies(self, num_zombies))
+        
+        # Later spawns each draw from a stream of their own, seeded in a chain
+        # starting here
+        self.spawn_seed = self.rng.getrandbits(64)
+        
+        # Add all entities to the spatial indexes
         self.update_spatial_grid()
 
+    def get_index(self, species):
+        """Spatial index holding one species, created the first time it is asked for"""
+        if species not in self.indexes:
+            self.indexes[species] = make_spatial_index(
+                self.spatial_index, self.xbound, self.ybound, cell_size=self.cell_size)
+        return self.indexes[species]
+
+    def for_each_species(self, work):
+        """work(species, agents) for humans then zombies. In free threading mode the
+        two run on the pool at once, so work may only touch that species' own index
+        and tuner"""
+        species = ("human", "zombie")
+        agents = (self.humans, self.zombies)
+        self.pool.run(work, species, agents, workers=2 if self.free_threading else 1)
+
     def update_spatial_grid(self):
-        """Update the spatial partitioning grid with current agent positions"""
-        # Create a new grid to avoid modification during iteration
-        new_grid = defaultdict(list)
-        
-        for human in self.humans:
-            cell_x = int(human.xcord // self.cell_size)
-            cell_y = int(human.ycord // self.cell_size)
-            new_grid[(cell_x, cell_y)].append(("human", human))
-            
-        for zombie in self.zombies:
-            cell_x = int(zombie.xcord // self.cell_size)
-            cell_y = int(zombie.ycord // self.cell_size)
-            new_grid[(cell_x, cell_y)].append(("zombie", zombie))
-        
-        # Thread-safe grid update
+        """Rebuild the spatial indexes from scratch"""
+        # Both indexes exist before any thread can ask for them
+        self.get_index("human")
+        self.get_index("zombie")
+        self.for_each_species(lambda species, agents: self.get_index(species).build(agents))
+
+    def refresh_indexes(self):
+        """Rebuild the indexes that cannot follow agents as they move"""
+        self.for_each_species(self.refresh_index)
+
+    def refresh_index(self, species, agents):
+        index = self.get_index(species)
+        if not index.incremental:
+            index.build(agents)
+        
+        if self.cell_tuners:
+            self.tune_cells(species, agents)
+
+    def tune_cells(self, species, agents):
+        """Rebuild the grid of a species if its tuner picked a new cell size"""
+        index = self.get_index(species)
+        size = self.cell_tuners[species].tick(index.queries, index.cells, index.scanned, len(agents))
+        if size is not None:
+            index.cell_size = size
+            index.build(agents)
+
+    def spawn_humans(self, count: int, region=None):
+        """Add count humans at random whole coordinates of region, (x0, y0, x1, y1)
+        and the whole world by default, all drawn and built in one batch (see
+        spawning.py). Like newborns they join at the end of the current tick,
+        and the GUI thread can call this while a tick runs. Returns the new humans"""
+        humans = spawning.make_humans(self, count, region, self.spawn_rng())
+        with self.lock:
+            self.new_humans.extend(humans)
+            self.spawned_humans += count
+        return humans
+
+    def spawn_zombies(self, count: int, region=None):
+        """Add count zombies at random whole coordinates of region, the same way
+        as spawn_humans(). Returns the new zombies"""
+        zombies = spawning.make_zombies(self, count, region, self.spawn_rng())
         with self.lock:
-            self.grid = new_grid
+            # They can turn up next to sleeping humans, who must be woken first
+            self.lod_countdown = 0
+            self.new_zombies.extend(zombies)
+        return zombies
+
+    def spawn_rng(self):
+        """Generator for one spawn, the next link of the spawn_seed chain. The
+        simulation thread's rng is left alone, whichever thread spawns"""
+        with self.lock:
+            rng = random.Random(self.spawn_seed)
+            self.spawn_seed = rng.getrandbits(64)
+        return rng
+
+    def index_insert(self, agent):
+        """Add a newly spawned agent to its species' index"""
+        self.get_index(agent.species).insert(agent)
+
+    def index_remove(self, agent):
+        """Take a dead agent out of the index"""
+        self.get_index(agent.species).remove(agent)
 
     def get_nearby_agents(self, agent, agent_type, search_radius=1):
-        """Get nearby agents of specified type using spatial partitioning"""
-        cell_x = int(agent.xcord // self.cell_size)
-        cell_y = int(agent.ycord // self.cell_size)
-        
-        nearby = []
-        # Check current cell and surrounding cells
-        # Use a snapshot of the grid to avoid concurrent modification
-        with self.lock:
-            grid_snapshot = self.grid
-            
-            for dx in range(-search_radius, search_radius + 1):
-                for dy in range(-search_radius, search_radius + 1):
-                    cell = (cell_x + dx, cell_y + dy)
-                    if cell in grid_snapshot:
-                        for type_tag, other_agent in grid_snapshot[cell]:
-                            if type_tag == agent_type and other_agent != agent:
-                                nearby.append(other_agent)
+        """Get agents of specified type in the square block of cells reaching
+        search_radius cells out from the agent's own cell, whichever index is used"""
+        size = self.cell_size
+        left = (agent.xcord // size - search_radius) * size
+        top = (agent.ycord // size - search_radius) * size
+        right = left + (2 * search_radius + 1) * size
+        bottom = top + (2 * search_radius + 1) * size
+        # Ask the index for the circle around the block, then keep the block
+        reach = math.hypot(max(agent.xcord - left, right - agent.xcord),
+                           max(agent.ycord - top, bottom - agent.ycord))
+        nearby = [other for other in self.get_index(agent_type).query_radius(agent.xcord, agent.ycord, reach)
+                  if left <= other.xcord < right and top <= other.ycord < bottom]
+        
+        if agent_type == agent.species:
+            # The agent itself may not be filed yet, newborns join at the end of the tick
+            nearby = [other for other in nearby if other is not agent]
         
         return nearby
 
-    def update_batch(self, agents, is_zombie=False):
-        """Update a batch of agents in parallel"""
-        for agent in agents:
-            if is_zombie:
-                agent.update()
-            else:
-                agent.update()
-
-    def update(self):
-        # Divide humans and zombies into batches for parallel processing
-        human_count = len(self.humans)
-        zombie_count = len(self.zombies)
-        
-        # Only use multithreading if we have enough agents to make it worthwhile
-        if human_count > self.num_threads * 10:
-            # Split humans into batches
-            batch_size = max(1, human_count // self.num_threads)
-            human_batches = [self.humans[i:i+batch_size] for i in range(0, human_count, batch_size)]
-            
-            # Submit human update tasks to thread pool
-            human_futures = [self.executor.submit(self.update_batch, batch, False) for batch in human_batches]
-            
-            # Wait for all human updates to complete
-            for future in human_futures:
-                future.result()
-        else:
-            # Sequential update for small number of humans
-            for human in self.humans:
-                human.update()
-        
-        # Shuffle zombies to ensure fair chance to eat humans
-        with self.lock:
-            random.shuffle(self.zombies)
-        
-        if zombie_count > self.num_threads * 5:
-            # Split zombies into batches
-            batch_size = max(1, zombie_count // self.num_threads)
-            zombie_batches = [self.zombies[i:i+batch_size] for i in range(0, zombie_count, batch_size)]
-            
-            # Submit zombie update tasks to thread pool
-            zombie_futures = [self.executor.submit(self.update_batch, batch, True) for batch in zombie_batches]
-            
-            # Wait for all zombie updates to complete
-            for future in zombie_futures:
-                future.result()
-        else:
-            # Sequential update for small number of zombies
-            for zombie in self.zombies:
-                zombie.update()
+    def find_nearest(self, agent, agent_type, max_distance=math.inf):
+        """Find the closest agent of specified type. Returns (agent, squared
+        distance), or (None, inf) if nothing is strictly closer than max_distance.
+        Inside a decide batch the query is tallied by the batch, not the index"""
+        index = self.get_index(agent_type)
+        tallies = getattr(self.batch, "tallies", None)
+        if tallies is None:
+            return index.nearest(agent.xcord, agent.ycord, max_distance, exclude=agent)
+        
+        closest, dist_squared, cells, scanned = index.search(
+            agent.xcord, agent.ycord, max_distance, exclude=agent)
+        tally = tallies[agent_type]
+        tally[0] += 1
+        tally[1] += cells
+        tally[2] += scanned
+        return closest, dist_squared
+
+    def decide_batch(self, agents, seed):
+        """Run the decide step for a batch of agents of one species and collect
+        what the commit step has to apply, keeping the batch's order"""
+        rng = random.Random(seed)
+        index = self.get_index(agents[0].species) if agents else None
+        dying = []
+        moved = []
+        acting = []
+        # Queries, cells and candidates of the index queries made by this batch
+        tallies = {"human": [0, 0, 0], "zombie": [0, 0, 0]}
+        self.batch.tallies = tallies
+        try:
+            for agent in agents:
+                if agent.is_dead:
+                    continue
+                agent.decide(rng)
+                if agent.dying:
+                    dying.append(agent)
+                    continue
+                if index.stale(agent):
+                    moved.append(agent)
+                if agent.has_intent():
+                    acting.append(agent)
+        finally:
+            self.batch.tallies = None
+        return dying, moved, acting, tallies
+
+    def get_thread_tuner(self, species):
+        """Tuner picking the threads of one species' decide phase, started over
+        whenever the pool changes size"""
+        tuner = self.thread_tuners.get(species)
+        if tuner is None or tuner.choices[-1] != self.pool.size:
+            tuner = self.thread_tuners[species] = ThreadTuner(worker_counts(self.pool.size))
+        return tuner
+
+    def decide(self, species, agents):
+        """Decide phase, the batches run on the thread pool when there are several.
+        With auto_threads the tuner picks how many threads they are spread over"""
+        self.pool.resize(self.num_threads)
+        count = len(agents)
+        batches = [agents[i:i+BATCH_SIZE] for i in range(0, count, BATCH_SIZE)]
+        seeds = [self.rng.getrandbits(64) for _ in batches]
+        
+        if not self.auto_threads:
+            self.threads_used[species] = min(self.pool.size, len(batches))
+            return self.pool.run(self.decide_batch, batches, seeds)
+        
+        tuner = self.get_thread_tuner(species)
+        workers = tuner.choose(count)
+        start = time.perf_counter()
+        results = self.pool.run(self.decide_batch, batches, seeds, workers=workers)
+        tuner.record(workers, count, time.perf_counter() - start)
+        self.threads_used[species] = min(workers, len(batches))
+        return results
+
+    def commit(self, results):
+        """Commit phase, the only place shared state changes. Runs on a single
+        thread, in batch order"""
+        for dying, moved, acting, tallies in results:
+            for species, tally in tallies.items():
+                self.get_index(species).add_counts(*tally)
+            for agent in dying:
+                agent.die()
+            for agent in moved:
+                self.get_index(agent.species).update(agent)
+            for agent in acting:
+                agent.commit()
+
+    # Methods making up one tick, in the order update() runs them
+    phases = ("update_humans", "shuffle_zombies", "update_zombies", "resolve_contacts", "merge_new_agents",
+              "refresh_indexes")
+
+    def update_humans(self):
+        """Zombies stand still while humans decide, so each human reads a frozen
+        snapshot of them and only writes to itself"""
+        humans = self.humans
+        if self.level_of_detail:
+            import lod
+            # Newborn sleepers join new_humans and spawns reset the countdown
+            with self.lock:
+                humans = lod.update(self)
+        self.commit(self.decide("human", humans))
+    
+    def shuffle_zombies(self):
+        """Shuffle zombies to ensure fair chance to eat humans, the shuffled
+        order decides who eats when several zombies reach the same human"""
+        self.rng.shuffle(self.zombies)
+    
+    def update_zombies(self):
+        """Humans now stand still in turn while zombies decide"""
+        self.commit(self.decide("zombie", self.zombies))
+    
+    def resolve_contacts(self):
+        """Every zombie eats the closest human within reach, all at once on
+        this thread"""
+        contacts.resolve_contacts(self)
+    
+    def merge_new_agents(self):
+        """Drop the agents that died this tick and add new agents, the lock
+        guards against the GUI adding agents at the same time"""
+        self.human_pool.release(self.humans.compact())
+        self.zombie_pool.release(self.zombies.compact())
         
-        # Add new agents with thread safety
         with self.lock:
             self.humans.extend(self.new_humans)
             self.zombies.extend(self.new_zombies)
             
+            for agent in self.new_humans + self.new_zombies:
+                self.index_insert(agent)
+            
             self.new_humans = []
             self.new_zombies = []
-        
-        # Update spatial grid after all positions have changed
-        self.update_spatial_grid()
+            self.conversions = 0
+            self.spawned_humans = 0
+
+    def update(self):
+        if self.instrumentation is None:
+            for phase in self.phases:
+                getattr(self, phase)()
+        else:
+            self.instrumentation.run_tick(self)
         
         if self.debug:
             print(f"There are {len(self.humans)} Humans alive")
             print(f"There are {len(self.zombies)} Zombies alive")
 
+    def fast_forward(self, ticks: int, callback=None):
+        """Once humans or zombies have died out, play up to ticks ticks of the
+        survivors with a cheap reduced model instead of update(). Returns the
+        number of ticks played, see fast_forward.py. Holds the lock, as the
+        agents waiting to join are merged in"""
+        from fast_forward import advance
+        with self.lock:
+            return advance(self, ticks, callback)
+
 
 class Human(object):
     """Individual agent that can be turned into a zombie"""
 
-    def __init__(self, xcord: float, ycord: float, xbound: int, ybound: int, immunity: float, sim: Simulator):
+    __slots__ = ("xcord", "ycord", "age", "max_age", "direction", "xvel", "yvel",
+                 "closest_zombie", "cell", "update_counter", "is_dead", "dormant", "dying", "offspring")
+
+    species = "human"
+    
+    # Shared by every human, the simulator's own subclass fills these in
+    sim = None
+    xbound = 0
+    ybound = 0
+    immunity = 0.3
+    speed = 1
+    birth_odds = 500
+    
+    # Slots every human starts out with the same value in, for bulk spawning
+    initial = {"age": 0, "closest_zombie": None, "cell": None, "update_counter": 0, "is_dead": False,
+               "dormant": False, "dying": False, "offspring": False}
+
+    def __init__(self, xcord: float, ycord: float):
         self.xcord = xcord
         self.ycord = ycord
-        self.xbound = xbound
-        self.ybound = ybound
-        self.immunity = immunity
         self.age = 0
-        self.max_age = random.randint(190, 275)
-        self.infected = random.random()
+        self.max_age = self.sim.rng.randint(190, 275)
         
         # Movement attributes
-        self.speed = 1
-        self.direction = random.random() * 2 * math.pi
+        self.direction = self.sim.rng.random() * 2 * math.pi
         self.xvel, self.yvel = get_velocity(self.speed, self.direction)
         
         self.closest_zombie = None
-        self.sim = sim
+        
+        # Where the spatial index has filed the agent, None until it is added
+        self.cell = None
         
         # Counter to reduce frequency of expensive operations
         self.update_counter = 0
@@ -187,148 +455,131 @@ class Human(object):
         # Flag to mark if this human is already dead
         self.is_dead = False
         
-        # Lock for thread safety
-        self.lock = threading.RLock()
+        # Asleep under level of detail, see lod.py
+        self.dormant = False
+        
+        # Intents recorded in the decide phase and applied in the commit phase
+        self.dying = False
+        self.offspring = False
 
     def move(self):
         # Bounce off walls
-        with self.lock:
-            if self.xcord + self.xvel > self.xbound or self.xcord + self.xvel < 0:
-                self.xvel = -self.xvel
+        if self.xcord + self.xvel > self.xbound or self.xcord + self.xvel < 0:
+            self.xvel = -self.xvel
 
-            if self.ycord + self.yvel > self.ybound or self.ycord + self.yvel < 0:
-                self.yvel = -self.yvel
+        if self.ycord + self.yvel > self.ybound or self.ycord + self.yvel < 0:
+            self.yvel = -self.yvel
 
-            self.xcord += self.xvel
-            self.ycord += self.yvel
+        self.xcord += self.xvel
+        self.ycord += self.yvel
 
-    def set_direction(self):
+    def set_direction(self, rng):
         """The human tries to run away from the closest zombie"""
-        with self.lock:
-            if self.closest_zombie:
-                # Get direction away from zombie
-                self.direction = -get_direction(
-                    self.closest_zombie.xcord - self.xcord, 
-                    self.closest_zombie.ycord - self.ycord
-                )
-                # Add some randomness to movement
-                self.direction += (random.random() - 0.5) * .25 * math.pi
-            else:
-                # Random direction if no zombies nearby
-                self.direction = random.random() * math.pi * 2
+        if self.closest_zombie:
+            # Get direction away from zombie
+            self.direction = -get_direction(
+                self.closest_zombie.xcord - self.xcord, 
+                self.closest_zombie.ycord - self.ycord
+            )
+            # Add some randomness to movement
+            self.direction += (rng.random() - 0.5) * .25 * math.pi
+        else:
+            # Random direction if no zombies nearby
+            self.direction = rng.random() * math.pi * 2
 
     def find_closest_zombie(self):
         """Find the closest zombie using spatial partitioning"""
-        nearby_zombies = self.sim.get_nearby_agents(self, "zombie", search_radius=2)
-        
-        if not nearby_zombies:
-            with self.lock:
-                self.closest_zombie = None
-            return
-            
-        shortest_dist = float('inf')
-        closest = None
-        
-        for zombie in nearby_zombies:
-            # Use squared distance to avoid sqrt operation
-            dist_squared = distance_squared(
-                self.xcord, self.ycord, zombie.xcord, zombie.ycord
-            )
-            
-            if dist_squared < shortest_dist:
-                shortest_dist = dist_squared
-                closest = zombie
-        
         # Only care about zombies within a certain range
-        max_distance_squared = (self.xbound / 4) ** 2
-        
-        with self.lock:
-            if shortest_dist < max_distance_squared:
-                self.closest_zombie = closest
-            else:
-                self.closest_zombie = None
+        self.closest_zombie, _ = self.sim.find_nearest(self, "zombie", self.xbound / 4)
 
     def turn(self):
         """Create a new zombie at human's location"""
-        new_zombie = Zombie(self.xcord, self.ycord, self.xbound, self.ybound, self.sim)
+        new_zombie = self.sim.zombie_pool.acquire(self.xcord, self.ycord)
         with self.sim.lock:
             self.sim.new_zombies.append(new_zombie)
+            self.sim.conversions += 1
 
     def die(self):
         """Remove human from simulation"""
-        # Check if this human is already dead to prevent the "x not in list" error
-        with self.lock:
-            if not self.is_dead:
-                self.is_dead = True
-                with self.sim.lock:
-                    if self in self.sim.humans:
-                        self.sim.humans.remove(self)
+        # Only tombstoned here, the list is compacted at the end of the tick
+        if self.sim.humans.discard(self):
+            self.sim.index_remove(self)
 
     def get_eaten(self):
         """Determines whether a human that is eaten is turned into a zombie or not"""
-        if random.random() >= self.immunity:
+        if self.sim.rng.random() >= self.immunity:
             self.turn()
         self.die()
 
-    def reproduce(self):
-        """Humans have a random chance to reproduce"""
-        if random.randint(0, 499) == 0:
-            with self.sim.lock:
-                self.sim.new_humans.append(
-                    Human(self.xcord, self.ycord, self.xbound, self.ybound, 
-                         self.immunity, self.sim)
-                )
+    def reproduce(self, rng):
+        """Humans have a random chance to reproduce, the child is born at commit"""
+        if rng.randint(0, self.birth_odds - 1) == 0:
+            self.offspring = True
 
-    def update(self):
-        """Run all time step operations on the human"""
-        # Skip update if already dead
-        with self.lock:
-            if self.is_dead:
-                return
-                
-            # Check for death by old age
-            if self.age >= self.max_age:
-                self.die()
-                return
-            
-            self.age += 1
-            
-        self.reproduce()
+    def decide(self, rng):
+        """Run all time step operations that only touch this human"""
+        # Check for death by old age
+        if self.age >= self.max_age:
+            self.dying = True
+            return
         
-        # Only update direction and find closest zombie periodically
-        with self.lock:
-            self.update_counter += 1
-            should_update = self.update_counter >= 3  # Update every 3 frames
+        self.age += 1
+        self.reproduce(rng)
         
-        if should_update:
+        # Only update direction and find closest zombie periodically
+        self.update_counter += 1
+        if self.update_counter >= 3:  # Update every 3 frames
             self.find_closest_zombie()
-            self.set_direction()
-            
-            with self.lock:
-                self.xvel, self.yvel = get_velocity(self.speed, self.direction)
-                self.xvel *= -1  # Preserved from original code
-                self.update_counter = 0
+            self.set_direction(rng)
+            self.xvel, self.yvel = get_velocity(self.speed, self.direction)
+            self.xvel *= -1  # Preserved from original code
+            self.update_counter = 0
         
         self.move()
 
+    def has_intent(self):
+        """Whether the commit phase has anything to apply for this human"""
+        return self.offspring
+
+    def commit(self):
+        """Add the child conceived during the decide phase"""
+        child = self.sim.human_pool.acquire(self.xcord, self.ycord)
+        with self.sim.lock:
+            self.sim.new_humans.append(child)
+        self.offspring = False
+
 
 class Zombie(object):
     """A Zombie that chases Humans around to eat them"""
 
-    def __init__(self, xcord: float, ycord: float, xbound: int, ybound: int, sim: Simulator):
+    __slots__ = ("xcord", "ycord", "direction", "xvel", "yvel", "closest_human", "hunger",
+                 "max_hunger", "cell", "incr", "update_counter", "is_dead", "dying")
+
+    species = "zombie"
+    
+    # Shared by every zombie, the simulator's own subclass fills these in
+    sim = None
+    xbound = 0
+    ybound = 0
+    speed = 0.8
+    
+    # Slots every zombie starts out with the same value in, for bulk spawning
+    initial = {"closest_human": None, "hunger": 0, "cell": None, "incr": 0, "update_counter": 0,
+               "is_dead": False, "dying": False}
+
+    def __init__(self, xcord: float, ycord: float):
         self.xcord = xcord
         self.ycord = ycord
-        self.xbound = xbound
-        self.ybound = ybound
-        self.sim = sim
         
-        self.speed = 0.8
         self.direction = 0
         self.xvel, self.yvel = get_velocity(self.speed, self.direction)
         
         self.closest_human = None
         self.hunger = 0
-        self.max_hunger = random.randint(200, 260)
+        self.max_hunger = self.sim.rng.randint(200, 260)
+        
+        # Where the spatial index has filed the agent, None until it is added
+        self.cell = None
         
         self.incr = 0
         self.update_counter = 0
@@ -336,162 +587,88 @@ class Zombie(object):
         # Flag to mark if this zombie is already dead
         self.is_dead = False
         
-        # Lock for thread safety
-        self.lock = threading.RLock()
+        # Intent recorded in the decide phase and applied in the commit phase
+        self.dying = False
 
-    def set_direction(self):
+    def set_direction(self, rng):
         """The zombie sets after the nearest human"""
-        with self.lock:
-            if self.closest_human:
-                self.direction = get_direction(
-                    self.closest_human.xcord - self.xcord, 
-                    self.closest_human.ycord - self.ycord
-                )
-                # Add some randomness
-                self.direction += (random.random() - 0.5) * .5 * math.pi
-            else:
-                # Random direction if no humans nearby
-                self.direction = random.random() * math.pi * 2
+        if self.closest_human:
+            self.direction = get_direction(
+                self.closest_human.xcord - self.xcord, 
+                self.closest_human.ycord - self.ycord
+            )
+            # Add some randomness
+            self.direction += (rng.random() - 0.5) * .5 * math.pi
+        else:
+            # Random direction if no humans nearby
+            self.direction = rng.random() * math.pi * 2
 
     def find_closest_human(self):
         """Find closest human using spatial partitioning"""
-        nearby_humans = self.sim.get_nearby_agents(self, "human", search_radius=2)
-        
-        if not nearby_humans:
-            with self.lock:
-                self.closest_human = None
-            return
-            
-        shortest_dist = float('inf')
-        closest = None
-        
-        for human in nearby_humans:
-            # Skip already dead humans
-            if human.is_dead:
-                continue
-                
-            # Use squared distance to avoid sqrt
-            dist_squared = distance_squared(
-                self.xcord, self.ycord, human.xcord, human.ycord
-            )
-            
-            if dist_squared < shortest_dist:
-                shortest_dist = dist_squared
-                closest = human
-        
-        with self.lock:
-            self.closest_human = closest
+        self.closest_human, _ = self.sim.find_nearest(self, "human", self.sim.zombie_sight)
 
-    def move(self):
+    def move(self, rng):
         """Moves the zombie to the next location"""
         # Handle wall collisions
-        with self.lock:
-            if self.xcord + self.xvel > self.xbound or self.xcord + self.xvel < 0:
-                self.xvel = -self.xvel
-                
-                if self.incr >= 3:
-                    self.direction = random.random() * math.pi * 2
-                    self.move()
-                    return
-
-            if self.ycord + self.yvel > self.ybound or self.ycord + self.yvel < 0:
-                self.yvel = -self.yvel
-                
-                if self.incr >= 3:
-                    self.direction = random.random() * math.pi * 2
-                    self.move()
-                    return
-
-            self.xcord += self.xvel
-            self.ycord += self.yvel
-
-    def can_eat(self):
-        """Check if closest human is close enough to eat"""
-        with self.lock:
-            if not self.closest_human or self.closest_human.is_dead:
-                return False
-                
-            # Use squared distance (threshold is 1 unit, so 1²)
-            dist_squared = distance_squared(
-                self.xcord, self.ycord, 
-                self.closest_human.xcord, self.closest_human.ycord
-            )
+        if self.xcord + self.xvel > self.xbound or self.xcord + self.xvel < 0:
+            self.xvel = -self.xvel
             
-            return dist_squared <= 1
+            if self.incr >= 3:
+                self.direction = rng.random() * math.pi * 2
+                self.move(rng)
+                return
 
-    def eat(self):
-        """Eat the closest human"""
-        with self.lock:
-            if self.hunger < 40:
-                self.hunger = 0
-            else:
-                self.hunger -= 40
-                
-            human_to_eat = self.closest_human
+        if self.ycord + self.yvel > self.ybound or self.ycord + self.yvel < 0:
+            self.yvel = -self.yvel
             
-            # Clear reference to human being eaten
-            self.closest_human = None
-        
-        # Eat the human outside the lock to avoid deadlock
-        if human_to_eat and not human_to_eat.is_dead:
-            human_to_eat.get_eaten()
-        
-        if self.sim.debug:
-            print("A Zombie has eaten")
+            if self.incr >= 3:
+                self.direction = rng.random() * math.pi * 2
+                self.move(rng)
+                return
+
+        self.xcord += self.xvel
+        self.ycord += self.yvel
 
     def die(self):
         """Remove zombie from simulation"""
-        # Check if this zombie is already dead to prevent the "x not in list" error
-        with self.lock:
-            if not self.is_dead:
-                self.is_dead = True
-                with self.sim.lock:
-                    if self in self.sim.zombies:
-                        self.sim.zombies.remove(self)
-
-    def update(self):
-        """Update zombie state"""
-        # Skip update if already dead
-        with self.lock:
-            if self.is_dead:
-                return
-                
-            # Only find a new closest human periodically or if current target is gone
-            self.update_counter += 1
-            should_update = (self.update_counter >= 4 or 
-                            not self.closest_human or 
-                            self.closest_human.is_dead)
-        
-        if should_update:
+        # Only tombstoned here, the list is compacted at the end of the tick
+        if self.sim.zombies.discard(self):
+            self.sim.index_remove(self)
+
+    def decide(self, rng):
+        """Run all time step operations that only touch this zombie"""
+        # Only find a new closest human periodically or if current target is gone
+        self.update_counter += 1
+        if (self.update_counter >= 4 or 
+            not self.closest_human or 
+            self.closest_human.is_dead):
+            
             self.find_closest_human()
-            with self.lock:
-                self.update_counter = 0
+            self.update_counter = 0
         
         # Set direction and velocity
-        with self.lock:
-            should_set_direction = (self.incr == 0 or 
-                                    not self.closest_human or 
-                                    self.closest_human.is_dead)
-        
-        if should_set_direction:
-            self.set_direction()
-            with self.lock:
-                self.xvel, self.yvel = get_velocity(self.speed, self.direction)
+        if (self.incr == 0 or 
+            not self.closest_human or 
+            self.closest_human.is_dead):
+            
+            self.set_direction(rng)
+            self.xvel, self.yvel = get_velocity(self.speed, self.direction)
         
         # Update hunger
-        with self.lock:
-            self.hunger += 1
-            if self.hunger >= self.max_hunger:
-                self.die()
-                return
+        self.hunger += 1
+        if self.hunger >= self.max_hunger:
+            self.dying = True
+            return
         
-        self.move()
+        self.move(rng)
         
-        # Try to eat nearby humans
-        if self.can_eat():
-            self.eat()
+        # Eating happens once every zombie has moved, see Simulator.resolve_contacts
         
-        with self.lock:
-            self.incr += 1
-            if self.incr > 6:
-                self.incr = 0
\ No newline at end of file
+        self.incr += 1
+        if self.incr > 6:
+            self.incr = 0
+
+    def has_intent(self):
+        """Whether the commit phase has anything to apply for this zombie, only
+        dying, which the commit handles on its own"""
+        return False
\ No newline at end of file
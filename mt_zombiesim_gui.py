@@ -1,14 +1,13 @@
 # created from optimized_zombiesim_gui.py by chatting more with Claudes
 import pygame
-import math
 import time
 import threading
-import random
 
 pygame.init()
 
 # Import from the multithreaded version
-from mt_zombiesim import Human, Simulator, Zombie
+from mt_zombiesim import Simulator
+from renderer import AgentRenderer, coordinates
 
 class Grid(object):
     def __init__(self, xbound, ybound, num_humans, num_zombies, num_threads=4):
@@ -37,12 +36,8 @@ class Grid(object):
         # Font for text display
         self.myfont = pygame.font.SysFont('Arial', 30)
 
-        # Create surfaces for agents (better than drawing rectangles each frame)
-        self.human_surf = pygame.Surface((self.scale, self.scale))
-        self.human_surf.fill(self.BLUE)
-        
-        self.zombie_surf = pygame.Surface((self.scale, self.scale))
-        self.zombie_surf.fill(self.RED)
+        # Draws every agent of a species in one go (see renderer.py)
+        self.renderer = AgentRenderer(self.WINDOW_SIZE, self.scale)
         
         # Performance tracking
         self.clock = pygame.time.Clock()
@@ -55,9 +50,9 @@ class Grid(object):
         self.simulation_thread = None
         self.running = True
         
-        # Buffers for rendering (to avoid race conditions)
-        self.human_positions = []
-        self.zombie_positions = []
+        # Buffers for rendering (to avoid race conditions), x and y coordinate arrays
+        self.human_positions = coordinates([])
+        self.zombie_positions = coordinates([])
         self.human_count = 0
         self.zombie_count = 0
         
@@ -75,12 +70,8 @@ class Grid(object):
             
             # Copy positions for rendering under lock to avoid race conditions
             with self.simulation_lock:
-                self.human_positions = [(math.floor(human.xcord * self.scale), 
-                                        math.floor(human.ycord * self.scale)) 
-                                       for human in self.sim.humans]
-                self.zombie_positions = [(math.floor(zombie.xcord * self.scale), 
-                                         math.floor(zombie.ycord * self.scale)) 
-                                        for zombie in self.sim.zombies]
+                self.human_positions = coordinates(self.sim.humans)
+                self.zombie_positions = coordinates(self.sim.zombies)
                 self.human_count = len(self.sim.humans)
                 self.zombie_count = len(self.sim.zombies)
             
@@ -122,8 +113,17 @@ class Grid(object):
         self.screen.blit(fps_text, (self.scaled_width - 100, 10))
         
         # Display thread count
-        thread_text = self.fps_font.render(f"Threads: {self.sim.num_threads}", True, self.BLACK)
-        self.screen.blit(thread_text, (self.scaled_width - 100, 30))
+        threads = f"Threads: {self.sim.num_threads}"
+        if self.sim.auto_threads:
+            # What the tuner ran each species on last tick, and the population
+            # from which it expects more threads to pay off
+            used = self.sim.threads_used
+            cutoffs = [self.sim.thread_tuners[species].cutoff if species in self.sim.thread_tuners else None
+                       for species in ("human", "zombie")]
+            cutoffs = "/".join("-" if cutoff is None else str(cutoff) for cutoff in cutoffs)
+            threads += f" (auto, {used.get('human', 0)}/{used.get('zombie', 0)}, parallel from {cutoffs})"
+        thread_text = self.fps_font.render(threads, True, self.BLACK)
+        self.screen.blit(thread_text, (min(self.scaled_width - 100, self.scaled_width - thread_text.get_width() - 10), 30))
 
     def run_rendering(self):
         """Main rendering loop"""
@@ -138,32 +138,16 @@ class Grid(object):
                 elif event.type == pygame.KEYDOWN:
                     # Add some interactivity
                     if event.key == pygame.K_h:
-                        with self.sim.lock:
-                            for _ in range(10):
-                                self.sim.new_humans.append(
-                                    Human(
-                                        random.randint(0, self.sim.xbound),
-                                        random.randint(0, self.sim.ybound),
-                                        self.sim.xbound, self.sim.ybound,
-                                        0.3, self.sim
-                                    )
-                                )
+                        self.sim.spawn_humans(10)
                     elif event.key == pygame.K_z:
-                        with self.sim.lock:
-                            for _ in range(5):
-                                self.sim.new_zombies.append(
-                                    Zombie(
-                                        random.randint(0, self.sim.xbound),
-                                        random.randint(0, self.sim.ybound),
-                                        self.sim.xbound, self.sim.ybound,
-                                        self.sim
-                                    )
-                                )
+                        self.sim.spawn_zombies(5)
                     # Thread count controls
                     elif event.key == pygame.K_PLUS or event.key == pygame.K_EQUALS:
                         self.sim.num_threads += 1
                     elif event.key == pygame.K_MINUS and self.sim.num_threads > 1:
                         self.sim.num_threads -= 1
+                    elif event.key == pygame.K_a:
+                        self.sim.auto_threads = not self.sim.auto_threads
 
             # Clear screen
             self.screen.fill(self.WHITE)
@@ -171,18 +155,15 @@ class Grid(object):
             # Get a snapshot of the positions to render
             positions_snapshot = []
             with self.simulation_lock:
-                human_positions = self.human_positions.copy()
-                zombie_positions = self.zombie_positions.copy()
+                # The simulation thread replaces the arrays rather than changing them
+                human_positions = self.human_positions
+                zombie_positions = self.zombie_positions
                 human_count = self.human_count
                 zombie_count = self.zombie_count
 
-            # Render zombies
-            for pos in zombie_positions:
-                self.screen.blit(self.zombie_surf, pos)
-
-            # Render humans
-            for pos in human_positions:
-                self.screen.blit(self.human_surf, pos)
+            # Render zombies, then humans on top of them
+            self.renderer.draw(self.screen, *zombie_positions, self.RED)
+            self.renderer.draw(self.screen, *human_positions, self.BLUE)
             
             # Draw statistics
             self.draw_stats()
@@ -200,6 +181,5 @@ class Grid(object):
         pygame.quit()
 
 if __name__ == "__main__":
-    import random
     # Use 6 threads by default - adjust based on your CPU
     grid = Grid(100, 100, num_humans=3000, num_zombies=3, num_threads=8)
\ No newline at end of file
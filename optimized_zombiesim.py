@@ -1,7 +1,12 @@
 # Did some basic optimizations by chatting with Claude
 
 import random, math
-from collections import defaultdict
+
+import contacts
+import spawning
+from agent_registry import AgentPool, AgentRegistry
+from cell_tuning import GRID_CELL_COST, CellTuner, geometric_sizes
+from spatial_index import make_spatial_index
 
 def get_velocity(speed: float, direction: float):
     """Takes a speed and direction and returns change in x and y coords"""
@@ -20,116 +25,272 @@ def distance_squared(x1, y1, x2, y2):
 class Simulator(object):
     """The master object that holds all the game state"""
 
-    def __init__(self, xbound: int, ybound: int, num_humans: int, num_zombies: int, debug: bool):
+    def __init__(self, xbound: int, ybound: int, num_humans: int, num_zombies: int, debug: bool,
+                 spatial_index: str = "grid", seed: int = None, immunity: float = 0.3,
+                 human_speed: float = 1, zombie_speed: float = 0.8, birth_odds: int = 500,
+                 auto_cell_size: bool = False, level_of_detail: bool = False):
         self.xbound = xbound
         self.ybound = ybound
         
-        self.humans = []
-        self.zombies = []
+        # Every random draw of the simulation comes from here, so a seed reproduces a run
+        self.rng = random.Random(seed)
+        
+        # Dead agents are tombstoned during the tick and compacted at its end
+        self.humans = AgentRegistry()
+        self.zombies = AgentRegistry()
         self.new_humans = []
         self.new_zombies = []
         
-        self.debug = debug
-        
-        # Spatial partitioning - divide the space into cells
-        self.cell_size = 10  # Size of each cell in the grid
-        self.grid = defaultdict(list)  # Will hold agents by grid cell
+        # Tallies of the current tick, until its new agents are merged
+        self.conversions = 0  # Eaten humans that turned
+        self.spawned_humans = 0  # Humans in new_humans that spawn_humans() added
         
-        for _ in range(0, num_humans):
-            self.humans.append(Human(random.randint(0, xbound), random.randint(0, ybound), 
-                                    xbound, ybound, 0.3, self))
-
-        for _ in range(0, num_zombies):
-            self.zombies.append(Zombie(random.randint(0, xbound), random.randint(0, ybound), 
-                                      xbound, ybound, self))
+        self.debug = debug
         
-        # Add all entities to the spatial grid
+        # Optional per tick measurements, see instrumentation.py
+        self.instrumentation = None
+        
+        # Spatial partitioning, one index per species (see spatial_index.py)
+        self.spatial_index = spatial_index  # "grid", "csr", "quadtree" or "kdtree"
+        self.cell_size = 10  # Size of each cell when using the grid
+        self.zombie_sight = 20  # How far away a zombie notices humans
+        self.indexes = {}
+        
+        # With auto_cell_size each species' grid gets a tuner that moves it to the
+        # cell size with the cheapest queries (see cell_tuning.py)
+        self.auto_cell_size = auto_cell_size
+        self.cell_tuners = {}
+        if auto_cell_size:
+            if spatial_index not in ("grid", "csr"):
+                raise ValueError(f"auto_cell_size needs a grid spatial index, not {spatial_index!r}")
+            sizes = geometric_sizes(self.cell_size, 1, max(xbound, ybound))
+            self.cell_tuners = {species: CellTuner(sizes, self.cell_size, GRID_CELL_COST)
+                                for species in ("human", "zombie")}
+        
+        # With level_of_detail humans far from every zombie sleep through a cheap
+        # batched update instead of their own (see lod.py)
+        self.level_of_detail = level_of_detail
+        self.lod_countdown = 0  # Ticks until the next pass sorts sleepers from the rest
+        self.dormant_humans = 0  # Asleep during the last tick
+        
+        # Model parameters
+        self.immunity = immunity  # Chance an eaten human dies instead of turning
+        self.human_speed = human_speed
+        self.zombie_speed = zombie_speed
+        self.birth_odds = birth_odds  # Each human has a 1 in birth_odds chance to reproduce per tick
+        
+        # Agent classes bound to this simulator, every agent reads the bounds, the
+        # model parameters and the simulator from its class instead of keeping its own copy
+        shared = {"__slots__": (), "sim": self, "xbound": xbound, "ybound": ybound}
+        self.Human = type("Human", (Human,), dict(shared, immunity=immunity, speed=human_speed,
+                                                  birth_odds=birth_odds))
+        self.Zombie = type("Zombie", (Zombie,), dict(shared, speed=zombie_speed))
+        
+        # Dead agents are recycled for births and conversions. Humans only look
+        # for a new closest zombie every 3 ticks, so dead zombies wait that long
+        self.human_pool = AgentPool(self.Human)
+        self.zombie_pool = AgentPool(self.Zombie, delay=3)
+        
+        # The starting populations are built in bulk and join straight away
+        self.humans.extend(spawning.make_humans(self, num_humans))
+        self.zombies.extend(spawning.make_zombies(self, num_zombies))
+        
+        # Add all entities to the spatial indexes
         self.update_spatial_grid()
 
+    def get_index(self, species):
+        """Spatial index holding one species, created the first time it is asked for"""
+        if species not in self.indexes:
+            self.indexes[species] = make_spatial_index(
+                self.spatial_index, self.xbound, self.ybound, cell_size=self.cell_size)
+        return self.indexes[species]
+
     def update_spatial_grid(self):
-        """Update the spatial partitioning grid with current agent positions"""
-        self.grid.clear()
-        
-        for human in self.humans:
-            cell_x = int(human.xcord // self.cell_size)
-            cell_y = int(human.ycord // self.cell_size)
-            self.grid[(cell_x, cell_y)].append(("human", human))
-            
-        for zombie in self.zombies:
-            cell_x = int(zombie.xcord // self.cell_size)
-            cell_y = int(zombie.ycord // self.cell_size)
-            self.grid[(cell_x, cell_y)].append(("zombie", zombie))
+        """Rebuild the spatial indexes from scratch"""
+        self.get_index("human").build(self.humans)
+        self.get_index("zombie").build(self.zombies)
+
+    def refresh_indexes(self):
+        """Rebuild the indexes that cannot follow agents as they move"""
+        for species, agents in (("human", self.humans), ("zombie", self.zombies)):
+            index = self.get_index(species)
+            if not index.incremental:
+                index.build(agents)
+        
+        if self.cell_tuners:
+            self.tune_cells()
+
+    def tune_cells(self):
+        """Rebuild the grids whose tuner picked a new cell size"""
+        for species, agents in (("human", self.humans), ("zombie", self.zombies)):
+            index = self.get_index(species)
+            size = self.cell_tuners[species].tick(index.queries, index.cells, index.scanned, len(agents))
+            if size is not None:
+                index.cell_size = size
+                index.build(agents)
+
+    def spawn_humans(self, count: int, region=None):
+        """Add count humans at random whole coordinates of region, (x0, y0, x1, y1)
+        and the whole world by default, all drawn and built in one batch (see
+        spawning.py). Like newborns they join at the end of the current tick.
+        Returns the new humans"""
+        humans = spawning.make_humans(self, count, region)
+        self.new_humans.extend(humans)
+        self.spawned_humans += count
+        return humans
+
+    def spawn_zombies(self, count: int, region=None):
+        """Add count zombies at random whole coordinates of region, the same way
+        as spawn_humans(). Returns the new zombies"""
+        zombies = spawning.make_zombies(self, count, region)
+        # They can turn up next to sleeping humans, who must be woken first
+        self.lod_countdown = 0
+        self.new_zombies.extend(zombies)
+        return zombies
+
+    def index_insert(self, agent):
+        """Add a newly spawned agent to its species' index"""
+        self.get_index(agent.species).insert(agent)
+
+    def index_move(self, agent):
+        """Tell the index an agent has moved"""
+        self.get_index(agent.species).update(agent)
+
+    def index_remove(self, agent):
+        """Take a dead agent out of the index"""
+        self.get_index(agent.species).remove(agent)
 
     def get_nearby_agents(self, agent, agent_type, search_radius=1):
-        """Get nearby agents of specified type using spatial partitioning"""
-        cell_x = int(agent.xcord // self.cell_size)
-        cell_y = int(agent.ycord // self.cell_size)
-        
-        nearby = []
-        # Check current cell and surrounding cells
-        for dx in range(-search_radius, search_radius + 1):
-            for dy in range(-search_radius, search_radius + 1):
-                cell = (cell_x + dx, cell_y + dy)
-                if cell in self.grid:
-                    for type_tag, other_agent in self.grid[cell]:
-                        if type_tag == agent_type and other_agent != agent:
-                            nearby.append(other_agent)
+        """Get agents of specified type in the square block of cells reaching
+        search_radius cells out from the agent's own cell, whichever index is used"""
+        size = self.cell_size
+        left = (agent.xcord // size - search_radius) * size
+        top = (agent.ycord // size - search_radius) * size
+        right = left + (2 * search_radius + 1) * size
+        bottom = top + (2 * search_radius + 1) * size
+        # Ask the index for the circle around the block, then keep the block
+        reach = math.hypot(max(agent.xcord - left, right - agent.xcord),
+                           max(agent.ycord - top, bottom - agent.ycord))
+        nearby = [other for other in self.get_index(agent_type).query_radius(agent.xcord, agent.ycord, reach)
+                  if left <= other.xcord < right and top <= other.ycord < bottom]
+        
+        if agent_type == agent.species:
+            # The agent itself may not be filed yet, newborns join at the end of the tick
+            nearby = [other for other in nearby if other is not agent]
         
         return nearby
 
-    def update(self):
-        # Update human positions and actions
-        for human in self.humans:
+    def find_nearest(self, agent, agent_type, max_distance=math.inf):
+        """Find the closest agent of specified type. Returns (agent, squared
+        distance), or (None, inf) if nothing is strictly closer than max_distance"""
+        return self.get_index(agent_type).nearest(
+            agent.xcord, agent.ycord, max_distance, exclude=agent)
+
+    # Methods making up one tick, in the order update() runs them
+    phases = ("update_humans", "shuffle_zombies", "update_zombies", "resolve_contacts", "merge_new_agents",
+              "refresh_indexes")
+
+    def update_humans(self):
+        """Update human positions and actions"""
+        humans = self.humans
+        if self.level_of_detail:
+            import lod
+            humans = lod.update(self)
+        for human in humans:
             human.update()
-        
-        # Shuffle zombies to ensure fair chance to eat humans
-        random.shuffle(self.zombies)
-        
-        # Update zombie positions and actions
+    
+    def shuffle_zombies(self):
+        """Shuffle zombies to ensure fair chance to eat humans, the shuffled
+        order decides who eats when several zombies reach the same human"""
+        self.rng.shuffle(self.zombies)
+    
+    def update_zombies(self):
+        """Update zombie positions and actions"""
         for zombie in self.zombies:
             zombie.update()
+    
+    def resolve_contacts(self):
+        """Every zombie eats the closest human within reach, all at once"""
+        contacts.resolve_contacts(self)
+    
+    def merge_new_agents(self):
+        """Drop the agents that died this tick and add the new ones"""
+        self.human_pool.release(self.humans.compact())
+        self.zombie_pool.release(self.zombies.compact())
         
-        # Add new agents
         self.humans.extend(self.new_humans)
         self.zombies.extend(self.new_zombies)
         
+        for agent in self.new_humans + self.new_zombies:
+            self.index_insert(agent)
+        
         self.new_humans = []
         self.new_zombies = []
-        
-        # Update spatial grid after all positions have changed
-        self.update_spatial_grid()
+        self.conversions = 0
+        self.spawned_humans = 0
+
+    def update(self):
+        if self.instrumentation is None:
+            for phase in self.phases:
+                getattr(self, phase)()
+        else:
+            self.instrumentation.run_tick(self)
         
         if self.debug:
             print(f"There are {len(self.humans)} Humans alive")
             print(f"There are {len(self.zombies)} Zombies alive")
 
+    def fast_forward(self, ticks: int, callback=None):
+        """Once humans or zombies have died out, play up to ticks ticks of the
+        survivors with a cheap reduced model instead of update(). Returns the
+        number of ticks played, see fast_forward.py"""
+        from fast_forward import advance
+        return advance(self, ticks, callback)
+
 
 class Human(object):
     """Individual agent that can be turned into a zombie"""
 
-    def __init__(self, xcord: float, ycord: float, xbound: int, ybound: int, immunity: float, sim: Simulator):
+    __slots__ = ("xcord", "ycord", "age", "max_age", "direction", "xvel", "yvel",
+                 "closest_zombie", "cell", "update_counter", "is_dead", "dormant")
+
+    species = "human"
+    
+    # Shared by every human, the simulator's own subclass fills these in
+    sim = None
+    xbound = 0
+    ybound = 0
+    immunity = 0.3
+    speed = 1
+    birth_odds = 500
+    
+    # Slots every human starts out with the same value in, for bulk spawning
+    initial = {"age": 0, "closest_zombie": None, "cell": None, "update_counter": 0, "is_dead": False,
+               "dormant": False}
+
+    def __init__(self, xcord: float, ycord: float):
         self.xcord = xcord
         self.ycord = ycord
-        self.xbound = xbound
-        self.ybound = ybound
-        self.immunity = immunity
         self.age = 0
-        self.max_age = random.randint(190, 275)
-        self.infected = random.random()
+        self.max_age = self.sim.rng.randint(190, 275)
         
         # Movement attributes
-        self.speed = 1
-        self.direction = random.random() * 2 * math.pi
+        self.direction = self.sim.rng.random() * 2 * math.pi
         self.xvel, self.yvel = get_velocity(self.speed, self.direction)
         
         self.closest_zombie = None
-        self.sim = sim
+        
+        # Where the spatial index has filed the agent, None until it is added
+        self.cell = None
         
         # Counter to reduce frequency of expensive operations
         self.update_counter = 0
         
         # Flag to mark if this human is already dead
         self.is_dead = False
+        
+        # Asleep under level of detail, see lod.py
+        self.dormant = False
 
     def move(self):
         # Bounce off walls
@@ -141,6 +302,7 @@ class Human(object):
 
         self.xcord += self.xvel
         self.ycord += self.yvel
+        self.sim.index_move(self)
 
     def set_direction(self):
         """The human tries to run away from the closest zombie"""
@@ -151,64 +313,38 @@ class Human(object):
                 self.closest_zombie.ycord - self.ycord
             )
             # Add some randomness to movement
-            self.direction += (random.random() - 0.5) * .25 * math.pi
+            self.direction += (self.sim.rng.random() - 0.5) * .25 * math.pi
         else:
             # Random direction if no zombies nearby
-            self.direction = random.random() * math.pi * 2
+            self.direction = self.sim.rng.random() * math.pi * 2
 
     def find_closest_zombie(self):
         """Find the closest zombie using spatial partitioning"""
-        nearby_zombies = self.sim.get_nearby_agents(self, "zombie", search_radius=2)
-        
-        if not nearby_zombies:
-            self.closest_zombie = None
-            return
-            
-        shortest_dist = float('inf')
-        closest = None
-        
-        for zombie in nearby_zombies:
-            # Use squared distance to avoid sqrt operation
-            dist_squared = distance_squared(
-                self.xcord, self.ycord, zombie.xcord, zombie.ycord
-            )
-            
-            if dist_squared < shortest_dist:
-                shortest_dist = dist_squared
-                closest = zombie
-        
         # Only care about zombies within a certain range
-        max_distance_squared = (self.xbound / 4) ** 2
-        if shortest_dist < max_distance_squared:
-            self.closest_zombie = closest
-        else:
-            self.closest_zombie = None
+        self.closest_zombie, _ = self.sim.find_nearest(self, "zombie", self.xbound / 4)
 
     def turn(self):
         """Create a new zombie at human's location"""
-        new_zombie = Zombie(self.xcord, self.ycord, self.xbound, self.ybound, self.sim)
+        new_zombie = self.sim.zombie_pool.acquire(self.xcord, self.ycord)
         self.sim.new_zombies.append(new_zombie)
+        self.sim.conversions += 1
 
     def die(self):
         """Remove human from simulation"""
-        # Check if this human is already dead to prevent the "x not in list" error
-        if not self.is_dead and self in self.sim.humans:
-            self.sim.humans.remove(self)
-            self.is_dead = True
+        # Only tombstoned here, the list is compacted at the end of the tick
+        if self.sim.humans.discard(self):
+            self.sim.index_remove(self)
 
     def get_eaten(self):
         """Determines whether a human that is eaten is turned into a zombie or not"""
-        if random.random() >= self.immunity:
+        if self.sim.rng.random() >= self.immunity:
             self.turn()
         self.die()
 
     def reproduce(self):
         """Humans have a random chance to reproduce"""
-        if random.randint(0, 499) == 0:
-            self.sim.new_humans.append(
-                Human(self.xcord, self.ycord, self.xbound, self.ybound, 
-                     self.immunity, self.sim)
-            )
+        if self.sim.rng.randint(0, self.birth_odds - 1) == 0:
+            self.sim.new_humans.append(self.sim.human_pool.acquire(self.xcord, self.ycord))
 
     def update(self):
         """Run all time step operations on the human"""
@@ -239,20 +375,34 @@ class Human(object):
 class Zombie(object):
     """A Zombie that chases Humans around to eat them"""
 
-    def __init__(self, xcord: float, ycord: float, xbound: int, ybound: int, sim: Simulator):
+    __slots__ = ("xcord", "ycord", "direction", "xvel", "yvel", "closest_human", "hunger",
+                 "max_hunger", "cell", "incr", "update_counter", "is_dead")
+
+    species = "zombie"
+    
+    # Shared by every zombie, the simulator's own subclass fills these in
+    sim = None
+    xbound = 0
+    ybound = 0
+    speed = 0.8
+    
+    # Slots every zombie starts out with the same value in, for bulk spawning
+    initial = {"closest_human": None, "hunger": 0, "cell": None, "incr": 0, "update_counter": 0,
+               "is_dead": False}
+
+    def __init__(self, xcord: float, ycord: float):
         self.xcord = xcord
         self.ycord = ycord
-        self.xbound = xbound
-        self.ybound = ybound
-        self.sim = sim
         
-        self.speed = 0.8
         self.direction = 0
         self.xvel, self.yvel = get_velocity(self.speed, self.direction)
         
         self.closest_human = None
         self.hunger = 0
-        self.max_hunger = random.randint(200, 260)
+        self.max_hunger = self.sim.rng.randint(200, 260)
+        
+        # Where the spatial index has filed the agent, None until it is added
+        self.cell = None
         
         self.incr = 0
         self.update_counter = 0
@@ -268,37 +418,14 @@ class Zombie(object):
                 self.closest_human.ycord - self.ycord
             )
             # Add some randomness
-            self.direction += (random.random() - 0.5) * .5 * math.pi
+            self.direction += (self.sim.rng.random() - 0.5) * .5 * math.pi
         else:
             # Random direction if no humans nearby
-            self.direction = random.random() * math.pi * 2
+            self.direction = self.sim.rng.random() * math.pi * 2
 
     def find_closest_human(self):
         """Find closest human using spatial partitioning"""
-        nearby_humans = self.sim.get_nearby_agents(self, "human", search_radius=2)
-        
-        if not nearby_humans:
-            self.closest_human = None
-            return
-            
-        shortest_dist = float('inf')
-        closest = None
-        
-        for human in nearby_humans:
-            # Skip already dead humans
-            if human.is_dead:
-                continue
-                
-            # Use squared distance to avoid sqrt
-            dist_squared = distance_squared(
-                self.xcord, self.ycord, human.xcord, human.ycord
-            )
-            
-            if dist_squared < shortest_dist:
-                shortest_dist = dist_squared
-                closest = human
-        
-        self.closest_human = closest
+        self.closest_human, _ = self.sim.find_nearest(self, "human", self.sim.zombie_sight)
 
     def move(self):
         """Moves the zombie to the next location"""
@@ -307,7 +434,7 @@ class Zombie(object):
             self.xvel = -self.xvel
             
             if self.incr >= 3:
-                self.direction = random.random() * math.pi * 2
+                self.direction = self.sim.rng.random() * math.pi * 2
                 self.move()
                 return
 
@@ -315,47 +442,19 @@ class Zombie(object):
             self.yvel = -self.yvel
             
             if self.incr >= 3:
-                self.direction = random.random() * math.pi * 2
+                self.direction = self.sim.rng.random() * math.pi * 2
                 self.move()
                 return
 
         self.xcord += self.xvel
         self.ycord += self.yvel
-
-    def can_eat(self):
-        """Check if closest human is close enough to eat"""
-        if not self.closest_human or self.closest_human.is_dead:
-            return False
-            
-        # Use squared distance (threshold is 1 unit, so 1²)
-        dist_squared = distance_squared(
-            self.xcord, self.ycord, 
-            self.closest_human.xcord, self.closest_human.ycord
-        )
-        
-        return dist_squared <= 1
-
-    def eat(self):
-        """Eat the closest human"""
-        if self.hunger < 40:
-            self.hunger = 0
-        else:
-            self.hunger -= 40
-            
-        if self.closest_human and not self.closest_human.is_dead:
-            self.closest_human.get_eaten()
-            # Clear reference to eaten human
-            self.closest_human = None
-        
-        if self.sim.debug:
-            print("A Zombie has eaten")
+        self.sim.index_move(self)
 
     def die(self):
         """Remove zombie from simulation"""
-        # Check if this zombie is already dead to prevent the "x not in list" error
-        if not self.is_dead and self in self.sim.zombies:
-            self.sim.zombies.remove(self)
-            self.is_dead = True
+        # Only tombstoned here, the list is compacted at the end of the tick
+        if self.sim.zombies.discard(self):
+            self.sim.index_remove(self)
 
     def update(self):
         """Update zombie state"""
@@ -367,8 +466,7 @@ class Zombie(object):
         self.update_counter += 1
         if (self.update_counter >= 4 or 
             not self.closest_human or 
-            self.closest_human.is_dead or 
-            self.closest_human not in self.sim.humans):
+            self.closest_human.is_dead):
             
             self.find_closest_human()
             self.update_counter = 0
@@ -376,8 +474,7 @@ class Zombie(object):
         # Set direction and velocity
         if (self.incr == 0 or 
             not self.closest_human or 
-            self.closest_human.is_dead or 
-            self.closest_human not in self.sim.humans):
+            self.closest_human.is_dead):
             
             self.set_direction()
             self.xvel, self.yvel = get_velocity(self.speed, self.direction)
@@ -390,9 +487,7 @@ class Zombie(object):
         
         self.move()
         
-        # Try to eat nearby humans
-        if self.can_eat():
-            self.eat()
+        # Eating happens once every zombie has moved, see Simulator.resolve_contacts
         
         self.incr += 1
         if self.incr > 6:
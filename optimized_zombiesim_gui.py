@@ -1,12 +1,12 @@
 # Did some basic optimizations by chatting with Claude
 
 import pygame
-import math
 import time
 
 pygame.init()
 
-from optimized_zombiesim import Human, Simulator, Zombie
+from optimized_zombiesim import Simulator
+from renderer import AgentRenderer, coordinates
 
 class Grid(object):
     def __init__(self, xbound, ybound, num_humans, num_zombies):
@@ -34,12 +34,8 @@ class Grid(object):
         # Font for text display
         self.myfont = pygame.font.SysFont('Arial', 30)
 
-        # Create surfaces for agents (better than drawing rectangles each frame)
-        self.human_surf = pygame.Surface((self.scale, self.scale))
-        self.human_surf.fill(self.BLUE)
-        
-        self.zombie_surf = pygame.Surface((self.scale, self.scale))
-        self.zombie_surf.fill(self.RED)
+        # Draws every agent of a species in one go (see renderer.py)
+        self.renderer = AgentRenderer(self.WINDOW_SIZE, self.scale)
         
         # Performance tracking
         self.clock = pygame.time.Clock()
@@ -92,25 +88,9 @@ class Grid(object):
                 elif event.type == pygame.KEYDOWN:
                     # Add some interactivity - press 'h' to add humans, 'z' to add zombies
                     if event.key == pygame.K_h:
-                        for _ in range(10):
-                            self.sim.new_humans.append(
-                                Human(
-                                    random.randint(0, self.sim.xbound),
-                                    random.randint(0, self.sim.ybound),
-                                    self.sim.xbound, self.sim.ybound,
-                                    0.3, self.sim
-                                )
-                            )
+                        self.sim.spawn_humans(10)
                     elif event.key == pygame.K_z:
-                        for _ in range(5):
-                            self.sim.new_zombies.append(
-                                Zombie(
-                                    random.randint(0, self.sim.xbound),
-                                    random.randint(0, self.sim.ybound),
-                                    self.sim.xbound, self.sim.ybound,
-                                    self.sim
-                                )
-                            )
+                        self.sim.spawn_zombies(5)
 
             # Clear screen
             self.screen.fill(self.WHITE)
@@ -118,20 +98,9 @@ class Grid(object):
             # Update simulation
             self.sim.update()
 
-            # Use blit instead of draw.rect for better performance
-            for zombie in self.sim.zombies:
-                self.screen.blit(
-                    self.zombie_surf, 
-                    (math.floor(zombie.xcord * self.scale), 
-                     math.floor(zombie.ycord * self.scale))
-                )
-
-            for human in self.sim.humans:
-                self.screen.blit(
-                    self.human_surf, 
-                    (math.floor(human.xcord * self.scale), 
-                     math.floor(human.ycord * self.scale))
-                )
+            # Humans are drawn last so they show on top of zombies
+            self.renderer.draw(self.screen, *coordinates(self.sim.zombies), self.RED)
+            self.renderer.draw(self.screen, *coordinates(self.sim.humans), self.BLUE)
             
             # Draw statistics
             self.draw_stats()
@@ -145,5 +114,4 @@ class Grid(object):
         pygame.quit()
 
 if __name__ == "__main__":
-    import random
     grid = Grid(100, 100, 2500, 3)
\ No newline at end of file
@@ -0,0 +1,66 @@
+# Bulk drawing for the pygame GUIs. Rather than one blit per agent, all agents of
+# a species are marked in a pixel mask with a few array operations and the mask
+# is painted into the screen through a surfarray view, so drawing a frame costs
+# about the same at 100 agents as at 100k
+#
+#   renderer = AgentRenderer(screen.get_size(), scale=5)
+#   renderer.draw(screen, *coordinates(sim.humans), (0, 0, 255))
+
+from operator import attrgetter
+
+import numpy as np
+import pygame
+
+get_x = attrgetter("xcord")
+get_y = attrgetter("ycord")
+
+
+def coordinates(agents):
+    """x and y coordinates of a list of agents, as two arrays"""
+    count = len(agents)
+    return (np.fromiter(map(get_x, agents), dtype=np.float64, count=count),
+            np.fromiter(map(get_y, agents), dtype=np.float64, count=count))
+
+
+class AgentRenderer(object):
+    """Draws agents as squares of scale x scale pixels with their top left corner
+    at floor(coordinate * scale), the same squares the GUIs used to blit one at a
+    time. Squares reaching past the edge of the surface are clipped"""
+
+    def __init__(self, size, scale: int):
+        self.width, self.height = size
+        self.scale = scale
+
+        # Indexed [x, y] like surfarray views, reused every frame
+        self.mask = np.zeros((self.width, self.height), dtype=np.bool_)
+        self.rows = np.zeros_like(self.mask)
+
+    def draw(self, surface, xs, ys, color):
+        """Paint a square of color for every agent at (xs[i], ys[i])"""
+        px = np.floor(np.asarray(xs) * self.scale).astype(np.intp)
+        py = np.floor(np.asarray(ys) * self.scale).astype(np.intp)
+        inside = (px >= 0) & (px < self.width) & (py >= 0) & (py < self.height)
+
+        # Mark the corners, then grow them into squares one axis at a time
+        corners = self.mask
+        corners[:] = False
+        corners[px[inside], py[inside]] = True
+        rows = self.rows
+        rows[:] = corners
+        for shift in range(1, self.scale):
+            rows[shift:] |= corners[:-shift]
+        squares = corners
+        squares[:] = rows
+        for shift in range(1, self.scale):
+            squares[:, shift:] |= rows[:, :-shift]
+
+        # The views lock the surface until they are released. Mapped colours
+        # written through a 2d view are much faster than RGB triples through a
+        # 3d one, which is only needed for surfaces with 24 bit pixels
+        if surface.get_bytesize() == 3:
+            pixels = pygame.surfarray.pixels3d(surface)
+            pixels[squares] = color
+        else:
+            pixels = pygame.surfarray.pixels2d(surface)
+            np.copyto(pixels, surface.map_rgb(color), where=squares, casting="unsafe")
+        del pixels
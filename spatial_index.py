@@ -0,0 +1,819 @@
+# Spatial indexes the object based simulators can use to look up agents by position.
+# Each one indexes a single species and keeps its own bookkeeping in agent.cell
+
+import heapq
+import math
+import threading
+from collections import defaultdict
+from itertools import compress, repeat
+from operator import attrgetter, itemgetter
+from typing import Protocol
+
+
+class SpatialIndex(Protocol):
+    """What a simulator needs from a spatial index"""
+
+    # False for indexes the simulator rebuilds once per tick, because they only
+    # see positions as of their last build() or are cheapest kept that way
+    incremental: bool
+
+    def build(self, agents):
+        """Replace the contents of the index with agents"""
+
+    def insert(self, agent):
+        """Add a newly spawned agent"""
+
+    def update(self, agent):
+        """Account for an agent having moved"""
+
+    def stale(self, agent) -> bool:
+        """Whether update() has any work to do for an agent, must be cheap"""
+
+    def remove(self, agent):
+        """Take an agent out of the index, ignored if it is not in it"""
+
+    def nearest(self, xcord: float, ycord: float, max_distance: float = math.inf, exclude=None):
+        """Closest agent strictly within max_distance of a point, other than exclude.
+        Returns (agent, squared distance), or (None, inf)"""
+
+    def search(self, xcord: float, ycord: float, max_distance: float = math.inf, exclude=None):
+        """nearest() without touching the running totals, returns (agent, squared
+        distance, cells, scanned) so the caller can tally the query itself"""
+
+    def query_radius(self, xcord: float, ycord: float, radius: float) -> list:
+        """Every agent within radius of a point"""
+
+    # Running totals of nearest()/query_radius() calls and of the agents they
+    # compared distances against, read by instrumentation.py
+    queries: int
+    scanned: int
+
+    def add_counts(self, queries: int, cells: int, scanned: int):
+        """Add queries tallied elsewhere, e.g. by search() callers, to the running totals"""
+
+    def __len__(self) -> int:
+        """Number of indexed agents"""
+
+
+class QueryCounts(object):
+    """Running totals shared by the indexes below, which implement search()"""
+
+    queries = 0
+    scanned = 0
+    cells = 0  # Only the grid counts the cells it looks into
+
+    def nearest(self, xcord, ycord, max_distance=math.inf, exclude=None):
+        closest, dist_squared, cells, scanned = self.search(xcord, ycord, max_distance, exclude)
+        self.add_counts(1, cells, scanned)
+        return closest, dist_squared
+
+    def add_counts(self, queries, cells, scanned):
+        self.queries += queries
+        self.cells += cells
+        self.scanned += scanned
+
+
+class UniformGrid(QueryCounts):
+    """Fixed size square cells, each mapping to the agents inside it"""
+
+    incremental = True
+
+    def __init__(self, xbound: int, ybound: int, cell_size: float = 10):
+        self.xbound = xbound
+        self.ybound = ybound
+        self.cell_size = cell_size
+        self.grid = defaultdict(dict)
+        self.queries = 0
+        self.scanned = 0
+        self.cells = 0  # Running total of cells the queries looked into, see cell_tuning.py
+        self.build(())
+
+    def __len__(self):
+        return self.count
+
+    def get_cell(self, xcord, ycord):
+        """Grid cell containing a point"""
+        return (int(xcord // self.cell_size), int(ycord // self.cell_size))
+
+    def build(self, agents):
+        # Cells covering the world, agents past its edge get cells of their own
+        self.cols = int(self.xbound // self.cell_size) + 1
+        self.rows = int(self.ybound // self.cell_size) + 1
+        self.grid.clear()
+        self.count = 0
+        for agent in agents:
+            self.insert(agent)
+
+    def insert(self, agent):
+        agent.cell = self.get_cell(agent.xcord, agent.ycord)
+        self.grid[agent.cell][agent] = None
+        self.count += 1
+
+    def stale(self, agent):
+        return self.get_cell(agent.xcord, agent.ycord) != agent.cell
+
+    def update(self, agent):
+        """Move an agent to its new cell, only if it actually changed cell"""
+        cell = self.get_cell(agent.xcord, agent.ycord)
+        if cell != agent.cell:
+            self._pop(agent)
+            agent.cell = cell
+            self.grid[cell][agent] = None
+
+    def remove(self, agent):
+        if agent.cell is not None:
+            self._pop(agent)
+            agent.cell = None
+            self.count -= 1
+
+    def _pop(self, agent):
+        """Remove an agent from its current cell, dropping the cell once empty"""
+        occupants = self.grid[agent.cell]
+        del occupants[agent]
+        if not occupants:
+            del self.grid[agent.cell]
+
+    def ring_cells(self, cell_x, cell_y, ring):
+        """Cells exactly `ring` steps (in either axis) away from a cell"""
+        if ring == 0:
+            return [(cell_x, cell_y)]
+
+        cells = []
+        for dx in range(-ring, ring + 1):
+            cells.append((cell_x + dx, cell_y - ring))
+            cells.append((cell_x + dx, cell_y + ring))
+        for dy in range(-ring + 1, ring):
+            cells.append((cell_x - ring, cell_y + dy))
+            cells.append((cell_x + ring, cell_y + dy))
+        return cells
+
+    def search(self, xcord, ycord, max_distance=math.inf, exclude=None):
+        """Search outward one ring of cells at a time until no farther ring can
+        hold anything closer"""
+        grid = self.grid
+        size = self.cell_size
+        cell_x, cell_y = self.get_cell(xcord, ycord)
+
+        closest = None
+        shortest_dist = max_distance ** 2
+        scanned = 0
+
+        # Every cell of the world, and every cell holding points within max_distance,
+        # lies within this many rings of the point
+        last_ring = max(cell_x, cell_y, self.cols - 1 - cell_x, self.rows - 1 - cell_y)
+        if max_distance < math.inf:
+            last_ring = min(last_ring, int(max_distance // size) + 1)
+
+        # Visiting an occupied cell directly costs about four times as much as
+        # walking past one, and the walk gets through about one cell in every
+        # occupied one of the world before it reaches something to stop on
+        occupied = len(grid)
+        if occupied * 4 < min((2 * last_ring + 1) ** 2, self.cols * self.rows / max(occupied, 1)):
+            # Few occupied cells, visiting them directly beats walking the rings
+            cells = occupied
+            for (other_x, other_y), occupants in grid.items():
+                # Distance from the point to the nearest edge of that cell, not
+                # worth working out for a lone agent
+                if len(occupants) > 1:
+                    gap_x = max((other_x - cell_x) * size - (xcord - cell_x * size),
+                                (cell_x - other_x) * size - ((cell_x + 1) * size - xcord), 0)
+                    gap_y = max((other_y - cell_y) * size - (ycord - cell_y * size),
+                                (cell_y - other_y) * size - ((cell_y + 1) * size - ycord), 0)
+                    if gap_x * gap_x + gap_y * gap_y >= shortest_dist:
+                        continue
+                scanned += len(occupants)
+                for other in occupants:
+                    dist_squared = (other.xcord - xcord)**2 + (other.ycord - ycord)**2
+                    if dist_squared < shortest_dist and other is not exclude:
+                        shortest_dist = dist_squared
+                        closest = other
+        else:
+            cells = 0
+            for ring in range(last_ring + 1):
+                if ring:
+                    # Everything in this ring lies outside the block searched so far,
+                    # so it is at least as far away as that block's nearest edge
+                    gap = min(xcord - (cell_x - ring + 1) * size, (cell_x + ring) * size - xcord,
+                              ycord - (cell_y - ring + 1) * size, (cell_y + ring) * size - ycord)
+                    if gap * gap >= shortest_dist:
+                        break
+                cells += 8 * ring or 1
+                for cell in self.ring_cells(cell_x, cell_y, ring):
+                    occupants = grid.get(cell)
+                    if not occupants:
+                        continue
+                    scanned += len(occupants)
+                    for other in occupants:
+                        dist_squared = (other.xcord - xcord)**2 + (other.ycord - ycord)**2
+                        if dist_squared < shortest_dist and other is not exclude:
+                            shortest_dist = dist_squared
+                            closest = other
+
+        if closest is None:
+            return None, math.inf, cells, scanned
+        return closest, shortest_dist, cells, scanned
+
+    def query_radius(self, xcord, ycord, radius):
+        cell_x, cell_y = self.get_cell(xcord, ycord)
+        reach = int(radius // self.cell_size) + 1
+        radius_squared = radius * radius
+
+        found = []
+        scanned = 0
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                occupants = self.grid.get((cell_x + dx, cell_y + dy))
+                if not occupants:
+                    continue
+                scanned += len(occupants)
+                for other in occupants:
+                    if (other.xcord - xcord)**2 + (other.ycord - ycord)**2 <= radius_squared:
+                        found.append(other)
+
+        self.queries += 1
+        self.scanned += scanned
+        self.cells += (2 * reach + 1) ** 2
+        return found
+
+
+def counting_order(keys, key_count: int):
+    """Stable order that sorts non-negative integer keys below key_count in O(n).
+    NumPy sorts 16 bit keys with a radix sort, so larger keys are sorted 16 bits
+    at a time, lowest first"""
+    import numpy as np
+    order = np.argsort((keys & 0xFFFF).astype(np.uint16), kind="stable")
+    shift = 16
+    while key_count - 1 >> shift:
+        digits = ((keys[order] >> shift) & 0xFFFF).astype(np.uint16)
+        order = order[np.argsort(digits, kind="stable")]
+        shift += 16
+    return order
+
+
+class _Vacant(object):
+    """Stands in the sorted list of a CSRGrid where an agent has left its cell"""
+
+    __slots__ = ()
+
+
+VACANT = _Vacant()
+
+
+class CSRGrid(QueryCounts):
+    """Uniform grid stored in compressed sparse row layout: the agents sorted by
+    flat cell id in one list, and the offset where each cell's run starts, so the
+    agents of a row of neighbouring cells are one slice of the list.
+
+    Sorting is a counting sort over the cell ids, a handful of arrays whatever the
+    population instead of a dict and a tuple key per cell. The layout can't grow,
+    so an agent that moves to another cell or is removed leaves VACANT in its
+    place and agents inserted or moved wait in a dict on the side. The first
+    query after such changes sorts the index again from its own contents, which
+    in a tick where each species moves, then gets looked up, happens once per
+    species. The sort holds a lock, so concurrent readers leave it to the first
+    of them. agent.cell holds the flat cell id"""
+
+    incremental = True
+
+    def __init__(self, xbound: int, ybound: int, cell_size: float = 10):
+        self.xbound = xbound
+        self.ybound = ybound
+        self.cell_size = cell_size
+        self.queries = 0
+        self.scanned = 0
+        self.cells = 0  # Running total of cells the queries looked into, see cell_tuning.py
+        self.lock = threading.Lock()
+        self.build(())
+
+    def __len__(self):
+        return self.count
+
+    def get_cell(self, xcord, ycord):
+        """Flat id of the grid cell containing a point, points past the edge of
+        the world count as in the nearest cell"""
+        cell_x = int(xcord // self.cell_size)
+        cell_y = int(ycord // self.cell_size)
+        if not 0 <= cell_x < self.cols:
+            cell_x = min(max(cell_x, 0), self.cols - 1)
+        if not 0 <= cell_y < self.rows:
+            cell_y = min(max(cell_y, 0), self.rows - 1)
+        return cell_y * self.cols + cell_x
+
+    def build(self, agents):
+        # NumPy is only loaded once a run picks this index
+        import numpy as np
+        agents = list(agents)
+        count = len(agents)
+        size = self.cell_size
+        self.cols = int(self.xbound // size) + 1
+        self.rows = int(self.ybound // size) + 1
+
+        x = np.fromiter(map(attrgetter("xcord"), agents), dtype=np.float64, count=count)
+        y = np.fromiter(map(attrgetter("ycord"), agents), dtype=np.float64, count=count)
+        cells = (np.clip((y // size).astype(np.intp), 0, self.rows - 1) * self.cols
+                 + np.clip((x // size).astype(np.intp), 0, self.cols - 1))
+        self._lay_out(agents, cells)
+        list(map(setattr, agents, repeat("cell"), cells.tolist()))
+
+    def _lay_out(self, agents, cells):
+        """Counting sort agents by their cell ids into the sorted list and offsets"""
+        import numpy as np
+        self.counts = np.bincount(cells, minlength=self.cols * self.rows)
+        offsets = np.zeros(len(self.counts) + 1, dtype=np.intp)
+        np.cumsum(self.counts, out=offsets[1:])
+
+        self.members = list(map(agents.__getitem__, counting_order(cells, len(self.counts)).tolist()))
+        self.offsets = offsets.tolist()
+        self.occupied = np.flatnonzero(self.counts).tolist()
+        self.waiting = {}  # Agents inserted or moved since the last sort
+        self.vacated = []  # Positions in members left VACANT since the last sort
+        self.count = len(agents)
+
+    def settle(self):
+        """Sort the agents waiting on the side into the layout, if there are any.
+        Agents that stayed put keep the cell their run says, the others carry it
+        in agent.cell, so no position is read"""
+        if not (self.waiting or self.vacated):
+            return
+        with self.lock:
+            if not (self.waiting or self.vacated):
+                return
+            import numpy as np
+            cells = np.repeat(np.arange(len(self.counts)), self.counts)
+            agents = self.members
+            if self.vacated:
+                staying = np.ones(len(agents), dtype=bool)
+                staying[self.vacated] = False
+                cells = cells[staying]
+                agents = list(compress(agents, staying.tolist()))
+            arrivals = list(self.waiting)
+            arrival_cells = np.fromiter(map(attrgetter("cell"), arrivals), dtype=np.intp, count=len(arrivals))
+            self._lay_out(agents + arrivals, np.concatenate((cells, arrival_cells)))
+
+    def _unfile(self, agent):
+        """Take an agent out of the cell it is filed in"""
+        if agent in self.waiting:
+            del self.waiting[agent]
+            return
+        start, end = self.offsets[agent.cell], self.offsets[agent.cell + 1]
+        position = self.members.index(agent, start, end)
+        self.members[position] = VACANT
+        self.vacated.append(position)
+
+    def insert(self, agent):
+        agent.cell = self.get_cell(agent.xcord, agent.ycord)
+        self.waiting[agent] = None
+        self.count += 1
+
+    def stale(self, agent):
+        return self.get_cell(agent.xcord, agent.ycord) != agent.cell
+
+    def update(self, agent):
+        """Move an agent to its new cell, only if it actually changed cell"""
+        cell = self.get_cell(agent.xcord, agent.ycord)
+        if cell != agent.cell:
+            self._unfile(agent)
+            agent.cell = cell
+            self.waiting[agent] = None
+
+    def remove(self, agent):
+        if agent.cell is not None:
+            self._unfile(agent)
+            agent.cell = None
+            self.count -= 1
+
+    def ring_runs(self, cell_x, cell_y, ring):
+        """Cells exactly `ring` steps (in either axis) away from a cell, as runs
+        (first, last) of consecutive flat ids, leaving out those past the edge of
+        the world. The top and bottom rows of the ring are one run each"""
+        cols, rows = self.cols, self.rows
+        if ring == 0:
+            cell = cell_y * cols + cell_x
+            return [(cell, cell)]
+        runs = []
+        x0, x1 = max(cell_x - ring, 0), min(cell_x + ring, cols - 1)
+        for other_y in (cell_y - ring, cell_y + ring):
+            if 0 <= other_y < rows:
+                runs.append((other_y * cols + x0, other_y * cols + x1))
+        for other_x in (cell_x - ring, cell_x + ring):
+            if 0 <= other_x < cols:
+                for other_y in range(max(cell_y - ring + 1, 0), min(cell_y + ring - 1, rows - 1) + 1):
+                    cell = other_y * cols + other_x
+                    runs.append((cell, cell))
+        return runs
+
+    def search(self, xcord, ycord, max_distance=math.inf, exclude=None):
+        """Search outward one ring of cells at a time until no farther ring can
+        hold anything closer, like UniformGrid. With few occupied cells those are
+        visited directly instead, closest first"""
+        self.settle()
+        members = self.members
+        offsets = self.offsets
+        size = self.cell_size
+        cols = self.cols
+        cell_y, cell_x = divmod(self.get_cell(xcord, ycord), cols)
+
+        closest = None
+        shortest_dist = max_distance ** 2
+        scanned = 0
+
+        last_ring = max(cell_x, cell_y, cols - 1 - cell_x, self.rows - 1 - cell_y)
+        if max_distance < math.inf:
+            last_ring = min(last_ring, int(max_distance // size) + 1)
+
+        # Walking the rings gets through about one cell in every occupied one
+        # before it reaches something to stop on, see UniformGrid.search
+        occupied = len(self.occupied)
+        if occupied * 4 < min((2 * last_ring + 1) ** 2, cols * self.rows / max(occupied, 1)):
+            # Few occupied cells, visiting them directly beats walking the rings
+            cells = occupied
+            blocks = []
+            for cell in self.occupied:
+                start, end = offsets[cell], offsets[cell + 1]
+                if end - start == 1:
+                    # A lone agent is compared straight away
+                    other = members[start]
+                    scanned += 1
+                    dist_squared = (other.xcord - xcord)**2 + (other.ycord - ycord)**2
+                    if dist_squared < shortest_dist and other is not exclude:
+                        shortest_dist = dist_squared
+                        closest = other
+                    continue
+                other_y, other_x = divmod(cell, cols)
+                # Distance from the point to the nearest edge of that cell
+                gap_x = max((other_x - cell_x) * size - (xcord - cell_x * size),
+                            (cell_x - other_x) * size - ((cell_x + 1) * size - xcord), 0)
+                gap_y = max((other_y - cell_y) * size - (ycord - cell_y * size),
+                            (cell_y - other_y) * size - ((cell_y + 1) * size - ycord), 0)
+                gap = gap_x * gap_x + gap_y * gap_y
+                if gap < shortest_dist:
+                    blocks.append((gap, cell))
+            # Closest cells first, so the rest can be cut short
+            blocks.sort()
+            for gap, cell in blocks:
+                if gap >= shortest_dist:
+                    break
+                start, end = offsets[cell], offsets[cell + 1]
+                scanned += end - start
+                for other in members[start:end]:
+                    dist_squared = (other.xcord - xcord)**2 + (other.ycord - ycord)**2
+                    if dist_squared < shortest_dist and other is not exclude:
+                        shortest_dist = dist_squared
+                        closest = other
+        else:
+            cells = 0
+            for ring in range(last_ring + 1):
+                if ring:
+                    # Everything in this ring lies outside the block searched so far,
+                    # so it is at least as far away as that block's nearest edge
+                    gap = min(xcord - (cell_x - ring + 1) * size, (cell_x + ring) * size - xcord,
+                              ycord - (cell_y - ring + 1) * size, (cell_y + ring) * size - ycord)
+                    if gap * gap >= shortest_dist:
+                        break
+                cells += 8 * ring or 1
+                for first, last in self.ring_runs(cell_x, cell_y, ring):
+                    start, end = offsets[first], offsets[last + 1]
+                    if start == end:
+                        continue
+                    scanned += end - start
+                    for other in members[start:end]:
+                        dist_squared = (other.xcord - xcord)**2 + (other.ycord - ycord)**2
+                        if dist_squared < shortest_dist and other is not exclude:
+                            shortest_dist = dist_squared
+                            closest = other
+
+        if closest is None:
+            return None, math.inf, cells, scanned
+        return closest, shortest_dist, cells, scanned
+
+    def query_radius(self, xcord, ycord, radius):
+        self.settle()
+        cols = self.cols
+        cell_y, cell_x = divmod(self.get_cell(xcord, ycord), cols)
+        reach = int(radius // self.cell_size) + 1
+        radius_squared = radius * radius
+        x0, x1 = max(cell_x - reach, 0), min(cell_x + reach, cols - 1)
+
+        found = []
+        scanned = 0
+        for other_y in range(max(cell_y - reach, 0), min(cell_y + reach, self.rows - 1) + 1):
+            # One row of the block is one slice
+            start, end = self.offsets[other_y * cols + x0], self.offsets[other_y * cols + x1 + 1]
+            scanned += end - start
+            for other in self.members[start:end]:
+                if (other.xcord - xcord)**2 + (other.ycord - ycord)**2 <= radius_squared:
+                    found.append(other)
+
+        self.queries += 1
+        self.scanned += scanned
+        self.cells += (2 * reach + 1) ** 2
+        return found
+
+
+class QuadNode(object):
+    """Square region of a QuadTree, a leaf holds agents and a branch four children"""
+
+    __slots__ = ("x0", "y0", "x1", "y1", "depth", "parent", "children", "items", "count")
+
+    def __init__(self, x0, y0, x1, y1, depth, parent):
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+        self.depth = depth
+        self.parent = parent
+        self.children = None
+        self.items = {}
+        self.count = 0  # Agents anywhere below this node
+
+    def contains(self, xcord, ycord):
+        return self.x0 <= xcord < self.x1 and self.y0 <= ycord < self.y1
+
+    def child_for(self, xcord, ycord):
+        """Child whose quadrant holds a point, points outside go to the nearest one"""
+        right = xcord >= (self.x0 + self.x1) / 2
+        below = ycord >= (self.y0 + self.y1) / 2
+        return self.children[right + 2 * below]
+
+    def distance_squared(self, xcord, ycord):
+        """Squared distance from a point to the closest point of the region"""
+        dx = max(self.x0 - xcord, 0, xcord - self.x1)
+        dy = max(self.y0 - ycord, 0, ycord - self.y1)
+        return dx * dx + dy * dy
+
+
+class QuadTree(QueryCounts):
+    """Region quadtree that splits crowded leaves, so dense clusters get small
+    cells and empty space stays coarse"""
+
+    incremental = True
+
+    def __init__(self, xbound: int, ybound: int, capacity: int = 16, max_depth: int = 12, **_):
+        self.xbound = xbound
+        self.ybound = ybound
+        self.capacity = capacity
+        self.max_depth = max_depth
+        self.root = self._new_root()
+        self.queries = 0
+        self.scanned = 0
+
+    def _new_root(self):
+        # Agents can sit exactly on the far walls, so the root reaches past them
+        size = max(self.xbound, self.ybound) + 1
+        return QuadNode(0, 0, size, size, 0, None)
+
+    def __len__(self):
+        return self.root.count
+
+    def build(self, agents):
+        self.root = self._new_root()
+        for agent in agents:
+            self.insert(agent)
+
+    def insert(self, agent):
+        xcord, ycord = agent.xcord, agent.ycord
+        node = self.root
+        while node.children is not None:
+            node.count += 1
+            node = node.child_for(xcord, ycord)
+        node.count += 1
+        node.items[agent] = None
+        agent.cell = node
+
+        if len(node.items) > self.capacity and node.depth < self.max_depth:
+            self._split(node)
+
+    def _split(self, node):
+        """Turn a crowded leaf into a branch with four leaves"""
+        mid_x = (node.x0 + node.x1) / 2
+        mid_y = (node.y0 + node.y1) / 2
+        depth = node.depth + 1
+        node.children = [
+            QuadNode(node.x0, node.y0, mid_x, mid_y, depth, node),
+            QuadNode(mid_x, node.y0, node.x1, mid_y, depth, node),
+            QuadNode(node.x0, mid_y, mid_x, node.y1, depth, node),
+            QuadNode(mid_x, mid_y, node.x1, node.y1, depth, node),
+        ]
+        for agent in node.items:
+            child = node.child_for(agent.xcord, agent.ycord)
+            child.items[agent] = None
+            child.count += 1
+            agent.cell = child
+        node.items = {}
+
+        for child in node.children:
+            if len(child.items) > self.capacity and child.depth < self.max_depth:
+                self._split(child)
+
+    def stale(self, agent):
+        return not agent.cell.contains(agent.xcord, agent.ycord)
+
+    def update(self, agent):
+        if not agent.cell.contains(agent.xcord, agent.ycord):
+            self.remove(agent)
+            self.insert(agent)
+
+    def remove(self, agent):
+        leaf = agent.cell
+        if leaf is None:
+            return
+        del leaf.items[agent]
+        agent.cell = None
+
+        node = leaf
+        while node is not None:
+            node.count -= 1
+            node = node.parent
+
+        # Fold a branch back into a leaf once its agents fit comfortably again
+        parent = leaf.parent
+        if (parent is not None and parent.count <= self.capacity // 2 and
+                all(child.children is None for child in parent.children)):
+            for child in parent.children:
+                for other in child.items:
+                    parent.items[other] = None
+                    other.cell = parent
+            parent.children = None
+
+    def search(self, xcord, ycord, max_distance=math.inf, exclude=None):
+        """Best-first search, regions are visited closest first"""
+        closest = None
+        shortest_dist = max_distance ** 2
+        scanned = 0
+
+        order = 0  # Tie breaker so the heap never compares nodes
+        heap = [(0, order, self.root)]
+        while heap:
+            region_dist, _, node = heapq.heappop(heap)
+            if region_dist >= shortest_dist:
+                break
+            if node.children is None:
+                scanned += len(node.items)
+                for other in node.items:
+                    dist_squared = (other.xcord - xcord)**2 + (other.ycord - ycord)**2
+                    if dist_squared < shortest_dist and other is not exclude:
+                        shortest_dist = dist_squared
+                        closest = other
+                continue
+            for child in node.children:
+                if child.count:
+                    child_dist = child.distance_squared(xcord, ycord)
+                    if child_dist < shortest_dist:
+                        order += 1
+                        heapq.heappush(heap, (child_dist, order, child))
+
+        if closest is None:
+            return None, math.inf, 0, scanned
+        return closest, shortest_dist, 0, scanned
+
+    def query_radius(self, xcord, ycord, radius):
+        radius_squared = radius * radius
+        found = []
+        scanned = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not node.count or node.distance_squared(xcord, ycord) > radius_squared:
+                continue
+            if node.children is None:
+                scanned += len(node.items)
+                for other in node.items:
+                    if (other.xcord - xcord)**2 + (other.ycord - ycord)**2 <= radius_squared:
+                        found.append(other)
+            else:
+                stack.extend(node.children)
+
+        self.queries += 1
+        self.scanned += scanned
+        return found
+
+
+class KDTree(QueryCounts):
+    """Static k-d tree rebuilt once per tick from a snapshot of positions.
+
+    Queries measure distance to where agents were at the last build(). Agents
+    inserted since then are checked one by one at their current position, and
+    removed agents are skipped until the next build()"""
+
+    incremental = False
+
+    def __init__(self, xbound: int, ybound: int, leaf_size: int = 16, **_):
+        self.xbound = xbound
+        self.ybound = ybound
+        self.leaf_size = leaf_size
+        self.queries = 0
+        self.scanned = 0
+        self.build(())
+
+    def __len__(self):
+        return self.count + len(self.pending) - len(self.removed)
+
+    def build(self, agents):
+        points = [(agent.xcord, agent.ycord, agent) for agent in agents]
+        self.count = len(points)
+        self.root = self._build(points, 0)
+        self.pending = []
+        self.removed = set()
+
+    def _build(self, points, depth):
+        """Leaves are lists of (x, y, agent), branches (axis, split, below, above)"""
+        if len(points) <= self.leaf_size:
+            return points
+        axis = depth % 2
+        points.sort(key=itemgetter(axis))
+        middle = len(points) // 2
+        return (axis, points[middle][axis],
+                self._build(points[:middle], depth + 1),
+                self._build(points[middle:], depth + 1))
+
+    def insert(self, agent):
+        self.pending.append(agent)
+
+    def stale(self, agent):
+        return False
+
+    def update(self, agent):
+        pass
+
+    def remove(self, agent):
+        self.removed.add(agent)
+
+    def search(self, xcord, ycord, max_distance=math.inf, exclude=None):
+        # best also carries the number of agents scanned
+        best = [max_distance ** 2, None, len(self.pending)]
+        self._nearest(self.root, xcord, ycord, exclude, best)
+
+        for other in self.pending:
+            if other in self.removed or other is exclude:
+                continue
+            dist_squared = (other.xcord - xcord)**2 + (other.ycord - ycord)**2
+            if dist_squared < best[0]:
+                best[0] = dist_squared
+                best[1] = other
+
+        if best[1] is None:
+            return None, math.inf, 0, best[2]
+        return best[1], best[0], 0, best[2]
+
+    def _nearest(self, node, xcord, ycord, exclude, best):
+        if isinstance(node, list):
+            best[2] += len(node)
+            removed = self.removed
+            for other_x, other_y, other in node:
+                dist_squared = (other_x - xcord)**2 + (other_y - ycord)**2
+                if dist_squared < best[0] and other is not exclude and other not in removed:
+                    best[0] = dist_squared
+                    best[1] = other
+            return
+
+        axis, split, below, above = node
+        offset = (xcord if axis == 0 else ycord) - split
+        near, far = (below, above) if offset < 0 else (above, below)
+        self._nearest(near, xcord, ycord, exclude, best)
+        if offset * offset < best[0]:
+            self._nearest(far, xcord, ycord, exclude, best)
+
+    def query_radius(self, xcord, ycord, radius):
+        radius_squared = radius * radius
+        found = []
+        scanned = len(self.pending)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                scanned += len(node)
+                for other_x, other_y, other in node:
+                    if ((other_x - xcord)**2 + (other_y - ycord)**2 <= radius_squared and
+                            other not in self.removed):
+                        found.append(other)
+                continue
+            axis, split, below, above = node
+            offset = (xcord if axis == 0 else ycord) - split
+            if offset - radius <= 0:
+                stack.append(below)
+            if offset + radius >= 0:
+                stack.append(above)
+
+        for other in self.pending:
+            if (other not in self.removed and
+                    (other.xcord - xcord)**2 + (other.ycord - ycord)**2 <= radius_squared):
+                found.append(other)
+
+        self.queries += 1
+        self.scanned += scanned
+        return found
+
+
+SPATIAL_INDEXES = {
+    "grid": UniformGrid,
+    "csr": CSRGrid,
+    "quadtree": QuadTree,
+    "kdtree": KDTree,
+}
+
+
+def make_spatial_index(kind: str, xbound: int, ybound: int, **options):
+    """Create the spatial index registered under kind"""
+    if kind not in SPATIAL_INDEXES:
+        raise ValueError(f"Unknown spatial index {kind!r}, expected one of {sorted(SPATIAL_INDEXES)}")
+    return SPATIAL_INDEXES[kind](xbound, ybound, **options)
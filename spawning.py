@@ -0,0 +1,121 @@
+# Bulk creation of agents for the object engines. Making agents one by one costs
+# a full __init__ and a few rng calls each, and while a million of them are
+# allocated the garbage collector keeps rescanning the growing heap. Here the
+# random attributes of a whole batch are drawn in one go, with NumPy for large
+# batches, and the new agents' slots are filled a column at a time, with the
+# collector paused
+#
+#   sim.spawn_humans(1000, region=(0, 0, 50, 50))
+
+import gc
+import math
+from itertools import repeat
+
+# Ranges of the random attributes, inclusive, the same as the agents' __init__
+MAX_AGES = (190, 275)
+MAX_HUNGERS = (200, 260)
+
+# Batches at least this large are drawn with NumPy. Below it drawing in Python
+# costs less than importing NumPy, so small runs start without it
+NUMPY_BATCH = 100_000
+
+
+def spawn_region(sim, region=None):
+    """Bounds (x0, y0, x1, y1) of a spawn region, the whole world by default.
+    Agents spawn on whole coordinates, like the starting populations always have"""
+    if region is None:
+        return 0, 0, sim.xbound, sim.ybound
+    x0, y0, x1, y1 = region
+    if not (0 <= x0 <= x1 <= sim.xbound and 0 <= y0 <= y1 <= sim.ybound):
+        raise ValueError(f"Spawn region {tuple(region)} is not inside the {sim.xbound}x{sim.ybound} world")
+    if math.ceil(x0) > x1 or math.ceil(y0) > y1:
+        raise ValueError(f"Spawn region {tuple(region)} holds no whole coordinates")
+    return math.ceil(x0), math.ceil(y0), math.floor(x1), math.floor(y1)
+
+
+class _Draws(object):
+    """Columns of random values for a batch, from a NumPy generator seeded by rng
+    for large batches and from rng itself for small ones"""
+
+    def __init__(self, rng, count: int):
+        self.count = count
+        self.numpy = None
+        if count >= NUMPY_BATCH:
+            import numpy as np
+            self.numpy = np
+            self.rng = np.random.default_rng(rng.getrandbits(64))
+        else:
+            self.rng = rng
+
+    def integers(self, low: int, high: int):
+        """count integers between low and high, both included"""
+        if self.numpy is not None:
+            return self.rng.integers(low, high, self.count, endpoint=True).tolist()
+        random = self.rng.random
+        span = high - low + 1
+        return [low + int(random() * span) for _ in range(self.count)]
+
+    def directions(self):
+        """count angles in [0, 2 pi)"""
+        if self.numpy is not None:
+            return (self.rng.random(self.count) * 2 * math.pi).tolist()
+        random = self.rng.random
+        return [random() * 2 * math.pi for _ in range(self.count)]
+
+
+def _draw_positions(draws: _Draws, region):
+    x0, y0, x1, y1 = region
+    return draws.integers(x0, x1), draws.integers(y0, y1)
+
+
+def build(cls, count: int, columns: dict, constants: dict):
+    """count agents of cls made without running __init__. Slots are filled from
+    columns, one value per agent, and constants, one value for all of them"""
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        agents = list(map(cls.__new__, repeat(cls, count)))
+        for name, values in columns.items():
+            list(map(getattr(cls, name).__set__, agents, values))
+        for name, value in constants.items():
+            list(map(getattr(cls, name).__set__, agents, repeat(value, count)))
+    finally:
+        if collecting:
+            gc.enable()
+    return agents
+
+
+def make_humans(sim, count: int, region=None, rng=None):
+    """count new humans of sim at random spots of region, not added anywhere yet.
+    The random draws come from rng, the simulator's by default"""
+    bounds = spawn_region(sim, region)
+    draws = _Draws(rng or sim.rng, count)
+    xcords, ycords = _draw_positions(draws, bounds)
+    direction = draws.directions()
+    speed = sim.human_speed
+    columns = {
+        "xcord": xcords,
+        "ycord": ycords,
+        "max_age": draws.integers(*MAX_AGES),
+        "direction": direction,
+        "xvel": [math.cos(angle) * speed for angle in direction],
+        "yvel": [math.sin(angle) * speed for angle in direction],
+    }
+    return build(sim.Human, count, columns, sim.Human.initial)
+
+
+def make_zombies(sim, count: int, region=None, rng=None):
+    """count new zombies of sim at random spots of region, not added anywhere yet.
+    The random draws come from rng, the simulator's by default"""
+    bounds = spawn_region(sim, region)
+    draws = _Draws(rng or sim.rng, count)
+    xcords, ycords = _draw_positions(draws, bounds)
+    columns = {
+        "xcord": xcords,
+        "ycord": ycords,
+        "max_hunger": draws.integers(*MAX_HUNGERS),
+    }
+    # Zombies start out facing along the x axis
+    constants = dict(sim.Zombie.initial, direction=0, xvel=math.cos(0) * sim.zombie_speed,
+                     yvel=math.sin(0) * sim.zombie_speed)
+    return build(sim.Zombie, count, columns, constants)
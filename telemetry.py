@@ -0,0 +1,140 @@
+# Per tick telemetry for the object based simulators. Rows go into preallocated
+# buffers and a background thread appends full buffers to disk, so recording
+# every tick costs the simulation one row write
+#
+#   with TelemetryWriter("run.csv") as telemetry:
+#       telemetry.attach(sim)
+#       for _ in range(10000):
+#           sim.update()
+
+import os
+import queue
+import threading
+
+import numpy as np
+
+from instrumentation import Instrumentation
+
+# One row per tick, also the record layout of binary telemetry files
+TELEMETRY_DTYPE = np.dtype([
+    ("tick", "<i8"),
+    ("humans", "<i8"),
+    ("zombies", "<i8"),
+    ("births", "<i8"),
+    ("infections", "<i8"),  # Eaten humans that turned
+    ("eaten", "<i8"),
+    ("old_age_deaths", "<i8"),
+    ("starvation_deaths", "<i8"),
+    ("seconds", "<f8"),  # Wall time of the tick
+])
+
+FORMATS = ("csv", "binary")
+
+
+class TelemetryWriter(object):
+    """Buffers one row per tick and appends them to path in bulk.
+
+    Two buffers of `capacity` rows take turns: while the background thread
+    writes a full one the simulation fills the other, and only if both are
+    full does record() wait. The file is only ever appended to, binary files
+    hold raw TELEMETRY_DTYPE records and CSV files get a header line when new"""
+
+    def __init__(self, path, capacity: int = 4096, format: str = None):
+        if format is None:
+            format = "csv" if str(path).endswith(".csv") else "binary"
+        if format not in FORMATS:
+            raise ValueError(f"Unknown telemetry format {format!r}, expected one of {FORMATS}")
+        self.path = path
+        self.format = format
+
+        self.buffer = np.zeros(capacity, dtype=TELEMETRY_DTYPE)
+        self.count = 0
+        self.spare = queue.Queue()
+        self.spare.put(np.zeros(capacity, dtype=TELEMETRY_DTYPE))
+        self.full = queue.Queue()
+
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if format == "csv" and new_file:
+            self.file.write((",".join(TELEMETRY_DTYPE.names) + "\n").encode())
+
+        self.error = None
+        self.thread = threading.Thread(target=self._flusher, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def attach(self, sim):
+        """Record every tick of sim from now on, replaces its instrumentation"""
+        previous = sim.instrumentation
+        sim.instrumentation = Instrumentation(callback=self.record)
+        if previous is not None:
+            sim.instrumentation.ticks = previous.ticks
+
+    def record(self, stats):
+        """Add the TickStats of one tick"""
+        self.buffer[self.count] = (
+            stats.tick, stats.humans, stats.zombies, stats.births, stats.conversions, stats.eats,
+            stats.human_deaths - stats.eats, stats.zombie_deaths, stats.seconds)
+        self.count += 1
+        if self.count == len(self.buffer):
+            self._hand_off()
+
+    def _hand_off(self):
+        """Queue the current buffer for writing and carry on in the spare one"""
+        self.full.put((self.buffer, self.count))
+        self.buffer = self.spare.get()
+        self.count = 0
+
+    def _flusher(self):
+        """Background thread, writes buffers as they fill up"""
+        while True:
+            item = self.full.get()
+            if item is None:
+                break
+            buffer, count = item
+            try:
+                if self.error is None:
+                    self._write(buffer[:count])
+            except OSError as e:
+                # Reported by flush() or close(), the simulation keeps going
+                self.error = e
+            self.spare.put(buffer)
+
+    def _write(self, rows):
+        if self.format == "binary":
+            self.file.write(rows.tobytes())
+        else:
+            np.savetxt(self.file, rows, delimiter=",",
+                       fmt=["%d"] * (len(TELEMETRY_DTYPE.names) - 1) + ["%.6f"])
+        self.file.flush()
+
+    def flush(self):
+        """Write everything recorded so far and wait until it is on disk"""
+        if self.count:
+            self._hand_off()
+        # The buffer not in use comes back once the writer is idle
+        self.spare.put(self.spare.get())
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.full.put(None)
+            self.thread.join()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_telemetry(path):
+    """Rows of a telemetry file as a TELEMETRY_DTYPE array"""
+    if str(path).endswith(".csv"):
+        return np.loadtxt(path, delimiter=",", skiprows=1, dtype=TELEMETRY_DTYPE, ndmin=1)
+    return np.fromfile(path, dtype=TELEMETRY_DTYPE)
@@ -0,0 +1,45 @@
+# Instrumentation has to step every engine benchmark.py measures by default
+#
+#   python3 -m pytest test_instrumentation.py
+
+import importlib
+
+import pytest
+
+import zombiesim_cli
+from benchmark import DEFAULT_ENGINES
+from instrumentation import Instrumentation
+
+
+@pytest.mark.parametrize("engine", DEFAULT_ENGINES)
+def test_instrumented_ticks(engine):
+    module = importlib.import_module(zombiesim_cli.ENGINES[engine])
+    sim = module.Simulator(60, 60, 600, 30, False, seed=5)
+    ticks = []
+    sim.instrumentation = Instrumentation(callback=ticks.append)
+    for _ in range(20):
+        sim.update()
+    if hasattr(sim, "close"):
+        sim.close()
+
+    assert [stats.tick for stats in ticks] == list(range(20))
+    assert ticks[-1].humans == len(sim.humans)
+    assert ticks[-1].zombies == len(sim.zombies)
+    for stats in ticks:
+        assert 0 <= stats.conversions <= stats.eats
+        assert stats.births >= 0
+        assert set(stats.phase_seconds) == set(module.Simulator.phases)
+
+
+@pytest.mark.parametrize("engine", DEFAULT_ENGINES)
+def test_spawned_agents_are_not_births_or_conversions(engine):
+    module = importlib.import_module(zombiesim_cli.ENGINES[engine])
+    sim = module.Simulator(60, 60, 600, 0, False, seed=5)
+    if not hasattr(sim, "spawn_zombies"):
+        pytest.skip(f"The {engine} engine can't spawn agents")
+    sim.instrumentation = Instrumentation()
+    sim.spawn_humans(100)
+    sim.spawn_zombies(100)
+    sim.update()
+    assert sim.instrumentation.last.conversions == 0
+    assert sim.instrumentation.last.births < 100
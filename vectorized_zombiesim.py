@@ -0,0 +1,448 @@
+# Struct-of-arrays version of optimized_zombiesim.py, every agent rule is applied
+# to the whole population at once with NumPy instead of per-object method calls
+
+import math
+import numpy as np
+
+from cell_tuning import ARRAY_CELL_COST, CellTuner
+from spawning import MAX_AGES, MAX_HUNGERS, spawn_region
+
+HUMAN_FIELDS = {
+    "x": np.float64,
+    "y": np.float64,
+    "vx": np.float64,
+    "vy": np.float64,
+    "age": np.int32,
+    "max_age": np.int32,
+    "counter": np.int8,
+    "alive": np.bool_,
+}
+
+ZOMBIE_FIELDS = {
+    "x": np.float64,
+    "y": np.float64,
+    "vx": np.float64,
+    "vy": np.float64,
+    "hunger": np.int32,
+    "max_hunger": np.int32,
+    "incr": np.int8,
+    "counter": np.int8,
+    "target": np.int64,
+    "alive": np.bool_,
+}
+
+# Upper bound on (query, candidate) pairs expanded at once by CellIndex.nearest
+PAIR_BUDGET = 1 << 22
+
+# Largest search radius, in cells, auto_cell_size will use. Every query expands
+# into (2r+1)^2 cells at once, so small cells with a wide radius run out of memory
+MAX_SEARCH_RADIUS = 4
+
+
+class Population(object):
+    """Holds one species as a set of equally sized columns"""
+
+    def __init__(self, fields: dict):
+        self.fields = fields
+        for name, dtype in fields.items():
+            setattr(self, name, np.empty(0, dtype=dtype))
+
+    def __len__(self):
+        return len(self.x)
+
+    def append(self, **columns):
+        """Add new agents, every column must be given"""
+        for name, dtype in self.fields.items():
+            column = np.asarray(columns[name], dtype=dtype)
+            setattr(self, name, np.concatenate((getattr(self, name), column)))
+
+    def compact(self):
+        """Drop every agent whose alive flag has been cleared"""
+        keep = self.alive
+        if keep.all():
+            return
+        for name in self.fields:
+            setattr(self, name, getattr(self, name)[keep])
+
+
+class CellIndex(object):
+    """Uniform grid over a set of points stored as one sorted array of point ids
+    plus the start offset of every cell"""
+
+    def __init__(self, x, y, cell_size: float, cols: int, rows: int):
+        self.x = x
+        self.y = y
+        self.cell_size = cell_size
+        self.cols = cols
+        self.rows = rows
+        self.scanned = 0  # Candidates the queries compared distances against
+
+        cells = self.cell_of(x, y)
+        self.order = np.argsort(cells, kind="stable")
+        counts = np.bincount(cells, minlength=cols * rows)
+        self.counts = counts
+        self.starts = np.cumsum(counts) - counts
+
+    def cell_coords(self, x, y):
+        """Cell column and row for each point, clamped to the grid"""
+        cx = np.clip((x // self.cell_size).astype(np.intp), 0, self.cols - 1)
+        cy = np.clip((y // self.cell_size).astype(np.intp), 0, self.rows - 1)
+        return cx, cy
+
+    def cell_of(self, x, y):
+        cx, cy = self.cell_coords(x, y)
+        return cy * self.cols + cx
+
+    def nearest(self, qx, qy, search_radius: int, max_dist2: float = math.inf):
+        """For every query point find the closest indexed point inside the block of
+        cells search_radius around it. Returns (index, squared distance) arrays,
+        index is -1 where nothing closer than max_dist2 was found"""
+        num_queries = len(qx)
+        best = np.full(num_queries, -1, dtype=np.intp)
+        best_dist2 = np.full(num_queries, math.inf)
+        if num_queries == 0 or len(self.x) == 0:
+            return best, best_dist2
+
+        # Every neighbouring cell of every query, one row per query
+        cx, cy = self.cell_coords(qx, qy)
+        offsets = np.arange(-search_radius, search_radius + 1)
+        ncx = (cx[:, None, None] + offsets[None, :, None]).repeat(len(offsets), axis=2)
+        ncy = (cy[:, None, None] + offsets[None, None, :]).repeat(len(offsets), axis=1)
+        ncx = ncx.reshape(num_queries, -1)
+        ncy = ncy.reshape(num_queries, -1)
+        valid = (ncx >= 0) & (ncx < self.cols) & (ncy >= 0) & (ncy < self.rows)
+        cells = np.where(valid, ncy * self.cols + ncx, 0)
+        counts = np.where(valid, self.counts[cells], 0)
+        starts = self.starts[cells]
+
+        # Split the queries so the expanded pair arrays stay bounded
+        per_query = counts.sum(axis=1)
+        cumulative = np.cumsum(per_query)
+        self.scanned += int(cumulative[-1])
+        begin = 0
+        while begin < num_queries:
+            done = cumulative[begin - 1] if begin else 0
+            end = int(np.searchsorted(cumulative, done + PAIR_BUDGET, side="right"))
+            end = max(end, begin + 1)
+            self._nearest_chunk(qx, qy, begin, end, counts, starts, per_query, best, best_dist2)
+            begin = end
+
+        too_far = best_dist2 >= max_dist2
+        best[too_far] = -1
+        best_dist2[too_far] = math.inf
+        return best, best_dist2
+
+    def _nearest_chunk(self, qx, qy, begin, end, counts, starts, per_query, best, best_dist2):
+        counts = counts[begin:end].ravel()
+        total = int(counts.sum())
+        if total == 0:
+            return
+
+        # Expand (query, cell) rows into one (query, candidate) pair per point
+        query_ids = np.repeat(np.arange(begin, end), counts.reshape(end - begin, -1).sum(axis=1))
+        pair_starts = np.cumsum(counts) - counts
+        slots = np.repeat(starts[begin:end].ravel() - pair_starts, counts) + np.arange(total)
+        candidates = self.order[slots]
+        dist2 = (self.x[candidates] - qx[query_ids]) ** 2 + (self.y[candidates] - qy[query_ids]) ** 2
+
+        # Pairs are grouped by query, so each query's minimum is one segment reduction
+        found = per_query[begin:end] > 0
+        segment_sizes = per_query[begin:end][found]
+        segment_starts = np.cumsum(segment_sizes) - segment_sizes
+        segment_min = np.minimum.reduceat(dist2, segment_starts)
+
+        hits = np.flatnonzero(dist2 == np.repeat(segment_min, segment_sizes))
+        hit_queries = query_ids[hits]
+        first = np.ones(len(hits), dtype=bool)
+        first[1:] = hit_queries[1:] != hit_queries[:-1]
+        best[hit_queries[first]] = candidates[hits[first]]
+        best_dist2[hit_queries[first]] = segment_min
+
+
+def bounce(x, vx, bound: float):
+    """Reverse the velocity of every agent whose next step would leave [0, bound]"""
+    step = x + vx
+    vx[(step > bound) | (step < 0)] *= -1
+
+
+class Simulator(object):
+    """The master object that holds all the game state"""
+
+    # Storage used for both species, subclasses can keep the columns elsewhere
+    population_class = Population
+
+    def __init__(self, xbound: int, ybound: int, num_humans: int, num_zombies: int, debug: bool,
+                 seed: int = None, immunity: float = 0.3, human_speed: float = 1,
+                 zombie_speed: float = 0.8, birth_odds: int = 500, auto_cell_size: bool = False):
+        self.xbound = xbound
+        self.ybound = ybound
+
+        self.debug = debug
+        self.rng = np.random.default_rng(seed)
+
+        # Model parameters. An eaten human dies instead of turning with a chance of
+        # immunity, and every human has a 1 in birth_odds chance to reproduce per tick
+        self.immunity = immunity
+        self.human_speed = human_speed
+        self.zombie_speed = zombie_speed
+        self.birth_odds = birth_odds
+
+        # Spatial partitioning, same cell layout as optimized_zombiesim
+        self.cell_size = 10
+        self.search_radius = 2
+        self.cols = int(xbound // self.cell_size) + 1
+        self.rows = int(ybound // self.cell_size) + 1
+
+        # Running totals of the neighbour searches, for the cell size tuner
+        self.queries = 0
+        self.cells = 0
+        self.scanned = 0
+
+        # With auto_cell_size the tuner picks from the cell sizes that divide the
+        # sight, and the search radius grows as cells shrink so agents always see
+        # exactly `sight` units (see cell_tuning.py)
+        self.auto_cell_size = auto_cell_size
+        self.sight = self.cell_size * self.search_radius
+        self.cell_tuner = None
+        if auto_cell_size:
+            sizes = [self.sight / radius for radius in range(1, MAX_SEARCH_RADIUS + 1)]
+            self.cell_tuner = CellTuner(sizes, self.cell_size, ARRAY_CELL_COST)
+
+        self.humans = self.population_class(HUMAN_FIELDS)
+        self.zombies = self.population_class(ZOMBIE_FIELDS)
+
+        self.spawn_humans(num_humans)
+        self.spawn_zombies(num_zombies)
+
+    def spawn_positions(self, count: int, region=None):
+        """count random whole coordinates in region, (x0, y0, x1, y1) and the whole
+        world by default"""
+        x0, y0, x1, y1 = spawn_region(self, region)
+        return (self.rng.integers(x0, x1, count, endpoint=True),
+                self.rng.integers(y0, y1, count, endpoint=True))
+
+    def spawn_humans(self, count: int, region=None):
+        """Add count humans at random spots of region"""
+        self.add_humans(*self.spawn_positions(count, region))
+
+    def spawn_zombies(self, count: int, region=None):
+        """Add count zombies at random spots of region"""
+        self.add_zombies(*self.spawn_positions(count, region))
+
+    def add_humans(self, x, y):
+        """Create new humans at the given coordinates"""
+        count = len(x)
+        direction = self.rng.random(count) * 2 * math.pi
+        self.humans.append(
+            x=x, y=y,
+            vx=np.cos(direction) * self.human_speed,
+            vy=np.sin(direction) * self.human_speed,
+            age=np.zeros(count),
+            max_age=self.rng.integers(*MAX_AGES, count, endpoint=True),
+            counter=np.zeros(count),
+            alive=np.ones(count),
+        )
+
+    def add_zombies(self, x, y):
+        """Create new zombies at the given coordinates"""
+        count = len(x)
+        self.zombies.append(
+            x=x, y=y,
+            vx=np.full(count, self.zombie_speed),
+            vy=np.zeros(count),
+            hunger=np.zeros(count),
+            max_hunger=self.rng.integers(*MAX_HUNGERS, count, endpoint=True),
+            incr=np.zeros(count),
+            counter=np.zeros(count),
+            target=np.full(count, -1),
+            alive=np.ones(count),
+        )
+
+    def cell_index(self, population: Population):
+        """Build a spatial index over the current positions of a population"""
+        return CellIndex(population.x, population.y, self.cell_size, self.cols, self.rows)
+
+    def closest(self, qx, qy, targets: Population, max_dist2: float = math.inf):
+        """Closest agent of targets to every query point, as (index, squared distance)"""
+        if self.auto_cell_size:
+            max_dist2 = min(max_dist2, self.sight ** 2)
+        index = self.cell_index(targets)
+        found = index.nearest(qx, qy, self.search_radius, max_dist2)
+        self.count_queries(len(qx), index.scanned)
+        return found
+
+    def count_queries(self, queries: int, scanned: int):
+        """Add a batch of neighbour searches to the running totals"""
+        self.queries += queries
+        self.cells += queries * (2 * self.search_radius + 1) ** 2
+        self.scanned += scanned
+
+    def set_cell_size(self, cell_size: float):
+        """Switch to another cell size, keeping the sight the same"""
+        self.cell_size = cell_size
+        self.search_radius = round(self.sight / cell_size)
+        self.cols = int(self.xbound // cell_size) + 1
+        self.rows = int(self.ybound // cell_size) + 1
+
+    def compact_humans(self):
+        """Drop dead humans, keeping every zombie's target on the same human. Zombies
+        whose target died lose it"""
+        humans = self.humans
+        if humans.alive.all():
+            return
+        moved = np.cumsum(humans.alive) - 1
+        moved[~humans.alive] = -1
+        chasing = self.zombies.target >= 0
+        self.zombies.target[chasing] = moved[self.zombies.target[chasing]]
+        humans.compact()
+
+    def in_reach(self, qx, qy, humans: Population):
+        """Closest human within eating reach of every query point, -1 if there is
+        none. Cells are never smaller than the reach, so the block of cells right
+        around a point covers it"""
+        index = self.cell_index(humans)
+        closest, _ = index.nearest(qx, qy, 1, np.nextafter(1, math.inf))
+        return closest
+
+    def update_humans(self):
+        """Age, reproduce, flee and move every human. Returns the newborn positions"""
+        rng = self.rng
+        humans = self.humans
+
+        # Check for death by old age
+        humans.alive &= humans.age < humans.max_age
+        self.compact_humans()
+        count = len(humans)
+
+        humans.age += 1
+
+        # Newborns appear where the parent stood before moving
+        born = np.flatnonzero(rng.integers(0, self.birth_odds, count) == 0)
+        newborns = (humans.x[born], humans.y[born])
+
+        # Only update direction and find closest zombie every 3 ticks
+        humans.counter += 1
+        turning = np.flatnonzero(humans.counter >= 3)
+        if len(turning):
+            hx = humans.x[turning]
+            hy = humans.y[turning]
+            direction = rng.random(len(turning)) * 2 * math.pi
+
+            if len(self.zombies):
+                # Only care about zombies within a certain range
+                closest, _ = self.closest(hx, hy, self.zombies, (self.xbound / 4) ** 2)
+                fleeing = closest >= 0
+                target = closest[fleeing]
+                jitter = (rng.random(len(target)) - 0.5) * .25 * math.pi
+                direction[fleeing] = -np.arctan2(self.zombies.y[target] - hy[fleeing],
+                                                 self.zombies.x[target] - hx[fleeing]) + jitter
+
+            humans.vx[turning] = -np.cos(direction) * self.human_speed
+            humans.vy[turning] = np.sin(direction) * self.human_speed
+            humans.counter[turning] = 0
+
+        bounce(humans.x, humans.vx, self.xbound)
+        bounce(humans.y, humans.vy, self.ybound)
+        humans.x += humans.vx
+        humans.y += humans.vy
+
+        return newborns
+
+    def update_zombies(self):
+        """Chase, starve, move and eat for every zombie. Returns the positions of
+        eaten humans that turn"""
+        rng = self.rng
+        humans = self.humans
+        zombies = self.zombies
+        count = len(zombies)
+
+        # Only find a new closest human every 4 ticks or if the current target is gone
+        zombies.counter += 1
+        searching = np.flatnonzero((zombies.counter >= 4) | (zombies.target < 0))
+        if len(searching):
+            zombies.target[searching], _ = self.closest(zombies.x[searching], zombies.y[searching], humans)
+            zombies.counter[searching] = 0
+        closest = zombies.target
+        has_target = closest >= 0
+
+        # Set direction and velocity
+        steering = np.flatnonzero((zombies.incr == 0) | ~has_target)
+        if len(steering):
+            direction = rng.random(len(steering)) * 2 * math.pi
+            chasing = has_target[steering]
+            zx = zombies.x[steering[chasing]]
+            zy = zombies.y[steering[chasing]]
+            target = closest[steering[chasing]]
+            jitter = (rng.random(len(target)) - 0.5) * .5 * math.pi
+            direction[chasing] = np.arctan2(humans.y[target] - zy, humans.x[target] - zx) + jitter
+            zombies.vx[steering] = np.cos(direction) * self.zombie_speed
+            zombies.vy[steering] = np.sin(direction) * self.zombie_speed
+
+        # Update hunger
+        zombies.hunger += 1
+        zombies.alive &= zombies.hunger < zombies.max_hunger
+        moving = zombies.alive
+
+        vx = zombies.vx[moving]
+        vy = zombies.vy[moving]
+        bounce(zombies.x[moving], vx, self.xbound)
+        bounce(zombies.y[moving], vy, self.ybound)
+        zombies.vx[moving] = vx
+        zombies.vy[moving] = vy
+        zombies.x[moving] += vx
+        zombies.y[moving] += vy
+
+        # Try to eat the closest human in reach, zombies are ranked in a random order
+        # each tick so older zombies don't necessarily have priority
+        eating = np.flatnonzero(moving)
+        target = self.in_reach(zombies.x[eating], zombies.y[eating], humans)
+        eating = eating[target >= 0]
+        target = target[target >= 0]
+
+        priority = rng.permutation(count)[eating]
+        ranked = np.argsort(priority, kind="stable")
+        _, first = np.unique(target[ranked], return_index=True)
+        winners = ranked[first]
+        eating = eating[winners]
+        eaten = target[winners]
+
+        zombies.hunger[eating] = np.maximum(zombies.hunger[eating] - 40, 0)
+        humans.alive[eaten] = False
+
+        turned = eaten[rng.random(len(eaten)) >= self.immunity]
+        turned_positions = (humans.x[turned], humans.y[turned])
+
+        zombies.incr += 1
+        zombies.incr[zombies.incr > 6] = 0
+
+        if self.debug and len(eaten):
+            print(f"Zombies have eaten {len(eaten)} Humans")
+
+        return turned_positions
+
+    def update(self):
+        newborns = self.update_humans()
+        turned = self.update_zombies()
+
+        # Add new agents
+        self.compact_humans()
+        self.zombies.compact()
+        self.add_humans(*newborns)
+        self.add_zombies(*turned)
+
+        if self.cell_tuner is not None:
+            size = self.cell_tuner.tick(self.queries, self.cells, self.scanned,
+                                        len(self.humans) + len(self.zombies))
+            if size is not None:
+                self.set_cell_size(size)
+
+        if self.debug:
+            print(f"There are {len(self.humans)} Humans alive")
+            print(f"There are {len(self.zombies)} Zombies alive")
+
+    def fast_forward(self, ticks: int, callback=None):
+        """Once humans or zombies have died out, play up to ticks ticks of the
+        survivors with a cheap reduced model instead of update(). Returns the
+        number of ticks played, see fast_forward.py"""
+        from fast_forward import advance
+        return advance(self, ticks, callback)
@@ -0,0 +1,160 @@
+# Elastic worker pool for the multithreaded engine. Its decide phase splits the
+# agents into fixed size batches, each with its own random stream, so how the
+# batches get run (on this thread, or spread over however many workers) never
+# changes the outcome of a seeded run. That leaves the runtime free to pick the
+# fastest way to run them
+#
+# WorkerPool is a thread pool that can be resized between calls, which is how the
+# GUI's +/- keys change the thread count of a running simulation. ThreadTuner
+# times every run of a phase and fits, for each worker count, a fixed cost plus a
+# cost per agent. It then runs each phase on the worker count with the cheapest
+# estimate for the current population, serially when none beats it, and tries
+# the other counts now and then so the estimates keep up as the population
+# changes. Unlike cell_tuning.py it has to time rather than count, what it is
+# after is how well the interpreter runs threads side by side
+#
+#   pool = WorkerPool(4)
+#   results = pool.run(decide_batch, batches, seeds, workers=2)
+
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def gil_enabled():
+    """Whether threads take turns on the GIL, False only on a free-threaded build
+    (3.13t and later) running with the GIL off"""
+    check = getattr(sys, "_is_gil_enabled", None)
+    return True if check is None else check()
+
+
+def worker_counts(largest: int):
+    """Worker counts a tuner picks from: 1 (serial), the powers of two below
+    largest and largest itself"""
+    counts = [1]
+    while counts[-1] * 2 < largest:
+        counts.append(counts[-1] * 2)
+    if largest > 1:
+        counts.append(largest)
+    return counts
+
+
+class WorkerPool(object):
+    """Thread pool whose size can change between runs. Resizing waits for the
+    current workers to finish, so it is meant for the thread that calls run()"""
+
+    def __init__(self, size: int):
+        self.size = 0
+        self.executor = None
+        self.resize(size)
+
+    def resize(self, size: int):
+        """Grow or shrink the pool to size threads, 1 runs everything on the calling thread"""
+        if size < 1:
+            raise ValueError(f"A worker pool needs at least 1 thread, not {size}")
+        if size == self.size:
+            return
+        self.shutdown()
+        self.executor = ThreadPoolExecutor(max_workers=size) if size > 1 else None
+        self.size = size
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def run(self, fn, *iterables, workers: int = None):
+        """fn(*args) for each args of zip(*iterables), results in order like map().
+        The calls are dealt out in contiguous shares to at most workers threads
+        (all of the pool by default), a single share runs on the calling thread"""
+        jobs = list(zip(*iterables))
+        workers = min(workers or self.size, self.size, len(jobs))
+        if workers <= 1:
+            return [fn(*job) for job in jobs]
+
+        bounds = [len(jobs) * share // workers for share in range(workers + 1)]
+        shares = [jobs[start:end] for start, end in zip(bounds, bounds[1:])]
+        results = []
+        for share in self.executor.map(lambda share: [fn(*job) for job in share], shares):
+            results.extend(share)
+        return results
+
+
+class ThreadTuner(object):
+    """Picks the number of workers one phase runs on from how long it took before.
+
+    record() gets the duration of every run together with the worker count and
+    the number of agents. For each worker count the last `window` runs are fitted
+    to seconds = overhead + per_agent * agents, and choose() returns the count
+    with the lowest estimate for the agents at hand. Counts with fewer than two
+    runs are tried first, and every `explore_every` calls the count that has gone
+    longest without a run is tried again"""
+
+    def __init__(self, choices, window: int = 20, explore_every: int = 16):
+        if 1 not in choices:
+            raise ValueError(f"Worker counts {list(choices)} leave no way to run serially")
+        self.choices = sorted(choices)
+        self.explore_every = explore_every
+        self.samples = {workers: deque(maxlen=window) for workers in self.choices}  # (agents, seconds)
+        self.last_run = {workers: 0 for workers in self.choices}
+        self.calls = 0
+
+    def fit(self, workers: int):
+        """(overhead, per_agent) seconds of runs on workers threads, None before any run"""
+        samples = self.samples[workers]
+        if not samples:
+            return None
+        count = len(samples)
+        mean_agents = sum(agents for agents, _ in samples) / count
+        mean_seconds = sum(seconds for _, seconds in samples) / count
+        spread = sum((agents - mean_agents) ** 2 for agents, _ in samples)
+        if spread > (0.05 * mean_agents) ** 2 * count:
+            per_agent = sum((agents - mean_agents) * (seconds - mean_seconds)
+                            for agents, seconds in samples) / spread
+            overhead = mean_seconds - per_agent * mean_agents
+            if overhead >= 0 and per_agent >= 0:
+                return overhead, per_agent
+        # Runs at about the same population can't tell the two costs apart, or
+        # timing noise gave a negative one. A cost per agent is right near here
+        squares = sum(agents * agents for agents, _ in samples)
+        if not squares:
+            return mean_seconds, 0.0
+        return 0.0, sum(agents * seconds for agents, seconds in samples) / squares
+
+    def estimate(self, workers: int, agents: int):
+        """Expected seconds for agents on workers threads, None before any run"""
+        fitted = self.fit(workers)
+        if fitted is None:
+            return None
+        overhead, per_agent = fitted
+        return overhead + per_agent * agents
+
+    def choose(self, agents: int):
+        """Worker count for the next run over agents agents"""
+        self.calls += 1
+        for workers in self.choices:
+            if len(self.samples[workers]) < 2:
+                return workers
+        if self.calls % self.explore_every == 0:
+            return min(self.choices, key=self.last_run.get)
+        return min(self.choices, key=lambda workers: self.estimate(workers, agents))
+
+    def record(self, workers: int, agents: int, seconds: float):
+        self.samples[workers].append((agents, seconds))
+        self.last_run[workers] = self.calls
+
+    @property
+    def cutoff(self):
+        """Fewest agents for which running in parallel is expected to be faster
+        than serially, None while the runs so far say it never is"""
+        serial = self.fit(1)
+        if serial is None:
+            return None
+        best = None
+        for workers in self.choices[1:]:
+            fitted = self.fit(workers)
+            if fitted is None or fitted[1] >= serial[1]:
+                continue
+            agents = max(0, int((fitted[0] - serial[0]) / (serial[1] - fitted[1])) + 1)
+            best = agents if best is None else min(best, agents)
+        return best
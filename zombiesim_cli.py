@@ -0,0 +1,213 @@
+# Headless runner, steps a simulator without a window and reports the outcome.
+# Nothing here imports pygame and only the chosen engine is loaded, so a run
+# starts fast enough to launch thousands of them from a script
+#
+#   python3 zombiesim_cli.py --engine optimized --size 200 200 --humans 5000 --ticks 1000
+
+import argparse
+import importlib
+import json
+import sys
+import time
+
+# Engine name on the command line -> module holding its Simulator
+ENGINES = {
+    "zombiesim": "zombiesim",
+    "optimized": "optimized_zombiesim",
+    "mt": "mt_zombiesim",
+    "vectorized": "vectorized_zombiesim",
+    "mp": "mp_zombiesim",
+}
+
+# Model parameters every engine takes, left at the engine's defaults unless given
+MODEL_PARAMETERS = ("immunity", "human_speed", "zombie_speed", "birth_odds")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the zombie simulator without a GUI")
+    parser.add_argument("--engine", choices=ENGINES, default="optimized",
+                        help="simulator implementation (default: %(default)s)")
+    parser.add_argument("--size", type=int, nargs=2, default=(100, 100), metavar=("X", "Y"),
+                        help="world size (default: 100 100)")
+    parser.add_argument("--humans", type=int, default=2500, help="initial humans (default: %(default)s)")
+    parser.add_argument("--zombies", type=int, default=3, help="initial zombies (default: %(default)s)")
+    parser.add_argument("--ticks", type=int, default=1000, help="ticks to run (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--threads", type=int, default=4, help="threads for the mt engine")
+    parser.add_argument("--auto-threads", action="store_true",
+                        help="let the mt engine run each phase on as many of its --threads as proves fastest")
+    parser.add_argument("--workers", type=int, default=4, help="processes for the mp engine")
+    parser.add_argument("--spatial-index", default="grid",
+                        help="spatial index of the optimized and mt engines: grid, csr, quadtree or kdtree "
+                             "(default: %(default)s)")
+    parser.add_argument("--auto-cell-size", action="store_true",
+                        help="let the engine tune its grid cell size as the run goes (not zombiesim)")
+    parser.add_argument("--level-of-detail", action="store_true",
+                        help="let humans far from every zombie sleep through a cheap batched update "
+                             "(optimized and mt engines)")
+    parser.add_argument("--immunity", type=float,
+                        help="chance an eaten human dies instead of turning (default: 0.3)")
+    parser.add_argument("--human-speed", type=float, help="distance a human moves per tick (default: 1)")
+    parser.add_argument("--zombie-speed", type=float, help="distance a zombie moves per tick (default: 0.8)")
+    parser.add_argument("--birth-odds", type=int,
+                        help="humans reproduce with a 1 in N chance every tick (default: 500)")
+    parser.add_argument("--resume", metavar="FILE",
+                        help="continue from a checkpoint instead of a new world, --seed reseeds the fork")
+    parser.add_argument("--save", metavar="FILE", help="write a checkpoint of the final state to FILE")
+    parser.add_argument("--telemetry", metavar="FILE",
+                        help="append per tick counts to FILE, CSV if it ends in .csv (object engines only)")
+    parser.add_argument("--fast-forward", choices=("reduced", "outcome"),
+                        help="once a species has died out, play the rest with a cheap reduced model, "
+                             "or only work out the outcome, leaving the simulator as it is (not zombiesim)")
+    parser.add_argument("--every", type=int, default=0, metavar="N",
+                        help="record the populations every N ticks")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON to FILE, - for stdout")
+    parser.add_argument("--quiet", action="store_true", help="don't print the summary")
+    return parser.parse_args(argv)
+
+
+def make_simulator(args):
+    """Import the chosen engine and build its simulator"""
+    if args.resume:
+        from checkpoint import load_checkpoint
+        return load_checkpoint(args.resume, seed=args.seed)
+    module = importlib.import_module(ENGINES[args.engine])
+    xbound, ybound = args.size
+    options = {name: getattr(args, name) for name in MODEL_PARAMETERS if getattr(args, name) is not None}
+    if args.engine in ("optimized", "mt"):
+        options["spatial_index"] = args.spatial_index
+    if args.engine == "mt":
+        options["num_threads"] = args.threads
+    if args.engine == "mp":
+        options["num_workers"] = args.workers
+    if args.auto_threads:
+        if args.engine != "mt":
+            raise SystemExit(f"The {args.engine} engine has no threads to tune")
+        options["auto_threads"] = True
+    if args.auto_cell_size:
+        if args.engine == "zombiesim":
+            raise SystemExit("The zombiesim engine has no grid to tune")
+        options["auto_cell_size"] = True
+    if args.level_of_detail:
+        if args.engine not in ("optimized", "mt"):
+            raise SystemExit(f"The {args.engine} engine has no level of detail")
+        options["level_of_detail"] = True
+    return module.Simulator(xbound, ybound, args.humans, args.zombies, False, seed=args.seed, **options)
+
+
+def run(args):
+    """Run one simulation and return its results as a dict"""
+    if args.fast_forward == "outcome" and args.save:
+        raise SystemExit("--fast-forward outcome leaves nothing to --save")
+    start = time.perf_counter()
+    sim = make_simulator(args)
+    setup = time.perf_counter() - start
+    initial = (len(sim.humans), len(sim.zombies))
+    if args.resume:
+        # The checkpoint decides the engine
+        args.engine = next(name for name, module in ENGINES.items() if module == type(sim).__module__)
+
+    telemetry = None
+    if args.telemetry:
+        if not hasattr(sim, "instrumentation"):
+            raise SystemExit(f"The {args.engine} engine has no per tick telemetry")
+        from telemetry import TelemetryWriter
+        telemetry = TelemetryWriter(args.telemetry)
+        telemetry.attach(sim)
+
+    if args.fast_forward:
+        from fast_forward import outcome, survivor
+        if args.fast_forward == "reduced" and not hasattr(sim, "fast_forward"):
+            raise SystemExit(f"The {args.engine} engine has no reduced model, use --fast-forward outcome")
+
+    history = []
+    tick = 0
+    fast_forwarded = None
+    final = None
+
+    def fast_tick(humans, zombies):
+        """Bookkeeping of update() for a tick played by the fast-forward"""
+        nonlocal tick
+        tick += 1
+        if args.every and tick % args.every == 0 and tick < args.ticks and (humans or zombies):
+            history.append((tick, humans, zombies))
+
+    start = time.perf_counter()
+    try:
+        while tick < args.ticks and (len(sim.humans) or len(sim.zombies)):
+            if args.every and tick % args.every == 0:
+                history.append((tick, len(sim.humans), len(sim.zombies)))
+            if args.fast_forward and survivor(sim) is not None:
+                fast_forwarded = tick
+                if args.fast_forward == "reduced":
+                    sim.fast_forward(args.ticks - tick, fast_tick)
+                else:
+                    result = outcome(sim, args.ticks - tick)
+                    for humans, zombies in result.history:
+                        fast_tick(humans, zombies)
+                    final = (result.humans, result.zombies)
+                break
+            sim.update()
+            tick += 1
+        elapsed = time.perf_counter() - start
+        humans, zombies = final or (len(sim.humans), len(sim.zombies))
+        if args.save:
+            from checkpoint import save_checkpoint
+            save_checkpoint(sim, args.save)
+    finally:
+        if telemetry is not None:
+            telemetry.close()
+        if hasattr(sim, "close"):
+            sim.close()
+
+    results = {
+        "engine": args.engine,
+        "size": [sim.xbound, sim.ybound],
+        "initial_humans": initial[0],
+        "initial_zombies": initial[1],
+        "seed": args.seed,
+        "ticks": tick,
+        "humans": humans,
+        "zombies": zombies,
+        "setup_seconds": setup,
+        "run_seconds": elapsed,
+        "ticks_per_second": tick / elapsed if elapsed else 0.0,
+    }
+    if getattr(sim, "auto_cell_size", False):
+        from instrumentation import cell_sizes
+        results["cell_sizes"] = cell_sizes(sim)
+        if hasattr(sim, "search_radius"):
+            results["search_radius"] = sim.search_radius
+    if fast_forwarded is not None:
+        results["fast_forwarded_from"] = fast_forwarded
+    if args.every:
+        history.append((tick, humans, zombies))
+        results["history"] = [{"tick": t, "humans": h, "zombies": z} for t, h, z in history]
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+
+    # With --output - stdout carries the JSON only
+    if not args.quiet and args.output != "-":
+        print(f"{results['engine']}: {results['ticks']} ticks in {results['run_seconds']:.2f}s "
+              f"({results['ticks_per_second']:.1f} ticks/s)")
+        print(f"There are {results['humans']} Humans alive")
+        print(f"There are {results['zombies']} Zombies alive")
+        if "cell_sizes" in results:
+            sizes = ", ".join(f"{species} {size:g}" for species, size in results["cell_sizes"].items())
+            print(f"Cell sizes chosen: {sizes}")
+
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())